@@ -0,0 +1,168 @@
+"""Minimal stand-ins for the discord.py objects the cogs touch.
+
+They implement just enough of ``discord.Interaction``, ``discord.Message``
+and ``discord.Attachment`` for the cog callbacks to run unmodified, and
+record when the first visible response went out so the harness can report
+time-to-first-response next to total latency.
+"""
+
+import contextlib
+import itertools
+import time
+from datetime import datetime, timezone
+
+import discord
+
+_ids = itertools.count(1)
+
+
+def snowflake() -> int:
+    """A unique snowflake whose timestamp is "now", like Discord would assign."""
+
+    return discord.utils.time_snowflake(datetime.now(timezone.utc)) + next(_ids) % 4096
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str = "user", bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+
+    def mentioned_in(self, message: "FakeMessage") -> bool:
+        return message.mention_everyone or any(u.id == self.id for u in message.mentions)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = 1, name: str = "bench"):
+        self.id = guild_id
+        self.name = name
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, name: str, guild: FakeGuild | None = None):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.sent: list[FakeMessage] = []
+
+    async def send(self, content: str | None = None, **kwargs) -> "FakeMessage":
+        msg = FakeMessage(content or "", author=None, channel=self)
+        self.sent.append(msg)
+        return msg
+
+    @contextlib.asynccontextmanager
+    async def typing(self):
+        yield
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeAttachment:
+    def __init__(self, url: str, filename: str, size: int, content_type: str | None = "image/png"):
+        self.id = snowflake()
+        self.url = url
+        self.proxy_url = url
+        self.filename = filename
+        self.size = size
+        self.content_type = content_type
+
+
+class FakeMessage:
+    def __init__(
+        self,
+        content: str,
+        *,
+        author: FakeUser | None,
+        channel: FakeChannel,
+        attachments: list[FakeAttachment] | None = None,
+        mentions: list[FakeUser] | None = None,
+    ):
+        self.id = snowflake()
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.attachments = attachments or []
+        self.mentions = mentions or []
+        self.raw_mentions = [u.id for u in self.mentions]
+        self.mention_everyone = False
+        self.created_at = discord.utils.snowflake_time(self.id)
+        self.edits = 0
+        self.first_visible: float | None = None
+
+    async def reply(self, content: str | None = None, **kwargs) -> "FakeMessage":
+        msg = await self.channel.send(content, **kwargs)
+        if self.first_visible is None:
+            self.first_visible = time.perf_counter()
+        return msg
+
+    async def edit(self, content: str | None = None, **kwargs) -> "FakeMessage":
+        self.content = content or self.content
+        self.edits += 1
+        return self
+
+
+class _FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _respond(self, content: str | None) -> None:
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)  # type: ignore[arg-type]
+        self._done = True
+        self._interaction.mark_visible(content)
+
+    async def send_message(self, content: str | None = None, **kwargs) -> None:
+        self._respond(content or "")
+        self._interaction.messages.append(content or "")
+
+    async def defer(self, **kwargs) -> None:
+        self._respond(None)
+
+
+class _FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content: str | None = None, **kwargs) -> FakeMessage:
+        self._interaction.mark_visible(content or "")
+        self._interaction.messages.append(content or "")
+        return FakeMessage(content or "", author=None, channel=self._interaction.channel)
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, channel: FakeChannel):
+        self.id = snowflake()
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id if channel.guild else None
+        self.created_at = discord.utils.snowflake_time(self.id)
+        self.extras: dict = {}
+        self.command = None
+        self.response = _FakeResponse(self)
+        self.followup = _FakeFollowup(self)
+        self.messages: list[str] = []
+        self.first_visible: float | None = None
+
+    def mark_visible(self, content: str | None = None) -> None:
+        # a bare defer only shows "thinking…"; count the first real text
+        if content is not None and self.first_visible is None:
+            self.first_visible = time.perf_counter()
+
+    async def edit_original_response(self, content: str | None = None, **kwargs) -> FakeMessage:
+        self.mark_visible(content)
+        if content is not None:
+            self.messages.append(content)
+        return FakeMessage(content or "", author=None, channel=self.channel)
@@ -0,0 +1,366 @@
+"""Offline load test: drive the real cog callbacks with fake Discord objects.
+
+Everything runs locally: a fake OpenAI-compatible server answers the AI
+cogs and a fake file server stands in for the Discord CDN, so numbers are
+comparable between runs and safe to collect before a deploy.
+
+Synthetic traffic (Poisson arrivals, ``--rate`` events per simulated second)::
+
+    PYTHONPATH=src python -m bench.loadtest --duration 30 --rate 5 --speed 4
+
+Replay a recorded stream (JSON lines: ``{"at": 1.25, "kind": "roll", "arg": "1d20"}``)::
+
+    PYTHONPATH=src python -m bench.loadtest --replay events.jsonl --speed 10
+
+``--record`` writes the generated synthetic stream so it can be replayed later.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from .fakes import FakeAttachment, FakeChannel, FakeGuild, FakeInteraction, FakeMessage, FakeUser
+from .servers import FakeFileServer, FakeOpenAIServer
+
+BOT_USER_ID = 900_000_000_000_000_001
+
+DEFAULT_MIX = {"roll": 30, "help": 10, "ai": 10, "mention": 5, "dadjoke": 10, "photo": 10, "chatter": 25}
+ROLL_EXPRESSIONS = ["1d20+5", "4d6kh3", "3d6+2", "6x 4d6kh3", "2d20kl1", "1000d6", "8d6!"]
+AI_PROMPTS = [
+    "What is the capital of France?",
+    "Explain initiative in D&D in one sentence.",
+    "Give me a name for a dwarf cleric.",
+    "How do I tame a wolf in Minecraft?",
+    "Summarize Firefly in two lines.",
+]
+
+log = logging.getLogger("bench")
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def synthetic_events(duration: float, rate: float, mix: dict[str, int], seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    events, at = [], 0.0
+    while True:
+        at += rng.expovariate(rate)
+        if at >= duration:
+            return events
+        kind = rng.choices(kinds, weights)[0]
+        event = {"at": round(at, 4), "kind": kind}
+        if kind == "roll":
+            event["arg"] = rng.choice(ROLL_EXPRESSIONS)
+        elif kind in {"ai", "mention"}:
+            event["arg"] = rng.choice(AI_PROMPTS)
+        elif kind == "photo":
+            # a handful of names so some uploads are reposts of the same bytes
+            event["arg"] = {"name": f"img{rng.randint(1, 40)}.png", "size": rng.choice([50_000, 400_000, 2_000_000])}
+        events.append(event)
+
+
+class LoopLagSampler:
+    """Measures how late a periodic timer fires: a direct proxy for event-loop stalls."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+class Harness:
+    def __init__(self, bot, files: FakeFileServer):
+        self.bot = bot
+        self.files = files
+        self.guild = FakeGuild(1, "bench")
+        self.channels = [FakeChannel(100 + i, f"bench-{i}", self.guild) for i in range(4)]
+        self.users = [FakeUser(10_000 + i, f"user{i}") for i in range(50)]
+        self.bot_user = FakeUser(BOT_USER_ID, "bench-bot", bot=True)
+        self.latency: dict[str, list[float]] = defaultdict(list)
+        self.first_response: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def cog(self, name: str):
+        return self.bot.get_cog(name)
+
+    async def deliver_message(self, message: FakeMessage) -> None:
+        """Route a gateway message like ``MyBot.on_message`` does, waiting for the handlers."""
+
+        await self.bot.router.dispatch(message, wait=True)
+        listeners = self.bot.extra_events.get("on_message", [])
+        await asyncio.gather(*(listener(message) for listener in listeners))
+
+    async def run_event(self, event: dict) -> None:
+        kind = event["kind"]
+        user = random.choice(self.users)
+        channel = random.choice(self.channels)
+        target = None
+        start = time.perf_counter()
+        try:
+            if kind == "roll":
+                cog = self.cog("Roll")
+                target = FakeInteraction(user, channel)
+                await cog.roll.callback(cog, target, event.get("arg", "1d20"), None)
+            elif kind == "help":
+                cog = self.cog("Core")
+                target = FakeInteraction(user, channel)
+                await cog.help_slash.callback(cog, target)
+            elif kind == "ai":
+                cog = self.cog("Chat")
+                target = FakeInteraction(user, channel)
+                await cog.ai.callback(cog, target, event.get("arg", AI_PROMPTS[0]))
+            elif kind == "dadjoke":
+                cog = self.cog("DadJoke")
+                target = FakeInteraction(user, channel)
+                await cog.dadjoke.callback(cog, target)
+            elif kind == "mention":
+                target = FakeMessage(
+                    f"<@{BOT_USER_ID}> {event.get('arg', AI_PROMPTS[0])}",
+                    author=user,
+                    channel=channel,
+                    mentions=[self.bot_user],
+                )
+                await self.deliver_message(target)
+            elif kind == "photo":
+                arg = event.get("arg") or {"name": "img.png", "size": 100_000}
+                attachment = FakeAttachment(self.files.url(arg["name"], arg["size"]), arg["name"], arg["size"])
+                target = FakeMessage("", author=user, channel=channel, attachments=[attachment])
+                await self.deliver_message(target)
+            elif kind == "chatter":
+                target = FakeMessage("just talking", author=user, channel=channel)
+                await self.deliver_message(target)
+            else:
+                raise ValueError(f"unknown event kind {kind!r}")
+        except Exception:
+            self.errors[kind] += 1
+            if self.errors[kind] <= 3:
+                log.exception("Event %s failed", kind)
+            return
+
+        self.latency[kind].append(time.perf_counter() - start)
+        first_visible = getattr(target, "first_visible", None)
+        if first_visible is not None:
+            self.first_response[kind].append(first_visible - start)
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="discord-bot-bench-")
+    openai_server = FakeOpenAIServer(
+        latency=args.ai_latency,
+        token_delay=args.token_delay,
+        jitter=args.ai_jitter,
+        error_rate=args.ai_error_rate,
+        slow_rate=args.ai_slow_rate,
+        slow_latency=args.ai_slow_latency,
+        down_models=frozenset(args.ai_down_model),
+    )
+    file_server = FakeFileServer()
+    await openai_server.start()
+    await file_server.start()
+
+    # configure the bot exactly as .env would, before its modules are imported
+    os.environ.update(
+        {
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": openai_server.base_url,
+            "PHOTO_SAVE_DIR": os.path.join(workdir, "photos"),
+            "DADJOKE_BUFFER_FILE": os.path.join(workdir, "dadjokes.json"),
+            "PHOTO_CATCHUP": "0",
+        }
+    )
+    if not args.cache:
+        os.environ["AI_CACHE_TTL"] = "0"
+    if args.ai_fallback_model:
+        os.environ["OPENAI_FALLBACK_MODEL"] = args.ai_fallback_model
+    if args.ai_hedge:
+        os.environ["AI_HEDGE"] = "1"
+    os.environ["LLM_BACKEND"] = args.backend
+    if args.backend == "local":
+        os.environ["LLM_BASE_URL"] = openai_server.base_url
+    elif args.backend == "stub":
+        # same timings as the fake server, minus the HTTP
+        os.environ["LLM_STUB_LATENCY"] = str(args.ai_latency)
+        os.environ["LLM_STUB_TOKEN_DELAY"] = str(args.token_delay)
+
+    import bot as bot_module  # noqa: E402  (env must be set first)
+
+    bot = bot_module.bot
+    harness = Harness(bot, file_server)
+    bot._connection.user = harness.bot_user  # what login() would have set
+
+    for ext in bot_module.EXTENSIONS:
+        await bot.load_extension(ext)
+
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as fh:
+            events = [json.loads(line) for line in fh if line.strip()]
+    else:
+        events = synthetic_events(args.duration, args.rate, DEFAULT_MIX, args.seed)
+        if args.record:
+            with open(args.record, "w", encoding="utf-8") as fh:
+                fh.writelines(json.dumps(event) + "\n" for event in events)
+
+    sampler = LoopLagSampler()
+    sampler.start()
+    started = time.perf_counter()
+    tasks = []
+    for event in events:
+        delay = started + event["at"] / args.speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(harness.run_event(event)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+
+    photosaver = bot.get_cog("PhotoSaver")
+    drain_started = time.perf_counter()
+    if photosaver is not None:
+        await photosaver.queue.join()
+    drain = time.perf_counter() - drain_started
+    sampler.stop()
+
+    for ext in list(bot.extensions):
+        await bot.unload_extension(ext)
+    await bot.ai.aclose()
+    await openai_server.stop()
+    await file_server.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    rejected = bot.metrics.get("ai_rejected_total")
+    ai_wait = bot.metrics.get("ai_queue_wait_seconds")
+
+    def total(name: str) -> dict:
+        return {label: c.value for label, c in bot.metrics.get(name).children.items()}
+
+    commands = {}
+    for kind in sorted(set(harness.latency) | set(harness.errors)):
+        lat = harness.latency[kind]
+        ttfr = harness.first_response[kind]
+        commands[kind] = {
+            "count": len(lat),
+            "errors": harness.errors[kind],
+            "throughput_per_s": len(lat) / wall if wall else 0.0,
+            "p50_ms": percentile(lat, 0.50) * 1000,
+            "p99_ms": percentile(lat, 0.99) * 1000,
+            "ttfr_p50_ms": percentile(ttfr, 0.50) * 1000,
+            "ttfr_p99_ms": percentile(ttfr, 0.99) * 1000,
+        }
+
+    return {
+        "events": len(events),
+        "wall_s": wall,
+        "speed": args.speed,
+        "throughput_per_s": len(events) / wall if wall else 0.0,
+        "photo_drain_s": drain,
+        "bytes_downloaded": file_server.bytes_served,
+        "backend": bot.ai.backend.name,
+        "openai_requests": openai_server.requests + getattr(bot.ai.backend, "requests", 0),
+        "ai_rejected": {reason: c.value for reason, c in rejected.children.items()},
+        "ai_injected": {"errors": openai_server.injected_errors, "stalls": openai_server.injected_stalls},
+        "ai_attempt_failures": total("ai_attempt_failures_total"),
+        "ai_retries": sum(total("ai_retries_total").values()),
+        "ai_hedges": total("ai_hedges_total"),
+        "ai_fallbacks": sum(total("ai_fallbacks_total").values()),
+        "ai_failed": total("ai_errors_total"),
+        "ai_queue_wait_p99_ms": ai_wait.quantile(0.99) * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "loop_lag_p50_ms": percentile(sampler.samples, 0.50) * 1000,
+        "loop_lag_p99_ms": percentile(sampler.samples, 0.99) * 1000,
+        "loop_lag_max_ms": max(sampler.samples, default=0.0) * 1000,
+        "commands": commands,
+    }
+
+
+def _pairs(counts: dict) -> str:
+    return ", ".join(f"{label} {n}" for label, n in counts.items()) or "none"
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"events: {report['events']}  wall: {report['wall_s']:.1f}s  speed: {report['speed']}x  "
+        f"throughput: {report['throughput_per_s']:.1f}/s",
+        f"peak RSS: {report['peak_rss_mb']:.1f} MB  loop lag p50/p99/max: "
+        f"{report['loop_lag_p50_ms']:.1f}/{report['loop_lag_p99_ms']:.1f}/{report['loop_lag_max_ms']:.1f} ms",
+        f"{report['backend']} requests: {report['openai_requests']}  downloaded: {report['bytes_downloaded'] / 1e6:.1f} MB  "
+        f"photo queue drain: {report['photo_drain_s']:.2f}s",
+        f"ai queue wait p99: {report['ai_queue_wait_p99_ms']:.0f} ms  rejected: "
+        + (", ".join(f"{reason} {n}" for reason, n in report["ai_rejected"].items()) or "none"),
+        f"ai injected errors/stalls: {report['ai_injected']['errors']}/{report['ai_injected']['stalls']}  "
+        f"attempt failures: {_pairs(report['ai_attempt_failures'])}  retries: {report['ai_retries']}",
+        f"ai hedges: {_pairs(report['ai_hedges'])}  fallbacks: {report['ai_fallbacks']}  "
+        f"failed: {_pairs(report['ai_failed'])}",
+        "",
+        f"{'command':<10}{'count':>7}{'err':>5}{'rate/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'ttfr50':>9}{'ttfr99':>9}",
+    ]
+    for kind, row in report["commands"].items():
+        lines.append(
+            f"{kind:<10}{row['count']:>7}{row['errors']:>5}{row['throughput_per_s']:>8.2f}"
+            f"{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['ttfr_p50_ms']:>9.1f}{row['ttfr_p99_ms']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="simulated seconds of synthetic traffic")
+    parser.add_argument("--rate", type=float, default=5.0, help="synthetic events per simulated second")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay at N× real time")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--replay", help="JSON-lines event file to replay instead of synthetic traffic")
+    parser.add_argument("--record", help="write the synthetic event stream to this file")
+    parser.add_argument("--ai-latency", type=float, default=0.3, help="fake OpenAI time to first token (s)")
+    parser.add_argument("--ai-jitter", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="fake OpenAI delay between tokens (s)")
+    parser.add_argument("--ai-error-rate", type=float, default=0.0, help="fraction of AI requests failing with 429/5xx")
+    parser.add_argument("--ai-slow-rate", type=float, default=0.0, help="fraction of AI requests that stall")
+    parser.add_argument("--ai-slow-latency", type=float, default=20.0, help="extra seconds a stalled request takes")
+    parser.add_argument("--ai-down-model", action="append", default=[], help="model that always fails (repeatable)")
+    parser.add_argument("--ai-fallback-model", help="set OPENAI_FALLBACK_MODEL")
+    parser.add_argument("--ai-hedge", action="store_true", help="enable hedged AI requests (AI_HEDGE=1)")
+    parser.add_argument(
+        "--backend",
+        choices=("openai", "local", "stub"),
+        default="openai",
+        help="LLM_BACKEND: openai/local talk to the fake server over HTTP, stub answers in-process",
+    )
+    parser.add_argument("--cache", action="store_true", help="leave the AI response cache enabled")
+    parser.add_argument("--json", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    report = asyncio.run(run(args))
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
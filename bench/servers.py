@@ -0,0 +1,193 @@
+"""Local HTTP stand-ins for the OpenAI API and the Discord CDN.
+
+Both run on aiohttp (which ships with discord.py) on an ephemeral localhost
+port, so the real ``AsyncOpenAI`` client and PhotoSaver's downloader are
+exercised over real sockets without touching the internet.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import re
+import time
+
+from aiohttp import web
+
+_JOKE_BATCH_RE = re.compile(r"Tell me (\d+) different")
+
+
+class FakeOpenAIServer:
+    """OpenAI-compatible ``/v1/chat/completions`` with configurable latency and failures.
+
+    ``latency`` is the time to first token, ``token_delay`` the gap between
+    streamed tokens; ``jitter`` adds up to that many seconds at random.
+    For exercising the AI failure policy, ``error_rate`` of the requests get
+    a 429/500/503 straight away, ``slow_rate`` of them stall for
+    ``slow_latency`` seconds first, and every request for a model in
+    ``down_models`` fails with 503.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        token_delay: float = 0.02,
+        jitter: float = 0.1,
+        reply_words: int = 60,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 20.0,
+        down_models: frozenset[str] = frozenset(),
+    ):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.jitter = jitter
+        self.reply_words = reply_words
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down_models = down_models
+        self.requests = 0
+        self.injected_errors = 0
+        self.injected_stalls = 0
+        self._joke_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    def _reply_for(self, body: dict) -> str:
+        prompt = next((m["content"] for m in reversed(body.get("messages", [])) if m["role"] == "user"), "")
+        batch = _JOKE_BATCH_RE.search(prompt)
+        if batch:
+            return "\n".join(
+                f"Joke #{next(self._joke_ids)}: why did the benchmark cross the road? To hit p99."
+                for _ in range(int(batch.group(1)))
+            )
+        words = [f"word{i}" for i in range(self.reply_words)]
+        return f"Answer to '{prompt[:40]}': " + " ".join(words)
+
+    async def _chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        if body.get("model") in self.down_models or random.random() < self.error_rate:
+            self.injected_errors += 1
+            status = 503 if body.get("model") in self.down_models else random.choice((429, 500, 503))
+            return web.json_response(
+                {"error": {"message": "injected failure", "type": "server_error", "code": None}},
+                status=status,
+                headers={"retry-after": "1"} if status == 429 else None,
+            )
+        delay = self.latency + random.uniform(0, self.jitter)
+        if random.random() < self.slow_rate:
+            self.injected_stalls += 1
+            delay += self.slow_latency
+        await asyncio.sleep(delay)
+        text = self._reply_for(body)
+        created = int(time.time())
+        model = body.get("model", "fake-model")
+
+        if not body.get("stream"):
+            return web.json_response(
+                {
+                    "id": f"chatcmpl-{self.requests}",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                    ],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": len(text.split()), "total_tokens": 10},
+                }
+            )
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for i, word in enumerate(text.split(" ")):
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": ("" if i == 0 else " ") + word}, "finish_reason": None}],
+            }
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.token_delay)
+        done = {
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        await resp.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        await resp.write_eof()
+        return resp
+
+    async def _models(self, request: web.Request) -> web.Response:
+        model = request.match_info.get("model", "fake-model")
+        return web.json_response({"id": model, "object": "model", "created": 0, "owned_by": "bench"})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        app.router.add_get("/v1/models/{model}", self._models)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class FakeFileServer:
+    """Serves ``/files/{name}?size=N`` as a deterministic byte stream.
+
+    Content depends only on ``name``, so posting the same name twice looks
+    like a repost of the same file.
+    """
+
+    def __init__(self, chunk_delay: float = 0.0):
+        self.chunk_delay = chunk_delay
+        self.bytes_served = 0
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def _file(self, request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        size = int(request.query.get("size", "65536"))
+        block = hashlib.sha256(name.encode()).digest() * 2048  # 64 KiB pattern
+        resp = web.StreamResponse(headers={"Content-Type": "application/octet-stream", "Content-Length": str(size)})
+        await resp.prepare(request)
+        remaining = size
+        while remaining > 0:
+            piece = block[: min(len(block), remaining)]
+            await resp.write(piece)
+            remaining -= len(piece)
+            self.bytes_served += len(piece)
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        await resp.write_eof()
+        return resp
+
+    def url(self, name: str, size: int) -> str:
+        return f"{self.base_url}/files/{name}?size={size}"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/files/{name}", self._file)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -1,74 +1,319 @@
 import os
+import sys
+import time
+
+STARTED = time.monotonic()
+
+# --profile-startup: time every import from here on, each extension load,
+# time to ready and the first command; the report is printed once ready
+profiler = None
+if "--profile-startup" in sys.argv:
+    from services.profiling import StartupProfiler
+
+    profiler = StartupProfiler()
+    profiler.install()
+
 import logging
 import asyncio
+import contextlib
 import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
 
+# before the services imports: they read their settings at import time
 load_dotenv()
 
+from services.ai import AIScheduler
+from services.commandsync import CommandSync
+from services.hotreload import CogReloader
+from services.logsetup import setup_logging
+from services.metrics import InstrumentedTree, LoopLagMonitor, Metrics, MetricsServer, rss_bytes
+from services.router import MessageRouter
+from services.shared import SharedState
+
 TOKEN = os.getenv("DISCORD_TOKEN")
 OWNER_ID = int(os.getenv("OWNER_ID", "0"))
 GUILD_ID = int(os.getenv("GUILD_ID", "0"))
 ALLOWED_CHANNELS = {int(x) for x in os.getenv("ALLOWED_CHANNEL_IDS", "").split(",") if x.strip().isdigit()}
+# Import the OpenAI SDK and connect in the background right after login
+AI_WARMUP = os.getenv("AI_WARMUP", "1").lower() not in {"0", "false", "no", "off"}
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Sharding (opt-in; normally set per worker by `python -m src.supervisor`).
+# Without SHARD_COUNT the bot is a plain single-process commands.Bot.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip().isdigit()] or None
+WORKER_ID = int(os.getenv("WORKER_ID", "0"))
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+METRICS_PUBLISH_INTERVAL = 15.0  # seconds between metric snapshots for the other workers
+
+# Runtime profile: "lean" trims what discord.py subscribes to and caches, for
+# small boards; see MyBot.__init__, MyBot.add_cog and the /memory command
+RUNTIME_PROFILE = os.getenv("RUNTIME_PROFILE", "default").lower()
+LEAN = RUNTIME_PROFILE == "lean"
 
 # Discord Intents
-intents = discord.Intents.default()
-intents.message_content = True  # needed for some features; keep only if you use it
+if LEAN:
+    # the loaded cogs add what they declare in `required_intents`
+    intents = discord.Intents(guilds=True)
+else:
+    intents = discord.Intents.default()
+    intents.message_content = True  # needed for some features; keep only if you use it
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-)
+# Logging: formatted and written by a background thread (LOG_* in .env)
+setup_logging(WORKER_ID)
 log = logging.getLogger("bot")
+commands_log = logging.getLogger("bot.commands")  # one line per slash command
+
+EXTENSIONS = (
+    "cogs.core",
+    "cogs.chat",
+    "cogs.roll",
+    "cogs.admin",
+    "cogs.about",
+    "cogs.dadjoke",
+    "cogs.photosaver",
+    "cogs.photos",
+    "cogs.stats",
+)
 
 async def allowed_channel(interaction: discord.Interaction) -> bool:
     return (not ALLOWED_CHANNELS) or (interaction.channel_id in ALLOWED_CHANNELS)
 
-class MyBot(commands.Bot):
+class MyBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
     def __init__(self):
-        super().__init__(command_prefix="!", intents=intents)
+        sharding = {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARD_COUNT else {}
+        caches = {}
+        if LEAN:
+            # no cog looks members up in the cache or reads cached messages
+            # (no edit/delete/reaction handlers); the bot's own member is
+            # always cached, which is all permission checks need
+            caches = {
+                "member_cache_flags": discord.MemberCacheFlags.none(),
+                "max_messages": None,
+                "chunk_guilds_at_startup": False,
+            }
+        super().__init__(command_prefix="!", intents=intents, tree_cls=InstrumentedTree, **sharding, **caches)
+        self.runtime_profile = RUNTIME_PROFILE
+        self._identified = False  # intents can only change before the first IDENTIFY
         self.tree_copy_lock = asyncio.Lock()
+        # With several worker processes, worker 0 does the once-per-bot jobs
+        # (command sync, photo retention, metrics endpoint) and everyone
+        # shares cooldowns, rate limits and metrics through SQLite
+        self.worker_id = WORKER_ID
+        self.primary = WORKER_ID == 0
+        self.shared = SharedState() if WORKER_COUNT > 1 else None
+        self._publish_task: asyncio.Task | None = None
+        # Counters and histograms shared by every cog; see /stats and METRICS_PORT
+        self.metrics = Metrics()
+        self.command_seconds = self.metrics.histogram("command_seconds", "Slash command duration", label="command")
+        self.command_errors = self.metrics.counter("command_errors_total", "Slash commands that failed", label="command")
+        self.loop_lag = LoopLagMonitor(self.metrics)
+        self.metrics_server = MetricsServer(self.metrics, collect=self.cluster_metrics)
+        # One OpenAI client + concurrency limit shared by every AI cog
+        self.ai = AIScheduler(metrics=self.metrics, shared=self.shared)
+        # Gateway messages are classified once here and handed only to the
+        # cogs that registered a route for that kind of message
+        self.router = MessageRouter(self, ALLOWED_CHANNELS)
+        self.metrics.gauge(
+            "gateway_messages",
+            "Gateway messages seen by the router",
+            lambda: {
+                "received": self.router.received,
+                "dropped_bot": self.router.dropped_bot,
+                "dropped_unrouted": self.router.dropped_unrouted,
+            },
+            label="outcome",
+        )
+        self.metrics.gauge("gateway_latency_seconds", "Discord heartbeat latency", lambda: self.latency, merge="max")
+        self.metrics.gauge("process_resident_memory_bytes", "Resident memory of the bot process", rss_bytes)
+        # Slash commands are only pushed to Discord when the tree changed
+        self.command_sync = CommandSync(self.tree)
+        self.startup_sync: str | None = None  # "skipped", "performed" or "failed" until ready
+        self._warmup_task: asyncio.Task | None = None
+        # Code-only updates: /reload or HOT_RELOAD_INTERVAL reload changed cogs
+        # in place; cog name -> state exported by the instance being replaced
+        self.reloader = CogReloader(self)
+        self.handover: dict[str, object] = {}
 
     async def setup_hook(self):
+        if profiler:
+            profiler.mark("logged in")
+        self.loop_lag.start()
+        if self.primary:
+            await self.metrics_server.start()
+        if self.shared is not None:
+            self._publish_task = asyncio.create_task(self._publish_metrics())
+        if AI_WARMUP and self.ai.enabled:
+            self._warmup_task = asyncio.create_task(self._warm_up())
+
         # Load cogs with error visibility
-        for ext in (
-            "cogs.core",
-            "cogs.chat",
-            "cogs.roll",
-            "cogs.admin",
-            "cogs.about",
-            "cogs.dadjoke",
-            "cogs.photosaver",
-        ):
+        for ext in EXTENSIONS:
             try:
-                await self.load_extension(ext)
+                with profiler.extension(ext) if profiler else contextlib.nullcontext():
+                    await self.load_extension(ext)
                 log.info(f"Loaded extension: {ext}")
             except Exception as e:
                 log.exception(f"Error loading {ext}: {e}")
+        if profiler:
+            profiler.mark("extensions loaded")
+        self.reloader.start()
+        self._identified = True
+        if LEAN:
+            enabled = [name for name, on in self.intents if on]
+            log.info(f"Lean profile: intents {', '.join(enabled)}; {type(asyncio.get_running_loop()).__module__} loop")
 
-        # Force GUILD sync (instant) if GUILD_ID present, else global
+        # GUILD sync (instant) if GUILD_ID present, else global; skipped when
+        # the command payloads match what was last synced
+        # (worker 0 only: every worker registers the same commands)
         try:
-            if GUILD_ID:
-                guild = discord.Object(id=GUILD_ID)
-                self.tree.copy_global_to(guild=guild)
-                synced = await self.tree.sync(guild=guild)
-                log.info(f"Synced {len(synced)} commands to guild {GUILD_ID}: {[c.name for c in synced]}")
+            scope = f"guild {GUILD_ID}" if GUILD_ID else "global"
+            synced = await self.refresh_commands()
+            if not self.primary:
+                self.startup_sync = "left to worker 0"
+            elif synced is None:
+                self.startup_sync = "skipped"
+                log.info(f"Slash commands unchanged, skipped {scope} sync")
             else:
-                synced = await self.tree.sync()
-                log.info(f"Synced {len(synced)} global commands: {[c.name for c in synced]}")
+                self.startup_sync = "performed"
+                log.info(f"Synced {len(synced)} {scope} commands: {[c.name for c in synced]}")
         except Exception as e:
+            self.startup_sync = "failed"
             log.exception(f"Slash command sync failed: {e}")
+        if profiler:
+            profiler.mark("commands synced")
+
+    async def refresh_commands(self):
+        """Mirror the global commands into GUILD_ID and sync; ``None`` when unchanged or not worker 0."""
+
+        guild = discord.Object(id=GUILD_ID) if GUILD_ID else None
+        if guild:
+            # the guild copies are separate objects: drop ones left by a reloaded cog
+            async with self.tree_copy_lock:
+                self.tree.clear_commands(guild=guild)
+                self.tree.copy_global_to(guild=guild)
+        if not self.primary:
+            return None
+        return await self.command_sync.sync(guild=guild)
+
+    async def add_cog(self, cog: commands.Cog, **kwargs):
+        # a hot reload left this cog's previous state behind; take it before cog_load runs
+        state = self.handover.get(cog.qualified_name)
+        if state is not None and hasattr(cog, "import_state"):
+            try:
+                cog.import_state(state)
+            except Exception:
+                log.exception(f"Could not restore state of {cog.qualified_name}; starting empty")
+        needed = getattr(cog, "required_intents", None)
+        if LEAN and needed is not None:
+            self._require_intents(cog.qualified_name, needed)
+        await super().add_cog(cog, **kwargs)
+
+    def _require_intents(self, cog_name: str, needed: discord.Intents) -> None:
+        # discord.py reads the intents when it sends IDENTIFY, which happens
+        # after setup_hook, so cogs loaded at startup can still widen them
+        current = self._connection._intents
+        missing = needed.value & ~current.value
+        if not missing:
+            return
+        if self._identified:
+            lacking = discord.Intents.none()
+            lacking.value = missing
+            names = [name for name, on in lacking if on]
+            log.warning(f"{cog_name} needs intents {', '.join(names)} this session lacks; restart to enable them")
+            return
+        current.value |= missing
+
+    async def _warm_up(self):
+        await self.ai.warm_up(OPENAI_MODEL)
+        if profiler:
+            profiler.mark("AI warm-up done")
+            self._print_profile()
+
+    def _print_profile(self):
+        # once both the gateway and the warm-up are done
+        if "ready" in profiler.marks and (self._warmup_task is None or "AI warm-up done" in profiler.marks):
+            profiler.uninstall()
+            print(profiler.report(), flush=True)
 
     async def on_ready(self):
+        if self.startup_sync is not None:
+            log.info(f"Ready in {time.monotonic() - STARTED:.2f}s (command sync {self.startup_sync})")
+            self.startup_sync = None  # on_ready fires again after reconnects
+            if profiler:
+                profiler.mark("ready")
+                self._print_profile()
         log.info(f"Logged in as {self.user} (id={self.user.id})")
         # Set a presence tagline
         await self.change_presence(
             activity=discord.Game(name="👑🤖 “I am your AI overlord”")
         )
 
+    async def on_message(self, message: discord.Message):
+        await self.router.dispatch(message)
+        if self.all_commands:  # no prefix commands registered -> skip the parse
+            await self.process_commands(message)
+
+    def record_command(self, interaction: discord.Interaction, failed: bool = False):
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        started = interaction.extras.get("started")  # stamped by InstrumentedTree
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            self.command_seconds.labels(name).observe(elapsed)
+            commands_log.info(
+                "/%s %s in %.0f ms",
+                name,
+                "failed" if failed else "done",
+                elapsed * 1000,
+                extra={"latency_ms": round(elapsed * 1000, 1)},
+            )
+        if failed:
+            self.command_errors.labels(name).inc()
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        self.record_command(interaction)
+        if profiler and "first command" not in profiler.marks:
+            profiler.mark("first command")
+            latency = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+            log.info(f"First command /{command.qualified_name} answered in {latency * 1000:.0f} ms")
+
+    async def _publish_metrics(self):
+        # every worker writes its snapshot; readers merge whatever is fresh
+        passes = 0
+        while True:
+            try:
+                snapshot = self.metrics.snapshot()
+                await self.shared.put(f"metrics:{self.worker_id}", snapshot, ttl=4 * METRICS_PUBLISH_INTERVAL)
+                passes += 1
+                if self.primary and passes % 240 == 0:  # about hourly
+                    await self.shared.vacuum()
+            except Exception:
+                log.exception("Publishing metrics to shared state failed")
+            await asyncio.sleep(METRICS_PUBLISH_INTERVAL)
+
+    async def cluster_metrics(self) -> Metrics:
+        """This process's metrics, or every worker's merged when sharded across processes."""
+
+        if self.shared is None:
+            return self.metrics
+        snapshots = await self.shared.items("metrics:")
+        snapshots[f"metrics:{self.worker_id}"] = self.metrics.snapshot()  # our own, fresher
+        return Metrics.merged(list(snapshots.values()))
+
+    async def close(self):
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+        if self._publish_task is not None:
+            self._publish_task.cancel()
+        self.reloader.stop()
+        self.loop_lag.stop()
+        await self.metrics_server.stop()
+        await self.ai.aclose()
+        await super().close()
+        if self.shared is not None:
+            self.shared.close()
+
 bot = MyBot()
 
 
@@ -77,6 +322,7 @@ async def on_app_command_error(
     interaction: discord.Interaction, error: app_commands.AppCommandError
 ):
     """Global handler for app command errors."""
+    bot.record_command(interaction, failed=True)
     if isinstance(error, app_commands.errors.CommandOnCooldown):
         await interaction.response.send_message(
             f"⏳ Cooldown: try again in {error.retry_after:.1f}s.",
@@ -101,4 +347,16 @@ async def on_app_command_error(
 if __name__ == "__main__":
     if not TOKEN:
         raise SystemExit("DISCORD_TOKEN missing in .env")
-    bot.run(TOKEN)
+    if LEAN:
+        # optional: faster event loop with less per-callback overhead (pip install uvloop);
+        # orjson is picked up by discord.py on its own when installed
+        try:
+            import uvloop
+
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+    # log_handler=None: discord.py would otherwise attach its own stderr
+    # handler (formatting and writing on the event loop, and printing every
+    # library line twice); setup_logging's queue handles discord.* as well
+    bot.run(TOKEN, log_handler=None)
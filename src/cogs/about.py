@@ -5,7 +5,6 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 
-START_TIME = time.time()
 VERSION = "2.1.0"
 
 OWNER_ID = int(os.getenv("OWNER_ID", "0"))
@@ -18,7 +17,7 @@ class About(commands.Cog):
 
     @app_commands.command(name="about", description="Show info about the bot")
     async def about(self, interaction: discord.Interaction):
-        uptime = time.time() - START_TIME
+        uptime = time.time() - self.bot.metrics.started  # process start, so reloading this cog keeps it
         hours, remainder = divmod(int(uptime), 3600)
         minutes, seconds = divmod(remainder, 60)
 
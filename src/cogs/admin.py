@@ -8,20 +8,47 @@ GUILD_ID = int(os.getenv("GUILD_ID", "0"))
 class Admin(commands.Cog):
     def __init__(self, bot): self.bot = bot
 
-    @app_commands.command(name="sync", description="Owner: resync slash commands (guild or global)")
+    @app_commands.command(name="sync", description="Owner: resync slash commands (guild or global)", extras={"owner_only": True})
     @app_commands.describe(scope="guild or global")
     async def sync(self, interaction: discord.Interaction, scope: str = "guild"):
         if interaction.user.id != OWNER_ID:
             return await interaction.response.send_message("🔒 Owner only.", ephemeral=True)
         await interaction.response.defer(thinking=True, ephemeral=True)
+        # forced, but still records the fingerprint so the next restart can skip it
         if scope.lower() == "global":
-            synced = await self.bot.tree.sync()
+            synced = await self.bot.command_sync.sync(force=True)
             return await interaction.followup.send(f"Synced {len(synced)} global commands.")
         guild = interaction.guild or (discord.Object(id=GUILD_ID) if GUILD_ID else None)
         if not guild:
             return await interaction.followup.send("No guild context/ID set.")
         self.bot.tree.copy_global_to(guild=guild)
-        synced = await self.bot.tree.sync(guild=guild if isinstance(guild, discord.Guild) else guild)
+        synced = await self.bot.command_sync.sync(guild=guild, force=True)
         await interaction.followup.send(f"Synced {len(synced)} guild commands.")
 
+    @app_commands.command(name="reload", description="Owner: reload changed cogs without restarting", extras={"owner_only": True})
+    @app_commands.describe(cog="changed (default), all, or a cog name like chat")
+    async def reload(self, interaction: discord.Interaction, cog: str = "changed"):
+        if interaction.user.id != OWNER_ID:
+            return await interaction.response.send_message("🔒 Owner only.", ephemeral=True)
+        await interaction.response.defer(thinking=True, ephemeral=True)
+        reloader = self.bot.reloader
+        if cog == "changed":
+            names = reloader.changed()
+        elif cog == "all":
+            reloader.changed()  # mark everything as seen
+            names = list(self.bot.extensions)
+        else:
+            names = [cog if cog.startswith("cogs.") else f"cogs.{cog}"]
+            if names[0] not in self.bot.extensions:
+                return await interaction.followup.send(f"`{names[0]}` is not loaded.")
+        if not names:
+            return await interaction.followup.send("No cog files changed.")
+        # reloading admin itself is fine: this callback finishes on the old instance
+        results = await reloader.reload(names)
+        lines = [
+            f"♻️ `{r.extension}` {r.seconds * 1000:.0f} ms" if r.ok else f"⚠️ `{r.extension}` kept old version: {r.error}"
+            for r in results
+        ]
+        await interaction.followup.send("\n".join(lines)[:1900])
+
 async def setup(bot): await bot.add_cog(Admin(bot))
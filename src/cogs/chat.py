@@ -1,27 +1,626 @@
 import os
+import json
+import time
 import asyncio
-import re
+import contextlib
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 import discord
 from discord.ext import commands
 from discord import app_commands
 
-# Optional dependency
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or ""
+from services.admission import AdmissionRejected, Requester, describe_queue
+from services.llm import estimate_tokens
+from services.moderation import Moderator
+from services.resilience import AIError
+from services.router import MessageClass
+
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "500"))
 OPENAI_TEMP = float(os.getenv("OPENAI_TEMP", "0.7"))
 
-# simple concurrency guard
-_semaphore = asyncio.Semaphore(2)  # at most 2 concurrent requests
+# Streaming: edit the reply as tokens arrive instead of waiting for the full answer
+AI_STREAM = os.getenv("AI_STREAM", "1").lower() not in {"0", "false", "no", "off"}
+# Discord allows roughly 5 edits / 5s per channel; stay comfortably below that
+AI_STREAM_EDIT_INTERVAL = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.2"))
+
+# Response cache: identical prompts within the TTL reuse the stored answer
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))  # seconds, 0 disables the cache
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "512"))
+# Sharded workers share one cache file, and check it on a memory miss
+AI_CACHE_SHARED = int(os.getenv("WORKER_COUNT", "1")) > 1
+AI_CACHE_DB = os.getenv("AI_CACHE_DB", "~/.discord-bot-pi/ai-cache.sqlite3" if AI_CACHE_SHARED else "")
+
+# Mention chat memory: recent turns per channel, trimmed to a token budget
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "12"))  # 0 disables memory
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", "1000"))  # history + summary per request
+CHAT_MEMORY_IDLE_MIN = float(os.getenv("CHAT_MEMORY_IDLE_MIN", "60"))
+CHAT_MEMORY_MAX_KB = int(os.getenv("CHAT_MEMORY_MAX_KB", "512"))  # across all channels
+
+OWNER_ID = int(os.getenv("OWNER_ID", "0"))
+
+log = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful, concise assistant for a Discord server."
+SUMMARY_PROMPT = (
+    "Condense this Discord conversation into a short summary (under 80 words) that keeps "
+    "names, facts, decisions and open questions. Reply with the summary only."
+)
+SUMMARY_MAX_TOKENS = 160
+
+MESSAGE_LIMIT = 1900  # Discord message headroom
+STREAM_CURSOR = " ▌"
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Split ``text`` into Discord-sized chunks.
+
+    Prefers breaking on a newline, then on a space, and only cuts mid-word
+    when a single run of characters is longer than ``limit``.
+    """
+
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+class StreamingReply:
+    """Progressively render a streamed answer across one or more messages.
+
+    ``send`` posts a new message and returns it; every later update for that
+    chunk is an edit. Edits are coalesced so at most one round of edits goes
+    out per ``interval`` seconds, except for the very first text which is
+    shown immediately.
+    """
+
+    def __init__(self, send, interval: float = AI_STREAM_EDIT_INTERVAL):
+        self._send = send
+        self.interval = interval
+        self.text = ""
+        self._messages: list[discord.Message] = []
+        self._shown: list[str] = []
+        self._last_flush = 0.0
+
+    async def feed(self, delta: str) -> None:
+        self.text += delta
+        if time.monotonic() - self._last_flush >= self.interval:
+            await self._flush(STREAM_CURSOR)
+
+    async def finish(self) -> None:
+        await self._flush("")
+
+    async def _flush(self, cursor: str) -> None:
+        self._last_flush = time.monotonic()
+        chunks = split_message(self.text.strip() or "…", MESSAGE_LIMIT - len(STREAM_CURSOR))
+        for i, chunk in enumerate(chunks):
+            content = chunk + cursor if i == len(chunks) - 1 else chunk
+            if i < len(self._messages):
+                if self._shown[i] != content:
+                    await self._messages[i].edit(content=content)
+                    self._shown[i] = content
+            else:
+                self._messages.append(await self._send(content))
+                self._shown.append(content)
+
+
+class ResponseCache:
+    """LRU + TTL cache of AI answers with single-flight request merging.
+
+    Keys are derived from the normalized prompt and the generation settings.
+    While a key is being generated, later callers for the same key wait on
+    the in-flight result instead of issuing their own API call.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = AI_CACHE_SIZE,
+        ttl: float = AI_CACHE_TTL,
+        db_path: str = AI_CACHE_DB,
+        read_through: bool = AI_CACHE_SHARED,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.read_through = read_through  # other processes write to the same DB
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()  # key -> (expires_at, text)
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes: list[tuple[str, tuple]] = []  # waiting for the writer task
+        self._writer: asyncio.Task | None = None
+        if db_path and self.enabled:
+            self._open_db(os.path.expanduser(db_path))
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float, system_prompt: str) -> str:
+        normalized = " ".join(prompt.lower().split())
+        payload = json.dumps([normalized, model, round(temperature, 3), system_prompt.strip()])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _open_db(self, path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, text TEXT)"
+            )
+            now = time.time()
+            self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT key, expires_at, text FROM responses ORDER BY expires_at DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+        except sqlite3.Error:
+            log.exception("Response cache DB %s unavailable; caching in memory only", path)
+            self._db = None
+            return
+        for key, expires_at, text in reversed(rows):
+            self._entries[key] = (expires_at, text)
+        log.info("Loaded %d cached AI responses from %s", len(rows), path)
+
+    def _db_write(self, writes: list[tuple[str, tuple]]) -> None:
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                for sql, params in writes:
+                    self._db.execute(sql, params)
+                self._db.commit()
+            except sqlite3.Error:
+                log.exception("Response cache DB write failed")
+
+    def _queue_write(self, sql: str, params: tuple) -> None:
+        # one writer at a time, in order, so an eviction's DELETE can't overtake
+        # the INSERT it follows; close() waits for it
+        self._writes.append((sql, params))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._flush_writes())
+
+    async def _flush_writes(self) -> None:
+        while self._writes:
+            writes, self._writes = self._writes, []
+            await asyncio.to_thread(self._db_write, writes)
+
+    def _db_read(self, key: str) -> tuple[float, str] | None:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                return self._db.execute(
+                    "SELECT expires_at, text FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+            except sqlite3.Error:
+                log.exception("Response cache DB read failed")
+                return None
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        expires_at = time.time() + self.ttl
+        self._entries[key] = (expires_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            if self._db is not None and not self.read_through:  # another worker may still want it
+                self._queue_write("DELETE FROM responses WHERE key = ?", (old_key,))
+        if self._db is not None:
+            self._queue_write(
+                "INSERT OR REPLACE INTO responses (key, expires_at, text) VALUES (?, ?, ?)",
+                (key, expires_at, text),
+            )
+
+    async def get_or_compute(self, key: str, compute) -> tuple[str, str]:
+        """Return ``(text, source)`` where source is ``hit``, ``merged`` or ``miss``.
+
+        ``compute`` is only awaited by the first caller for a key; it must
+        return the final answer text. Followers share its answer or its
+        ``AIError``; if it fails any other way, they compute for themselves.
+        """
+
+        if not self.enabled:
+            self.misses += 1
+            return await compute(), "miss"
+
+        while True:
+            cached = self.get(key)
+            if cached is None and self.read_through and self._db is not None and key not in self._inflight:
+                row = await asyncio.to_thread(self._db_read, key)
+                if row is not None:
+                    self._entries[key] = row
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                    cached = row[1]
+            if cached is not None:
+                self.hits += 1
+                return cached, "hit"
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            text = await asyncio.shield(pending)
+            if text is not None:
+                self.merged += 1
+                return text, "merged"
+            # the leader gave up for reasons of its own (rate limit, cancelled); go again
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            text = await compute()
+        except AIError as e:
+            # the AI failed; everyone waiting would get the same answer
+            fut.set_exception(e)
+            fut.exception()  # followers re-raise it; don't warn when there are none
+            raise
+        except BaseException:
+            # the leader's own admission or cancellation: followers compute for themselves
+            fut.set_result(None)
+            raise
+        else:
+            fut.set_result(text)
+            if text:
+                self.put(key, text)
+            return text, "miss"
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.merged
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "hit_rate": (self.hits + self.merged) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+        }
+
+    def export_state(self) -> dict:
+        return {
+            "entries": list(self._entries.items()),
+            "counts": (self.hits, self.misses, self.merged),
+        }
+
+    def import_state(self, state: dict) -> None:
+        self._entries.update((key, tuple(entry)) for key, entry in state["entries"])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.hits, self.misses, self.merged = state["counts"]
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            await self._writer
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+
+@dataclass
+class _Turn:
+    role: str
+    content: str
+    tokens: int
+
+
+@dataclass
+class _ChannelMemory:
+    turns: deque = field(default_factory=deque)
+    summary: str = ""
+    summary_tokens: int = 0
+    tokens: int = 0
+    chars: int = 0
+    overflow: list = field(default_factory=list)  # turns waiting to be folded into the summary
+    compacting: bool = False
+    last_used: float = 0.0
+
+
+class ConversationMemory:
+    """Per-channel chat history kept within a token budget.
+
+    Each channel holds a ring of its most recent turns. When the turns plus
+    the rolling summary exceed ``token_budget``, the oldest turns are moved
+    out and folded into the summary by ``summarize(previous, transcript)`` in
+    a background task, so a reply never waits for compaction. Channels idle
+    for longer than ``idle_seconds`` are dropped, and the least recently used
+    ones go first once the total text held exceeds ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        summarize,
+        max_turns: int = CHAT_MEMORY_TURNS,
+        token_budget: int = CHAT_MEMORY_TOKENS,
+        idle_seconds: float = CHAT_MEMORY_IDLE_MIN * 60,
+        max_bytes: int = CHAT_MEMORY_MAX_KB * 1024,
+    ):
+        self._summarize = summarize
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.compactions = 0
+        self.evictions = 0
+        self._channels: OrderedDict[int, _ChannelMemory] = OrderedDict()
+        self._chars = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_turns > 0 and self.token_budget > 0
+
+    def context(self, channel_id: int) -> list[dict]:
+        """Messages to place between the system prompt and the new prompt."""
+
+        mem = self._channels.get(channel_id)
+        if mem is None:
+            return []
+        if time.monotonic() - mem.last_used > self.idle_seconds:
+            self._drop(channel_id)
+            return []
+        messages = []
+        if mem.summary:
+            messages.append({"role": "system", "content": f"Earlier in this channel: {mem.summary}"})
+        messages.extend({"role": t.role, "content": t.content} for t in mem.turns)
+        return messages
+
+    def record(self, channel_id: int, user_turn: str, reply: str) -> None:
+        if not self.enabled:
+            return
+        mem = self._channels.get(channel_id)
+        if mem is None:
+            mem = self._channels[channel_id] = _ChannelMemory()
+        self._channels.move_to_end(channel_id)
+        mem.last_used = time.monotonic()
+
+        for role, content in (("user", user_turn), ("assistant", reply)):
+            turn = _Turn(role, content, estimate_tokens(content))
+            mem.turns.append(turn)
+            mem.tokens += turn.tokens
+            mem.chars += len(content)
+            self._chars += len(content)
+
+        # drop whole exchanges, but keep at least the latest one verbatim
+        while len(mem.turns) > 2 and (
+            len(mem.turns) > self.max_turns or mem.tokens + mem.summary_tokens > self.token_budget
+        ):
+            for _ in range(2):
+                old = mem.turns.popleft()
+                mem.tokens -= old.tokens
+                mem.overflow.append(old)
+
+        if mem.overflow and not mem.compacting:
+            mem.compacting = True
+            task = asyncio.create_task(self._compact(channel_id, mem))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        self._evict(keep=channel_id)
+
+    async def _compact(self, channel_id: int, mem: _ChannelMemory) -> None:
+        try:
+            while mem.overflow:
+                batch, mem.overflow = mem.overflow, []
+                transcript = "\n".join(f"{t.role}: {t.content}" for t in batch)
+                try:
+                    summary = (await self._summarize(mem.summary, transcript)).strip()
+                except Exception:
+                    log.warning("Chat memory summary for channel %s failed; dropping %d turns", channel_id, len(batch))
+                    summary = mem.summary
+                released = sum(len(t.content) for t in batch) + len(mem.summary) - len(summary)
+                mem.summary = summary
+                mem.summary_tokens = estimate_tokens(summary) if summary else 0
+                mem.chars -= released
+                if self._channels.get(channel_id) is mem:
+                    self._chars -= released
+                self.compactions += 1
+        finally:
+            mem.compacting = False
+
+    def _drop(self, channel_id: int) -> None:
+        mem = self._channels.pop(channel_id, None)
+        if mem is not None:
+            self._chars -= mem.chars
+            self.evictions += 1
+
+    def _evict(self, keep: int) -> None:
+        cutoff = time.monotonic() - self.idle_seconds
+        for channel_id, mem in list(self._channels.items()):
+            # oldest first; stop at the first channel that is still fresh
+            if mem.last_used > cutoff:
+                break
+            self._drop(channel_id)
+        while self._chars > self.max_bytes and len(self._channels) > 1:
+            channel_id = next(iter(self._channels))
+            if channel_id == keep:
+                break
+            self._drop(channel_id)
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._channels),
+            "turns": sum(len(m.turns) for m in self._channels.values()),
+            "kb": self._chars / 1024,
+            "compactions": self.compactions,
+            "evictions": self.evictions,
+        }
+
+    def export_state(self) -> dict:
+        # turns being summarized right now are lost; ones still waiting go back
+        # in front of the recent turns and are trimmed again on the next reply
+        channels = []
+        for channel_id, mem in self._channels.items():
+            turns = [(t.role, t.content, t.tokens) for t in (*mem.overflow, *mem.turns)]
+            channels.append((channel_id, turns, mem.summary, mem.last_used))
+        return {
+            "channels": channels,
+            "counts": (self.compactions, self.evictions),
+        }
+
+    def import_state(self, state: dict) -> None:
+        for channel_id, turns, summary, last_used in state["channels"]:
+            mem = self._channels[channel_id] = _ChannelMemory(summary=summary, last_used=last_used)
+            mem.summary_tokens = estimate_tokens(summary) if summary else 0
+            mem.chars = len(summary)
+            for role, content, tokens in turns:
+                mem.turns.append(_Turn(role, content, tokens))
+                mem.tokens += tokens
+                mem.chars += len(content)
+            self._chars += mem.chars
+        self.compactions, self.evictions = state["counts"]
+
+    async def aclose(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
 
 class Chat(commands.Cog):
+    # @mentions in servers and DMs; Discord sends the content of messages
+    # that mention the bot even without the message_content intent
+    required_intents = discord.Intents(guild_messages=True, dm_messages=True)
+
     def __init__(self, bot):
         self.bot = bot
-        self.enabled = bool(OPENAI_API_KEY)
+        self.enabled = bot.ai.enabled
+        self.cache = ResponseCache()
+        self.memory = ConversationMemory(self._summarize)
+        self.moderation = Moderator(bot.ai, bot.metrics)
+
+    async def cog_load(self):
+        await self.moderation.refresh()
+        # mentions in allowed channels only; the router has already dropped bots
+        self.bot.router.add_route("chat.mention", self.on_mention, MessageClass.MENTION | MessageClass.ALLOWED)
+
+    async def cog_unload(self):
+        self.bot.router.remove_route("chat.mention")
+        await self.memory.aclose()
+        await self.cache.aclose()
+        self.moderation.close()
+
+    def export_state(self) -> dict:
+        return {
+            "cache": self.cache.export_state(),
+            "memory": self.memory.export_state(),
+            "moderation": self.moderation.export_state(),
+        }
+
+    def import_state(self, state: dict) -> None:
+        self.cache.import_state(state["cache"])
+        self.memory.import_state(state["memory"])
+        if "moderation" in state:  # handed over by a version without it
+            self.moderation.import_state(state["moderation"])
 
     def cog_check(self, ctx: commands.Context):
         return self.enabled
 
+    def _messages(self, prompt: str, context: list[dict] = ()) -> list[dict]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            *context,
+            {"role": "user", "content": prompt},
+        ]
+
+    async def _complete(self, prompt: str, context: list[dict] = (), requester: Requester | None = None) -> str:
+        return await self.bot.ai.complete(
+            self._messages(prompt, context),
+            model=OPENAI_MODEL,
+            temperature=OPENAI_TEMP,
+            max_tokens=OPENAI_MAX_TOKENS,
+            requester=requester,
+        )
+
+    async def _summarize(self, previous: str, transcript: str) -> str:
+        if previous:
+            transcript = f"Summary so far: {previous}\n\n{transcript}"
+        return await self.bot.ai.complete(
+            [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+            model=OPENAI_MODEL,
+            temperature=0.2,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            purpose="summary",
+        )
+
+    async def _generate(
+        self, prompt: str, send, context: list[dict] = (), requester: Requester | None = None
+    ) -> str:
+        """Call the API for ``prompt``, posting the answer through ``send``."""
+
+        if not AI_STREAM:
+            content = await self._complete(prompt, context, requester)
+            for chunk in split_message(content or "…"):
+                await send(chunk)
+            return content
+
+        reply = StreamingReply(send)
+        # closed even when feed() fails (e.g. an edit is rejected), so the
+        # concurrency slot and the HTTP stream are released right away
+        async with contextlib.aclosing(
+            self.bot.ai.stream(
+                self._messages(prompt, context),
+                model=OPENAI_MODEL,
+                temperature=OPENAI_TEMP,
+                max_tokens=OPENAI_MAX_TOKENS,
+                requester=requester,
+            )
+        ) as fragments:
+            async for delta in fragments:
+                await reply.feed(delta)
+        await reply.finish()
+        return reply.text.strip()
+
+    async def _answer(
+        self, prompt: str, send, context: list[dict] = (), requester: Requester | None = None
+    ) -> str:
+        """Answer ``prompt`` from the cache when possible, otherwise via the API."""
+
+        system = SYSTEM_PROMPT
+        if context:
+            # the same words mean something else after a different conversation
+            system += "\n" + json.dumps(context, sort_keys=True)
+        # the model that will actually answer: local and stub backends use their own
+        key = ResponseCache.make_key(prompt, self.bot.ai.backend.model(OPENAI_MODEL), OPENAI_TEMP, system)
+        content, source = await self.cache.get_or_compute(
+            key, lambda: self._generate(prompt, send, context, requester)
+        )
+        if source != "miss":
+            for chunk in split_message(content or "…"):
+                await send(chunk)
+        return content
+
     @app_commands.command(name="ai", description="Ask ChatGPT (guardrails on).")
     @app_commands.describe(prompt="Your question or prompt")
     async def ai(self, interaction: discord.Interaction, prompt: str):
@@ -29,79 +628,137 @@ class Chat(commands.Cog):
             await interaction.response.send_message("🔒 ChatGPT not configured yet.", ephemeral=True)
             return
 
-        await interaction.response.defer(thinking=True)
+        # blocklist, repeat and flood checks are local and instant: answer
+        # before deferring so only the caller sees the refusal
+        verdict = self.moderation.screen(prompt, interaction.user.id, exempt=interaction.user.id == OWNER_ID)
+        if verdict.blocked:
+            await interaction.response.send_message(f"🚫 {verdict.message}", ephemeral=True)
+            return
 
-        # lazy import to avoid hard dep if disabled
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        await interaction.response.defer(thinking=True)
 
         # cost & rate guardrails
         if len(prompt) > 2000:
             await interaction.followup.send("❌ Prompt too long (max 2000 chars).")
             return
+        if verdict.action == "review":
+            verdict = await self.moderation.review(prompt)
+            if verdict.blocked:
+                await interaction.edit_original_response(content=f"🚫 {verdict.message}")
+                return
 
-        async with _semaphore:
-            try:
-                # Create a concise, safe answer without blocking the event loop
-                resp = await asyncio.to_thread(
-                    client.chat.completions.create,
-                    model=OPENAI_MODEL,
-                    temperature=OPENAI_TEMP,
-                    max_tokens=OPENAI_MAX_TOKENS,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a helpful, concise assistant for a Discord server.",
-                        },
-                        {"role": "user", "content": prompt.strip()},
-                    ],
-                )
-                content = resp.choices[0].message.content.strip()
-                content = content[:1900]  # Discord message headroom
-                await interaction.followup.send(content or "…")
-            except Exception as e:
-                await interaction.followup.send(f"⚠️ AI error: {e}")
-
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot:
+        sent = []
+
+        async def progress(position: int, eta: float):
+            await interaction.edit_original_response(content=describe_queue(position, eta))
+
+        async def send(content: str):
+            # the first chunk replaces "thinking…" (or the queue notice)
+            if sent:
+                msg = await interaction.followup.send(content, wait=True)
+            else:
+                msg = await interaction.edit_original_response(content=content)
+            sent.append(msg)
+            return msg
+
+        requester = Requester(interaction.user.id, interaction.guild_id, progress)
+        try:
+            await self._answer(prompt.strip(), send, requester=requester)
+        except AdmissionRejected as e:
+            await interaction.followup.send(f"⏳ {e}")
+        except AIError as e:
+            await interaction.followup.send(f"⚠️ {e}")
+        except Exception:
+            log.exception("/ai failed")
+            await interaction.followup.send("⚠️ Something went wrong with the AI. The logs have details.")
+
+    @app_commands.command(
+        name="aicache", description="Owner: show AI response cache and moderation stats", extras={"owner_only": True}
+    )
+    async def aicache(self, interaction: discord.Interaction):
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message("🔒 Owner only.", ephemeral=True)
             return
 
-        if self.bot.user and self.bot.user.mentioned_in(message) and not message.mention_everyone:
-            if not self.enabled:
-                return
+        stats = self.cache.stats()
+        memory = self.memory.stats()
+        moderation = self.moderation.stats()
+        outcomes = " • ".join(f"{name} {count}" for name, count in sorted(moderation["counts"].items()))
+        if moderation["cached"]:
+            outcomes += f" • {moderation['cached']} verdicts cached ({moderation['cache_hits']} reused)"
+        top = ", ".join(f"`{term}` {count}" for term, count in moderation["top_terms"])
+        ttl = f"{self.cache.ttl:.0f}s" if self.cache.enabled else "disabled"
+        await interaction.response.send_message(
+            f"🗃️ AI cache (TTL {ttl}, max {self.cache.max_entries})\n"
+            f"hits: **{stats['hits']}** • merged: **{stats['merged']}** • misses: **{stats['misses']}**\n"
+            f"hit rate: **{stats['hit_rate']:.0%}** • entries: {stats['entries']} • in flight: {stats['inflight']}\n"
+            f"🧠 Chat memory: {memory['channels']} channels • {memory['turns']} turns • {memory['kb']:.1f} KB • "
+            f"{memory['compactions']} summaries • {memory['evictions']} evicted\n"
+            f"🛡️ Moderation: {moderation['terms']} blocklist terms • endpoint {moderation['endpoint']} • "
+            f"{outcomes or 'no prompts yet'}"
+            + (f" • top terms: {top}" if top else ""),
+            ephemeral=True,
+        )
 
-            prompt = re.sub(rf"<@!?{self.bot.user.id}>", "", message.content).strip()
-            if not prompt:
+    async def on_mention(self, message: discord.Message):
+        if not self.enabled:
+            return
+
+        prompt = self.bot.router.strip_mention(message.content)
+        if not prompt:
+            return
+        if len(prompt) > 2000:
+            await message.reply("❌ Prompt too long (max 2000 chars).")
+            return
+        verdict = await self.moderation.check(prompt, message.author.id, exempt=message.author.id == OWNER_ID)
+        if verdict.blocked:
+            await message.reply(f"🚫 {verdict.message}", delete_after=15)
+            return
+
+        sent = []
+        notice = []
+
+        async def progress(position: int, eta: float):
+            text = describe_queue(position, eta)
+            if notice:
+                await notice[0].edit(content=text)
+            else:
+                notice.append(await message.reply(text))
+
+        async def send(content: str):
+            # first chunk replies to the user (reusing the queue notice), overflow continues in the channel
+            if sent:
+                msg = await message.channel.send(content)
+            elif notice:
+                msg = await notice[0].edit(content=content)
+            else:
+                msg = await message.reply(content)
+            sent.append(msg)
+            return msg
+
+        channel_id = message.channel.id
+        context = self.memory.context(channel_id) if self.memory.enabled else []
+        # several people share a channel's memory; keep track of who said what
+        turn = f"{message.author.display_name}: {prompt}"
+
+        guild_id = message.guild.id if message.guild else None
+        requester = Requester(message.author.id, guild_id, progress)
+        async with message.channel.typing():
+            try:
+                content = await self._answer(turn if context else prompt, send, context, requester)
+            except AdmissionRejected as e:
+                # mentions have no cooldown; don't let the rejections pile up in the channel either
+                await message.reply(f"⏳ {e}", delete_after=15)
                 return
-            if len(prompt) > 2000:
-                await message.reply("❌ Prompt too long (max 2000 chars).")
+            except AIError as e:
+                await message.reply(f"⚠️ {e}")
                 return
-
-            from openai import OpenAI
-            client = OpenAI(api_key=OPENAI_API_KEY)
-
-            async with message.channel.typing():
-                async with _semaphore:
-                    try:
-                        resp = await asyncio.to_thread(
-                            client.chat.completions.create,
-                            model=OPENAI_MODEL,
-                            temperature=OPENAI_TEMP,
-                            max_tokens=OPENAI_MAX_TOKENS,
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": "You are a helpful, concise assistant for a Discord server.",
-                                },
-                                {"role": "user", "content": prompt},
-                            ],
-                        )
-                        content = resp.choices[0].message.content.strip()
-                        content = content[:1900]
-                        await message.reply(content or "…")
-                    except Exception as e:
-                        await message.reply(f"⚠️ AI error: {e}")
+            except Exception:
+                log.exception("Mention reply failed")
+                await message.reply("⚠️ Something went wrong with the AI. The logs have details.")
+                return
+        if content:
+            self.memory.record(channel_id, turn, content)
 
 async def setup(bot):
     cog = Chat(bot)
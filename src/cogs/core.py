@@ -22,7 +22,7 @@ class Core(commands.Cog):
             for chk in checks:
                 if getattr(chk, "__qualname__", "").startswith("is_owner") or "OWNER" in chk.__qualname__:
                     owner_only = True
-            if cmd.name == "sync":  # hardcode since we know it's owner only
+            if cmd.name == "sync" or cmd.extras.get("owner_only"):
                 owner_only = True
 
             desc = cmd.description or ""
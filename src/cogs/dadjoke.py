@@ -1,16 +1,32 @@
 import os
+import re
+import json
 import random
 import asyncio
+import logging
+from collections import deque
+from pathlib import Path
 import discord
 from discord.ext import commands
 from discord import app_commands
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or ""
+from services.admission import AdmissionRejected, Requester, describe_queue
+from services.resilience import AIError
+from services.shared import cooldown
+
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "150"))
 OPENAI_TEMP = float(os.getenv("OPENAI_TEMP", "0.7"))
 
-_semaphore = asyncio.Semaphore(2)
+# Pre-generated joke buffer (per topic), refilled in the background in batches
+JOKE_BUFFER_SIZE = int(os.getenv("DADJOKE_BUFFER_SIZE", "8"))
+JOKE_LOW_WATER = int(os.getenv("DADJOKE_LOW_WATER", "3"))
+JOKE_RECENT = int(os.getenv("DADJOKE_RECENT", "200"))  # recently served jokes never re-buffered
+JOKE_BUFFER_FILE = Path(os.getenv("DADJOKE_BUFFER_FILE", "~/.discord-bot-pi/dadjokes.json")).expanduser()
+if int(os.getenv("WORKER_ID", "0")):  # each sharded worker keeps its own buffer
+    JOKE_BUFFER_FILE = JOKE_BUFFER_FILE.with_name(f"{JOKE_BUFFER_FILE.stem}-{os.getenv('WORKER_ID')}.json")
+
+SYSTEM_PROMPT = "You tell short, groan-worthy dad jokes."
 
 TOPICS = [
     "Dungeons & Dragons",
@@ -23,46 +39,226 @@ TOPICS = [
     "Dogs",
 ]
 
+log = logging.getLogger(__name__)
+
+_LIST_PREFIX_RE = re.compile(r"^\s*(?:\d+\s*[.):-]|[-*•])\s*")
+
+
+def _joke_key(joke: str) -> str:
+    """Normalize a joke for duplicate detection."""
+
+    return "".join(ch for ch in joke.lower() if ch.isalnum())
+
+
+def parse_jokes(text: str) -> list[str]:
+    """Split a batched completion into individual one-line jokes."""
+
+    jokes = []
+    for line in text.splitlines():
+        line = _LIST_PREFIX_RE.sub("", line).strip().strip('"').strip()
+        if len(line) >= 10:
+            jokes.append(line)
+    return jokes
+
 
 class DadJoke(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.enabled = bool(OPENAI_API_KEY)
+        self.enabled = bot.ai.enabled
+        self.buffers: dict[str, deque[str]] = {topic: deque() for topic in TOPICS}
+        self.recent: deque[str] = deque(maxlen=JOKE_RECENT)
+        self._wake = asyncio.Event()
+        self._refill_task: asyncio.Task | None = None
+        self._restored = False  # buffers handed over by a hot reload; skip the file
+        self._m_served = bot.metrics.counter("dadjoke_served_total", "Dad jokes served", label="source")
+        bot.metrics.gauge(
+            "dadjoke_buffered", "Pre-generated jokes ready", lambda: sum(len(b) for b in self.buffers.values())
+        )
 
     def cog_check(self, ctx: commands.Context):
         return self.enabled
 
+    async def cog_load(self):
+        if not self.enabled or JOKE_BUFFER_SIZE <= 0:
+            return
+        if not self._restored:
+            await asyncio.to_thread(self._load_buffer)
+        self._refill_task = asyncio.create_task(self._refill_worker())
+
+    async def cog_unload(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            self._refill_task = None
+            await asyncio.to_thread(self._save_buffer, self._snapshot())
+
+    # ----- persistence -----
+
+    def _load_buffer(self) -> None:
+        try:
+            data = json.loads(JOKE_BUFFER_FILE.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            log.exception("Could not read dad joke buffer %s", JOKE_BUFFER_FILE)
+            return
+
+        self._restore(data)
+        log.info(
+            "Loaded %d buffered dad jokes from %s",
+            sum(len(b) for b in self.buffers.values()),
+            JOKE_BUFFER_FILE,
+        )
+
+    def _restore(self, data: dict) -> None:
+        self.recent.extend(data.get("recent", []))
+        for topic, jokes in data.get("buffers", {}).items():
+            if topic in self.buffers:
+                self.buffers[topic].extend(jokes[:JOKE_BUFFER_SIZE])
+
+    def export_state(self) -> dict:
+        return self._snapshot()
+
+    def import_state(self, state: dict) -> None:
+        self._restore(state)
+        self._restored = True
+
+    def _snapshot(self) -> dict:
+        return {
+            "buffers": {topic: list(jokes) for topic, jokes in self.buffers.items()},
+            "recent": list(self.recent),
+        }
+
+    @staticmethod
+    def _save_buffer(snapshot: dict) -> None:
+        try:
+            JOKE_BUFFER_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = JOKE_BUFFER_FILE.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(snapshot), encoding="utf-8")
+            os.replace(tmp_path, JOKE_BUFFER_FILE)
+        except OSError:
+            log.exception("Could not save dad joke buffer %s", JOKE_BUFFER_FILE)
+
+    # ----- background refill -----
+
+    async def _refill_worker(self) -> None:
+        while True:
+            self._wake.clear()
+            low = [topic for topic, jokes in self.buffers.items() if len(jokes) <= JOKE_LOW_WATER]
+            for topic in low:
+                try:
+                    await self._refill(topic)
+                except asyncio.CancelledError:
+                    raise
+                except AIError as e:
+                    # the AI layer has logged the cause; the rest of the topics would fail the same way
+                    log.warning("Dad joke refill failed for %s: %s", topic, e)
+                    break
+                except Exception:
+                    log.exception("Dad joke refill failed for %s", topic)
+            if low:
+                await asyncio.to_thread(self._save_buffer, self._snapshot())
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=600)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self, topic: str) -> None:
+        buffer = self.buffers[topic]
+        wanted = JOKE_BUFFER_SIZE - len(buffer)
+        if wanted <= 0:
+            return
+
+        content = await self.bot.ai.complete(
+            [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Tell me {wanted} different short, clean dad jokes about {topic}. "
+                        "Put each joke on its own single line, with no numbering and no blank lines."
+                    ),
+                },
+            ],
+            model=OPENAI_MODEL,
+            temperature=max(OPENAI_TEMP, 0.9),  # a bit more variety across the batch
+            max_tokens=OPENAI_MAX_TOKENS * wanted,
+            purpose="dadjoke_refill",
+        )
+
+        seen = {_joke_key(j) for j in self.recent} | {_joke_key(j) for j in buffer}
+        added = 0
+        for joke in parse_jokes(content):
+            key = _joke_key(joke)
+            if key in seen:
+                continue
+            seen.add(key)
+            buffer.append(joke)
+            added += 1
+            if len(buffer) >= JOKE_BUFFER_SIZE:
+                break
+        log.info("Buffered %d dad jokes about %s (%d ready)", added, topic, len(buffer))
+
+    def _take_buffered(self) -> str | None:
+        topics = [topic for topic, jokes in self.buffers.items() if jokes]
+        if not topics:
+            # all empty, e.g. after a failed refill: try again now rather than in 10 minutes
+            self._wake.set()
+            return None
+        topic = random.choice(topics)
+        joke = self.buffers[topic].popleft()
+        if len(self.buffers[topic]) <= JOKE_LOW_WATER:
+            self._wake.set()
+        return joke
+
+    # ----- command -----
+
     @app_commands.command(name="dadjoke", description="Get a random dad joke about games or dogs")
-    @app_commands.checks.cooldown(3, 10.0)
+    @cooldown(3, 10.0)
     async def dadjoke(self, interaction: discord.Interaction):
         if not self.enabled:
             await interaction.response.send_message("🔒 ChatGPT not configured yet.", ephemeral=True)
             return
 
+        joke = self._take_buffered()
+        if joke is not None:
+            self._m_served.labels("buffer").inc()
+            self.recent.append(joke)
+            await interaction.response.send_message(joke[:1900])
+            return
+
+        # buffer empty (cold start or a burst): fall back to a live call
         topic = random.choice(TOPICS)
         prompt = f"Tell me a short, clean dad joke about {topic}."
 
         await interaction.response.defer(thinking=True)
 
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        async def progress(position: int, eta: float):
+            await interaction.edit_original_response(content=describe_queue(position, eta))
 
-        async with _semaphore:
-            try:
-                resp = await asyncio.to_thread(
-                    client.chat.completions.create,
-                    model=OPENAI_MODEL,
-                    temperature=OPENAI_TEMP,
-                    max_tokens=OPENAI_MAX_TOKENS,
-                    messages=[
-                        {"role": "system", "content": "You tell short, groan-worthy dad jokes."},
-                        {"role": "user", "content": prompt},
-                    ],
-                )
-                content = resp.choices[0].message.content.strip()
-                await interaction.followup.send(content[:1900] or "…")
-            except Exception as e:
-                await interaction.followup.send(f"⚠️ AI error: {e}")
+        try:
+            content = await self.bot.ai.complete(
+                [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                model=OPENAI_MODEL,
+                temperature=OPENAI_TEMP,
+                max_tokens=OPENAI_MAX_TOKENS,
+                purpose="dadjoke",
+                requester=Requester(interaction.user.id, interaction.guild_id, progress),
+            )
+            self._m_served.labels("live").inc()
+            self.recent.append(content)
+            # replaces "thinking…" or the queue notice
+            await interaction.edit_original_response(content=content[:1900] or "…")
+        except AdmissionRejected as e:
+            await interaction.followup.send(f"⏳ {e}")
+        except AIError as e:
+            await interaction.followup.send(f"⚠️ {e}")
+        except Exception:
+            log.exception("Live dad joke failed")
+            await interaction.followup.send("⚠️ Something went wrong with the AI. The logs have details.")
 
 
 async def setup(bot):
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from cogs.photosaver import MEDIA_KINDS, PHOTO_BASE_DIR
+from services.metrics import format_bytes
+
+log = logging.getLogger(__name__)
+
+OWNER_ID = int(os.getenv("OWNER_ID", "0"))
+PAGE_SIZE = 10
+VIEW_TIMEOUT = 600  # seconds the page buttons keep working
+
+KIND_CHOICES = [app_commands.Choice(name=name, value=i) for i, name in enumerate(MEDIA_KINDS) if i]
+
+
+def _parse_day(value: str) -> datetime:
+    return datetime.strptime(value.strip(), "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class _Query:
+    title: str
+    channels: frozenset[int]
+    author_id: int | None = None
+    kind: int | None = None
+    after_id: int = 0
+    before_id: int = 1 << 63
+
+
+class _ResultsView(discord.ui.View):
+    """Pages through one search, newest first; the select re-uploads a file.
+
+    Pages are keyset-paginated on attachment id, so paging stays as cheap
+    as the first page however deep it goes.
+    """
+
+    def __init__(self, cog: "Photos", interaction: discord.Interaction, query: _Query):
+        super().__init__(timeout=VIEW_TIMEOUT)
+        self.cog = cog
+        self.interaction = interaction
+        self.query = query
+        self.cursors = [query.before_id]  # before_id of each page visited so far
+        self.rows: dict[int, object] = {}
+        self.has_next = False
+
+    async def render(self) -> discord.Embed | None:
+        """Fetch the current page; ``None`` if the catalog went away (PhotoSaver unloaded)."""
+
+        catalog = self.cog.catalog()
+        if catalog is None:
+            return None
+        q = self.query
+        started = time.perf_counter()
+        ids = catalog.search(
+            q.channels,
+            author_id=q.author_id,
+            kind=q.kind,
+            after_id=q.after_id,
+            before_id=self.cursors[-1],
+            limit=PAGE_SIZE + 1,
+        )
+        self.cog.search_seconds.observe(time.perf_counter() - started)
+        self.has_next = len(ids) > PAGE_SIZE
+        ids = ids[:PAGE_SIZE]
+        details = await asyncio.to_thread(self.cog.saver().index.details, ids)
+        # a file evicted between the search and the lookup just drops out
+        self.rows = {i: details[i] for i in ids if i in details}
+
+        embed = discord.Embed(title=f"🔎 {q.title}", color=discord.Color.blurple())
+        lines = []
+        for n, row in enumerate(self.rows.values(), start=(len(self.cursors) - 1) * PAGE_SIZE + 1):
+            name = discord.utils.escape_markdown(row["filename"] or str(row["attachment_id"]))[:60]
+            name = name.replace("[", "(").replace("]", ")")
+            link = f"https://discord.com/channels/{row['guild_id']}/{row['channel_id']}/{row['message_id']}"
+            lines.append(
+                f"`{n}.` <t:{int(row['created_at'])}:d> <#{row['channel_id']}> <@{row['author_id']}> "
+                f"[{name}]({link}) • {format_bytes(row['size'])}"
+            )
+        embed.description = "\n".join(lines) or "Nothing saved matches that."
+        embed.set_footer(text=f"Page {len(self.cursors)} • pick a file below to post it here (only you see it)")
+
+        self.newer.disabled = len(self.cursors) == 1
+        self.older.disabled = not self.has_next
+        self.pick.options = [
+            discord.SelectOption(
+                label=f"{n}. {row['filename'] or row['attachment_id']}"[:100],
+                value=str(attachment_id),
+                description=f"#{row['channel']} • {format_bytes(row['size'])}"[:100],
+            )
+            for n, (attachment_id, row) in enumerate(
+                self.rows.items(), start=(len(self.cursors) - 1) * PAGE_SIZE + 1
+            )
+        ]
+        self.pick.disabled = not self.rows
+        if not self.pick.options:
+            self.pick.options = [discord.SelectOption(label="No files", value="0")]
+        return embed
+
+    async def _show(self, interaction: discord.Interaction) -> None:
+        embed = await self.render()
+        if embed is None:
+            await interaction.response.edit_message(
+                content="📷 The photo archive isn't available.", embed=None, view=None
+            )
+            self.stop()
+            return
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self._show(interaction)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.has_next and self.rows:
+            self.cursors.append(min(self.rows))
+        await self._show(interaction)
+
+    @discord.ui.select(placeholder="Post one of these files here…")
+    async def pick(self, interaction: discord.Interaction, select: discord.ui.Select):
+        row = self.rows.get(int(select.values[0]))
+        if row is None:
+            await interaction.response.send_message("That file is no longer in the archive.", ephemeral=True)
+            return
+        path = PHOTO_BASE_DIR / row["path"]
+        limit = interaction.guild.filesize_limit if interaction.guild else 10 * 1024 * 1024
+        link = f"https://discord.com/channels/{row['guild_id']}/{row['channel_id']}/{row['message_id']}"
+        if not await asyncio.to_thread(path.is_file):
+            await interaction.response.send_message(f"The saved copy is gone; original: {link}", ephemeral=True)
+            return
+        if row["size"] > limit:
+            await interaction.response.send_message(f"Too big to post here; original: {link}", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        file = await asyncio.to_thread(discord.File, path, filename=row["filename"] or path.name)
+        await interaction.followup.send(content=link, file=file, ephemeral=True)
+
+    async def on_timeout(self) -> None:
+        try:
+            await self.interaction.edit_original_response(view=None)
+        except discord.HTTPException:
+            pass
+
+
+class Photos(commands.Cog):
+    """Search the archive PhotoSaver keeps, from Discord."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.search_seconds = bot.metrics.histogram("photo_search_seconds", "Time to search the photo catalog")
+
+    def saver(self):
+        return self.bot.get_cog("PhotoSaver")
+
+    def catalog(self):
+        saver = self.saver()
+        return saver.catalog if saver is not None else None
+
+    def _visible_channels(self, interaction: discord.Interaction) -> frozenset[int]:
+        """Archived channels of this server that the caller may read (the owner sees all of them)."""
+
+        guild = interaction.guild
+        archived = [cid for cid, gid in self.catalog().channel_guild.items() if gid == guild.id]
+        if interaction.user.id == OWNER_ID:
+            return frozenset(archived)
+        visible = set()
+        for channel_id in archived:
+            channel = guild.get_channel_or_thread(channel_id)
+            if channel is not None and channel.permissions_for(interaction.user).read_message_history:
+                visible.add(channel_id)
+        return frozenset(visible)
+
+    async def _search(self, interaction: discord.Interaction, title: str, **filters) -> None:
+        if self.saver() is None:
+            await interaction.response.send_message("📷 PhotoSaver isn't running.", ephemeral=True)
+            return
+        if self.catalog() is None:
+            await interaction.response.send_message(
+                "⏳ The photo catalog is still loading; try again in a moment.", ephemeral=True
+            )
+            return
+
+        channels = self._visible_channels(interaction)
+        channel_id = filters.pop("channel_id", None)
+        if channel_id is not None:
+            channels = channels & {channel_id}
+        if filters.get("kind") is not None:
+            title += f" • {MEDIA_KINDS[filters['kind']]}s"
+        view = _ResultsView(self, interaction, _Query(title, channels, **filters))
+        embed = await view.render()
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+    photos = app_commands.Group(name="photos", description="Search saved photos and videos", guild_only=True)
+
+    @photos.command(name="recent", description="Latest saved files in this server")
+    @app_commands.describe(kind="Only this kind of file")
+    @app_commands.rename(kind="type")
+    @app_commands.choices(kind=KIND_CHOICES)
+    async def recent(self, interaction: discord.Interaction, kind: int | None = None):
+        await self._search(interaction, "Recent", kind=kind)
+
+    @photos.command(name="channel", description="Saved files from one channel")
+    @app_commands.describe(channel="Channel the files were posted in", kind="Only this kind of file")
+    @app_commands.rename(kind="type")
+    @app_commands.choices(kind=KIND_CHOICES)
+    async def channel(
+        self,
+        interaction: discord.Interaction,
+        channel: discord.TextChannel | discord.Thread,
+        kind: int | None = None,
+    ):
+        await self._search(interaction, f"#{channel.name}", channel_id=channel.id, kind=kind)
+
+    @photos.command(name="user", description="Saved files someone posted")
+    @app_commands.describe(user="Who posted them", kind="Only this kind of file")
+    @app_commands.rename(kind="type")
+    @app_commands.choices(kind=KIND_CHOICES)
+    async def user(self, interaction: discord.Interaction, user: discord.User, kind: int | None = None):
+        await self._search(interaction, f"Posted by {user.display_name}", author_id=user.id, kind=kind)
+
+    @photos.command(name="range", description="Saved files posted between two dates")
+    @app_commands.describe(
+        start="First day, YYYY-MM-DD (UTC)",
+        end="Last day, YYYY-MM-DD (UTC; default: today)",
+        kind="Only this kind of file",
+    )
+    @app_commands.rename(kind="type")
+    @app_commands.choices(kind=KIND_CHOICES)
+    async def date_range(
+        self, interaction: discord.Interaction, start: str, end: str | None = None, kind: int | None = None
+    ):
+        try:
+            first = _parse_day(start)
+            last = _parse_day(end) if end else datetime.now(timezone.utc)
+        except ValueError:
+            await interaction.response.send_message("📅 Dates look like 2024-05-31.", ephemeral=True)
+            return
+        # attachment ids are snowflakes, so a time range is an id range
+        await self._search(
+            interaction,
+            f"{first:%Y-%m-%d} to {last:%Y-%m-%d}",
+            kind=kind,
+            after_id=discord.utils.time_snowflake(first),
+            before_id=discord.utils.time_snowflake(last.replace(hour=0, minute=0, second=0) + timedelta(days=1)),
+        )
+
+    @photos.command(name="type", description="Saved files of one kind")
+    @app_commands.describe(kind="Kind of file")
+    @app_commands.rename(kind="type")
+    @app_commands.choices(kind=KIND_CHOICES)
+    async def by_type(self, interaction: discord.Interaction, kind: int):
+        await self._search(interaction, "All", kind=kind)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Photos(bot))
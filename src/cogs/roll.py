@@ -1,22 +1,48 @@
-import random
-import re
+import asyncio
 import discord
 from discord.ext import commands
 from discord import app_commands
 
-# same v1-style regex: XdY or XdY±Z
-DICE_RE = re.compile(r"^\s*(\d{1,3})d(\d{1,3})(?:\s*([+-]\s*\d{1,4}))?\s*$")
+from services import dice as dice_engine
+from services.shared import cooldown
+
+MESSAGE_LIMIT = 1900  # Discord message headroom
+ODDS_DEFER_AFTER = 1.5  # seconds; defer the interaction if the math takes longer than this
+ROLL_INLINE_DICE = 1_000  # dice rolled (repeats and adv/dis included) on the event loop; more go to a thread
+
+
+def _roll_lines(expr: dice_engine.Expression, mode_val: str) -> tuple[list[str], list[int]]:
+    lines, totals = [], []
+    for i in range(expr.repeat):
+        prefix = f"#{i + 1} " if expr.repeat > 1 else ""
+        first = dice_engine.roll_once(expr)
+        if mode_val == "normal":
+            totals.append(first.total)
+            lines.append(f"{prefix}→ **{first.total}**  ({dice_engine.format_detail(first)})")
+            continue
+
+        # adv/dis: roll the whole expression twice and keep the better/worse total
+        second = dice_engine.roll_once(expr)
+        pick = max if mode_val == "advantage" else min
+        chosen = pick(first, second, key=lambda r: r.total)
+        totals.append(chosen.total)
+        lines.append(
+            f"{prefix}→ rolls: {first.total}, {second.total} → **{chosen.total}**  "
+            f"({dice_engine.format_detail(chosen)})"
+        )
+    return lines, totals
+
 
 class Roll(commands.Cog):
-    """/roll dice like 1d20, 3d6+2, with optional advantage/disadvantage."""
+    """/roll dice expressions like 1d20, 4d6kh3+2 or 6x 4d6kh3, with optional advantage/disadvantage."""
 
     def __init__(self, bot):
         self.bot = bot
 
-    @app_commands.command(name="roll", description="Roll dice (e.g., 1d20, 3d6+2)")
+    @app_commands.command(name="roll", description="Roll dice (e.g., 1d20, 3d6+2, 4d6kh3, 1d8!, 6x 4d6kh3)")
     @app_commands.describe(
-        dice="Format: XdY or XdY+Z (e.g., 1d20, 3d6+2)",
-        mode="normal (default), advantage, or disadvantage"
+        dice="e.g. 1d20+5, 4d6kh3, 2d20kl1, 1d8!+2, d%, 6x 4d6kh3",
+        mode="normal (default), advantage, or disadvantage (roll twice, keep the better/worse total)"
     )
     @app_commands.choices(
         mode=[
@@ -25,66 +51,126 @@ class Roll(commands.Cog):
             app_commands.Choice(name="disadvantage", value="disadvantage"),
         ]
     )
-    @app_commands.checks.cooldown(3, 10.0)  # per-user: 3 uses per 10s
+    @cooldown(3, 10.0)  # per-user: 3 uses per 10s
     async def roll(self, interaction: discord.Interaction, dice: str, mode: app_commands.Choice[str] = None):
-        m = DICE_RE.match(dice)
-        if not m:
-            await interaction.response.send_message("❌ Use formats like `1d20` or `3d6+2`.", ephemeral=True)
+        try:
+            expr = dice_engine.compile_expression(dice)
+        except dice_engine.DiceError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
             return
 
-        count, sides = int(m.group(1)), int(m.group(2))
-        mod_str = m.group(3)
-        bonus = int(mod_str.replace(" ", "")) if mod_str else 0
         mode_val = (mode.value if mode else "normal").lower()
 
-        if not (1 <= count <= 100 and 2 <= sides <= 1000 and -10000 <= bonus <= 10000):
-            await interaction.response.send_message("❌ Dice expression is out of bounds.", ephemeral=True)
-            return
+        # Everyday rolls are done right here; huge pools (or explosions of
+        # them) go to a thread so they can't stall the gateway heartbeat, and
+        # we defer when they risk the 3s interaction window, like /odds.
+        send = interaction.response.send_message
+        rolled = sum(d.count for d in expr.dice_terms) * expr.repeat * (1 if mode_val == "normal" else 2)
+        if rolled <= ROLL_INLINE_DICE:
+            lines, totals = _roll_lines(expr, mode_val)
+        else:
+            task = asyncio.ensure_future(asyncio.to_thread(_roll_lines, expr, mode_val))
+            done, _ = await asyncio.wait({task}, timeout=ODDS_DEFER_AFTER)
+            if not done:
+                await interaction.response.defer(thinking=True)
+                send = interaction.followup.send
+            lines, totals = await task
 
-        # Advantage/Disadvantage: only meaningful for single-die rolls (XdY where X=1)
-        if mode_val != "normal" and count != 1:
-            await interaction.response.send_message(
-                "⚠️ Advantage/disadvantage only works with a single die (e.g., `1d20+5`).",
-                ephemeral=True
-            )
-            return
-
-        if mode_val == "normal":
-            rolls = [random.randint(1, sides) for _ in range(count)]
-            total = sum(rolls) + bonus
-            detail = " + ".join(map(str, rolls))
-            if bonus:
-                detail += f" {'+' if bonus > 0 else ''}{bonus}"
-            await interaction.response.send_message(f"🎲 {dice.strip()} → **{total}**  ({detail})")
-            return
-
-        # adv/dis with single die
-        r1 = random.randint(1, sides)
-        r2 = random.randint(1, sides)
-        chosen = max(r1, r2) if mode_val == "advantage" else min(r1, r2)
-        total = chosen + bonus
-
-        chosen_label = "kept" if bonus == 0 else f"kept + {'+' if bonus > 0 else ''}{bonus}"
-        await interaction.response.send_message(
-            f"🎲 {dice.strip()} [{mode_val}] → rolls: {r1}, {r2} → **{total}** ({chosen} {chosen_label})"
-        )
+        header = f"🎲 {dice.strip()}" + (f" [{mode_val}]" if mode_val != "normal" else "")
+        if expr.repeat > 1:
+            header += f"  (sum of totals: **{sum(totals)}**)"
+        text = header + ("\n" if expr.repeat > 1 else " ") + "\n".join(lines)
+        if len(text) > MESSAGE_LIMIT:
+            text = text[: MESSAGE_LIMIT - 1] + "…"
+        await send(text)
 
     # Convenience commands: /adv and /dis
     @app_commands.command(name="adv", description="Roll with advantage (e.g., 1d20+5)")
-    @app_commands.describe(dice="Format: 1dY or 1dY+Z (e.g., 1d20+5)")
-    @app_commands.checks.cooldown(3, 10.0)
+    @app_commands.describe(dice="Any dice expression (e.g., 1d20+5)")
+    @cooldown(3, 10.0)
     async def adv(self, interaction: discord.Interaction, dice: str):
         # delegate to /roll with mode=advantage
         choice = app_commands.Choice(name="advantage", value="advantage")
         await self.roll.callback(self, interaction, dice, choice)  # type: ignore
 
     @app_commands.command(name="dis", description="Roll with disadvantage (e.g., 1d20+5)")
-    @app_commands.describe(dice="Format: 1dY or 1dY+Z (e.g., 1d20+5)")
-    @app_commands.checks.cooldown(3, 10.0)
+    @app_commands.describe(dice="Any dice expression (e.g., 1d20+5)")
+    @cooldown(3, 10.0)
     async def dis(self, interaction: discord.Interaction, dice: str):
         # delegate to /roll with mode=disadvantage
         choice = app_commands.Choice(name="disadvantage", value="disadvantage")
         await self.roll.callback(self, interaction, dice, choice)  # type: ignore
 
+    @app_commands.command(name="odds", description="Exact odds for a dice expression (e.g., 1d20+5, 8d6)")
+    @app_commands.describe(
+        dice="e.g. 1d20+5, 8d6, 4d6kh3, 2d20kl1+3",
+        target="Show the chance of rolling at least this total",
+        mode="normal (default), advantage, or disadvantage",
+    )
+    @app_commands.choices(
+        mode=[
+            app_commands.Choice(name="normal", value="normal"),
+            app_commands.Choice(name="advantage", value="advantage"),
+            app_commands.Choice(name="disadvantage", value="disadvantage"),
+        ]
+    )
+    @cooldown(3, 10.0)
+    async def odds(
+        self,
+        interaction: discord.Interaction,
+        dice: str,
+        target: int | None = None,
+        mode: app_commands.Choice[str] = None,
+    ):
+        try:
+            expr = dice_engine.compile_expression(dice)
+            # refuse oversized pools now, while the reply can still be ephemeral
+            dice_engine.check_odds(expr)
+        except dice_engine.DiceError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
+
+        mode_val = (mode.value if mode else "normal").lower()
+
+        # Memoized results come back instantly; big pools are computed off the
+        # event loop and we only defer when they risk the 3s interaction window.
+        # The summary (mean, percentiles, …) is computed there too, when the
+        # Distribution is built.
+        task = asyncio.ensure_future(asyncio.to_thread(dice_engine.distribution, expr, mode_val))
+        deferred = False
+        done, _ = await asyncio.wait({task}, timeout=ODDS_DEFER_AFTER)
+        if not done:
+            await interaction.response.defer(thinking=True)
+            deferred = True
+        send = interaction.followup.send if deferred else interaction.response.send_message
+
+        try:
+            dist = await task
+        except dice_engine.DiceError as e:
+            if deferred:
+                # the public "thinking…" message can't turn ephemeral; say it there
+                await interaction.edit_original_response(content=f"❌ {e}")
+            else:
+                await send(f"❌ {e}", ephemeral=True)
+            return
+
+        title = f"🎯 Odds for {dice_engine.Expression(expr.terms)}"
+        if mode_val != "normal":
+            title += f" [{mode_val}]"
+        embed = discord.Embed(title=title, color=discord.Color.blurple())
+        embed.add_field(name="Mean", value=f"{dist.mean:.2f}", inline=True)
+        embed.add_field(name="Std dev", value=f"{dist.stdev:.2f}", inline=True)
+        embed.add_field(name="Range", value=f"{dist.low} – {dist.high}", inline=True)
+        embed.add_field(
+            name="Percentiles",
+            value=" • ".join(f"p{q}: **{dist.percentile(q / 100)}**" for q in (5, 25, 50, 75, 95)),
+            inline=False,
+        )
+        if target is not None:
+            embed.add_field(name=f"P(total ≥ {target})", value=f"**{dist.at_least(target):.2%}**", inline=False)
+        if expr.repeat > 1:
+            embed.set_footer(text=f"Odds are per roll; {expr.repeat}x repeats are independent.")
+        await send(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(Roll(bot))
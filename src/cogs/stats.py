@@ -0,0 +1,187 @@
+import os
+import math
+import sys
+import time
+import asyncio
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+from services.metrics import Family, Histogram, Metrics, format_bytes, peak_rss_bytes, rss_bytes
+
+OWNER_ID = int(os.getenv("OWNER_ID", "0"))
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f} ms" if seconds < 10 else f"{seconds:.1f} s"
+
+
+def _summary(hist: Histogram) -> str:
+    return f"{hist.count}× • p50 {_ms(hist.quantile(0.5))} • p95 {_ms(hist.quantile(0.95))} • max {_ms(hist.max)}"
+
+
+class Stats(commands.Cog):
+    """Owner view of the bot's metrics registry."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @staticmethod
+    def _counter(metrics: Metrics, name: str) -> int:
+        metric = metrics.get(name)
+        if isinstance(metric, Family):
+            return sum(child.value for child in metric.children.values())
+        return metric.value if metric is not None else 0
+
+    def _commands_field(self, metrics: Metrics) -> str:
+        latency = metrics.get("command_seconds")
+        errors = metrics.get("command_errors_total")
+        rows = sorted(latency.children.items(), key=lambda item: -item[1].count)[:8]
+        lines = []
+        for name, hist in rows:
+            failed = errors.children.get(name)
+            suffix = f" • {failed.value} err" if failed and failed.value else ""
+            lines.append(f"`/{name}` {_summary(hist)}{suffix}")
+        return "\n".join(lines) or "No commands yet."
+
+    def _ai_field(self, metrics: Metrics) -> str:
+        latency = metrics.get("ai_request_seconds")
+        errors = metrics.get("ai_errors_total")
+        lines = []
+        for purpose, hist in sorted(latency.children.items()):
+            failed = errors.children.get(purpose)
+            suffix = f" • {failed.value} err" if failed and failed.value else ""
+            lines.append(f"{purpose}: {_summary(hist)}{suffix}")
+        wait = metrics.get("ai_queue_wait_seconds")
+        first = metrics.get("ai_first_token_seconds")
+        lines.append(
+            f"queue wait p95 {_ms(wait.quantile(0.95))} • first token p50 {_ms(first.quantile(0.5))} • "
+            f"waiting now {metrics.read_gauge('ai_queue_depth')}"
+        )
+        failures = metrics.get("ai_attempt_failures_total")
+        if failures is not None and failures.children:
+            reasons = ", ".join(f"{reason} {c.value}" for reason, c in sorted(failures.children.items()))
+            open_models = [model for model, is_open in (metrics.read_gauge("ai_breaker_open") or {}).items() if is_open]
+            lines.append(
+                f"failed attempts: {reasons} • retries {self._counter(metrics, 'ai_retries_total')} • "
+                f"fallbacks {self._counter(metrics, 'ai_fallbacks_total')} • "
+                f"hedges {self._counter(metrics, 'ai_hedges_total')} • "
+                f"breaker {'OPEN: ' + ', '.join(open_models) if open_models else 'closed'}"
+            )
+        return "\n".join(lines)
+
+    def _photos_field(self, metrics: Metrics) -> str | None:
+        download = metrics.get("photo_download_seconds")
+        if download is None:
+            return None
+        return (
+            f"saved {self._counter(metrics, 'photo_saved_files_total')} • failed {self._counter(metrics, 'photo_failed_total')} • "
+            f"{format_bytes(self._counter(metrics, 'photo_downloaded_bytes_total'))} downloaded\n"
+            f"download {_summary(download)}\n"
+            f"queue {metrics.read_gauge('photo_queue_depth')} • byte budget wait p95 "
+            f"{_ms(metrics.get('photo_budget_wait_seconds').quantile(0.95))} • archive "
+            f"{format_bytes(metrics.read_gauge('photo_archive_bytes') or 0)}"
+        )
+
+    @app_commands.command(name="stats", description="Owner: latency, queue and error metrics", extras={"owner_only": True})
+    async def stats(self, interaction: discord.Interaction):
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message("🔒 Owner only.", ephemeral=True)
+            return
+
+        metrics = await self.bot.cluster_metrics()  # all worker processes when sharded
+        lag = metrics.get("event_loop_lag_seconds")
+        router = metrics.read_gauge("gateway_messages") or {}
+        routed = router.get("received", 0) - router.get("dropped_bot", 0) - router.get("dropped_unrouted", 0)
+        uptime = int(time.time() - metrics.started)
+        heartbeat = _ms(self.bot.latency) if math.isfinite(self.bot.latency) else "n/a"
+
+        embed = discord.Embed(title="📈 Bot metrics", color=discord.Color.blurple())
+        embed.add_field(name="Slash commands", value=self._commands_field(metrics), inline=False)
+        if self.bot.ai.enabled:
+            embed.add_field(name=f"AI ({self.bot.ai.backend.name})", value=self._ai_field(metrics), inline=False)
+        photos = self._photos_field(metrics)
+        if photos:
+            embed.add_field(name="PhotoSaver", value=photos, inline=False)
+        embed.add_field(
+            name="Event loop",
+            value=f"lag p50 {_ms(lag.quantile(0.5))} • p99 {_ms(lag.quantile(0.99))} • max {_ms(lag.max)}",
+            inline=False,
+        )
+        embed.add_field(
+            name="Gateway",
+            value=(
+                f"heartbeat {heartbeat} • messages {router.get('received', 0)} "
+                f"(routed {routed}, bots {router.get('dropped_bot', 0)})"
+            ),
+            inline=False,
+        )
+        embed.set_footer(text=f"Uptime {uptime // 3600}h {uptime % 3600 // 60}m")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def _cogs_field(self) -> str:
+        lines = []
+        chat = self.bot.get_cog("Chat")
+        if chat is not None:
+            cache, memory = chat.cache.stats(), chat.memory.stats()
+            lines.append(f"AI cache {cache['entries']} answers • chat memory {memory['kb']:.1f} KB")
+        saver = self.bot.get_cog("PhotoSaver")
+        if saver is not None:
+            catalog = f"{len(saver.catalog)} files" if saver.catalog is not None else "loading"
+            lines.append(f"photo catalog {catalog} • download queue {saver.queue.qsize()}")
+        jokes = self.bot.get_cog("DadJoke")
+        if jokes is not None:
+            lines.append(f"dad jokes buffered {sum(len(b) for b in jokes.buffers.values())}")
+        return "\n".join(lines) or "No cogs with caches loaded."
+
+    @app_commands.command(
+        name="memory", description="Owner: process memory and cache sizes", extras={"owner_only": True}
+    )
+    async def memory(self, interaction: discord.Interaction):
+        if interaction.user.id != OWNER_ID:
+            await interaction.response.send_message("🔒 Owner only.", ephemeral=True)
+            return
+
+        bot = self.bot
+        guilds = bot.guilds
+        members = sum(len(g.members) for g in guilds)
+        member_total = sum(g.member_count or 0 for g in guilds)
+        max_messages = bot._connection.max_messages
+        intents = [name for name, on in bot.intents if on]
+
+        embed = discord.Embed(title="🧮 Memory", color=discord.Color.blurple())
+        embed.add_field(
+            name="Process",
+            value=(
+                f"RSS {format_bytes(rss_bytes())} • peak {format_bytes(peak_rss_bytes())} • "
+                f"{sys.getallocatedblocks():,} Python blocks"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name=f"Runtime ({bot.runtime_profile} profile)",
+            value=(
+                f"loop {type(asyncio.get_running_loop()).__module__.split('.')[0]} • "
+                f"JSON {'orjson' if discord.utils.HAS_ORJSON else 'json'} • "
+                f"intents {', '.join(intents)}"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name="discord.py caches",
+            value=(
+                f"{len(guilds)} guilds • {sum(len(g.channels) for g in guilds)} channels • "
+                f"members {members}/{member_total} • users {len(bot.users)}\n"
+                f"messages {len(bot.cached_messages)}/{max_messages if max_messages else 'off'} • "
+                f"emojis {len(bot.emojis)} • stickers {len(bot.stickers)}"
+            ),
+            inline=False,
+        )
+        embed.add_field(name="Bot caches", value=self._cogs_field(), inline=False)
+        if bot.shared is not None:
+            embed.set_footer(text=f"Worker {bot.worker_id} only")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Stats(bot))
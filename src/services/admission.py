@@ -0,0 +1,299 @@
+import asyncio
+import contextlib
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from services.metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+AI_QUEUE_SIZE = int(os.getenv("AI_QUEUE_SIZE", "20"))  # waiting requests before new ones are turned away
+AI_USER_PER_MIN = float(os.getenv("AI_USER_PER_MIN", "6"))  # 0 disables the per-user limit
+AI_USER_BURST = int(os.getenv("AI_USER_BURST", "3"))
+AI_GUILD_PER_MIN = float(os.getenv("AI_GUILD_PER_MIN", "30"))  # 0 disables the per-guild limit
+AI_GUILD_BURST = int(os.getenv("AI_GUILD_BURST", "10"))
+AI_OWNER_PRIORITY = os.getenv("AI_OWNER_PRIORITY", "1").lower() not in {"0", "false", "no", "off"}
+OWNER_ID = int(os.getenv("OWNER_ID", "0"))
+
+QUEUE_UPDATE_INTERVAL = 2.0  # seconds between queue position updates
+MAX_BUCKETS = 5000  # idle, refilled buckets are pruned past this
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of queueing; ``str(e)`` is fit to show to the user."""
+
+    reason = "rejected"
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(AdmissionRejected):
+    reason = "rate_limited"
+
+
+class QueueFull(AdmissionRejected):
+    reason = "queue_full"
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self, now: float) -> float:
+        """Seconds until a token is available; 0 when one is available now."""
+
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+@dataclass
+class Requester:
+    """Who an AI request is for; ``progress(position, eta_seconds)`` is awaited while it queues."""
+
+    user_id: int
+    guild_id: int | None = None
+    progress: object = None
+
+
+@dataclass(eq=False)
+class _Ticket:
+    key: object
+    future: asyncio.Future
+    priority: bool
+    reported: tuple = field(default=())
+
+
+def describe_queue(position: int, eta: float) -> str:
+    """User-facing queue notice, e.g. for editing into a placeholder message."""
+
+    return f"⏳ You're #{position} in line for the AI (about {max(1, round(eta))}s)…"
+
+
+class AdmissionController:
+    """Decides when each AI request may start.
+
+    At most ``concurrency`` requests run at once. Requests beyond that wait in
+    one queue per user, served round-robin so a single busy user cannot
+    starve the rest; priority users (the owner) go ahead of everyone. Token
+    buckets per user and per guild, and a bound on the total queue length,
+    turn excess load away immediately instead of letting latency grow.
+    Requests without a requester (background work) share one queue and skip
+    the buckets.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_queue: int = AI_QUEUE_SIZE,
+        user_rate: tuple[float, int] = (AI_USER_PER_MIN, AI_USER_BURST),
+        guild_rate: tuple[float, int] = (AI_GUILD_PER_MIN, AI_GUILD_BURST),
+        priority_users: frozenset[int] = frozenset({OWNER_ID} if OWNER_ID and AI_OWNER_PRIORITY else ()),
+        metrics: Metrics | None = None,
+        shared=None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.user_rate = user_rate
+        self.guild_rate = guild_rate
+        self.priority_users = priority_users
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 3.0  # moving average of how long a request holds its slot
+        self._queues: OrderedDict[object, deque[_Ticket]] = OrderedDict()  # front = served next
+        self._priority: deque[_Ticket] = deque()
+        self._user_buckets: dict[int, TokenBucket] = {}
+        self._guild_buckets: dict[int, TokenBucket] = {}
+        self.shared = shared  # services.shared.SharedState: buckets shared across worker processes
+
+        metrics = metrics or Metrics()
+        self._m_rejected = metrics.counter("ai_rejected_total", "AI requests turned away", label="reason")
+        metrics.gauge("ai_queue_depth", "Requests waiting for a concurrency slot", lambda: self.waiting)
+        metrics.gauge("ai_active", "Requests holding a concurrency slot", lambda: self.active)
+
+    # ----- rate limits -----
+
+    @staticmethod
+    def _bucket(buckets: dict[int, TokenBucket], key: int, rate: tuple[float, int], now: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= MAX_BUCKETS:
+                for stale in [k for k, b in buckets.items() if b.full(now)]:
+                    del buckets[stale]
+            bucket = buckets[key] = TokenBucket(*rate)
+        return bucket
+
+    def _reject_rate(self, who: str, wait: float) -> RateLimited:
+        self._m_rejected.labels(RateLimited.reason).inc()
+        return RateLimited(f"{who} sending AI requests too quickly; try again in {math.ceil(wait)}s.", wait)
+
+    async def _take_shared_tokens(self, requester: Requester) -> None:
+        limits = []
+        if self.user_rate[0] > 0:
+            limits.append(("You're", f"ai:user:{requester.user_id}", self.user_rate))
+        if self.guild_rate[0] > 0 and requester.guild_id is not None:
+            limits.append(("This server is", f"ai:guild:{requester.guild_id}", self.guild_rate))
+        for who, key, (per_minute, burst) in limits:
+            wait = await self.shared.take_token(key, per_minute, burst)
+            if wait > 0:
+                raise self._reject_rate(who, wait)
+
+    def _take_tokens(self, requester: Requester) -> None:
+        now = time.monotonic()
+        buckets = []
+        if self.user_rate[0] > 0:
+            buckets.append(("You're", self._bucket(self._user_buckets, requester.user_id, self.user_rate, now)))
+        if self.guild_rate[0] > 0 and requester.guild_id is not None:
+            bucket = self._bucket(self._guild_buckets, requester.guild_id, self.guild_rate, now)
+            buckets.append(("This server is", bucket))
+        # check every bucket before taking from any, so a rejection costs nothing
+        for who, bucket in buckets:
+            wait = bucket.retry_after(now)
+            if wait > 0:
+                raise self._reject_rate(who, wait)
+        for _, bucket in buckets:
+            bucket.take()
+
+    # ----- queue -----
+
+    def _position(self, ticket: _Ticket) -> int:
+        """1-based place in line, following the round-robin order."""
+
+        if ticket.priority:
+            return self._priority.index(ticket) + 1
+        ahead = len(self._priority)
+        own = self._queues.get(ticket.key)
+        if own is None:
+            return ahead + 1
+        turn = own.index(ticket)
+        before = True  # users ahead of ours in the rotation get one more turn
+        for key, queue in self._queues.items():
+            if key == ticket.key:
+                before = False
+                ahead += turn
+                continue
+            ahead += min(len(queue), turn + 1 if before else turn)
+        return ahead + 1
+
+    def eta(self, position: int) -> float:
+        return math.ceil(position / self.concurrency) * self.service_time
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        if ticket.priority:
+            self._priority.append(ticket)
+        else:
+            self._queues.setdefault(ticket.key, deque()).append(ticket)
+        self.waiting += 1
+
+    def _discard(self, ticket: _Ticket) -> None:
+        if ticket.priority:
+            self._priority.remove(ticket)
+        else:
+            queue = self._queues[ticket.key]
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.key]
+        self.waiting -= 1
+
+    def _next(self) -> _Ticket | None:
+        if self._priority:
+            ticket = self._priority.popleft()
+        elif self._queues:
+            key, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+        else:
+            return None
+        self.waiting -= 1
+        return ticket
+
+    def _release(self) -> None:
+        # hand the slot straight to the next waiter; ``active`` stays the same
+        while True:
+            ticket = self._next()
+            if ticket is None:
+                self.active -= 1
+                return
+            if not ticket.future.done():
+                ticket.future.set_result(None)
+                return
+
+    async def _report(self, ticket: _Ticket, requester: Requester) -> None:
+        position = self._position(ticket)
+        eta = self.eta(position)
+        state = (position, round(eta))
+        if state == ticket.reported:
+            return
+        ticket.reported = state
+        try:
+            await requester.progress(position, eta)
+        except Exception:
+            log.debug("Queue progress callback failed", exc_info=True)
+
+    async def _admit(self, requester: Requester | None) -> None:
+        priority = requester is not None and requester.user_id in self.priority_users
+        if not priority and self.waiting >= self.max_queue and self.active >= self.concurrency:
+            self._m_rejected.labels(QueueFull.reason).inc()
+            raise QueueFull("The AI is busy right now; please try again in a minute.", self.eta(self.waiting))
+        if requester is not None and not priority:
+            if self.shared is not None:
+                await self._take_shared_tokens(requester)
+            else:
+                self._take_tokens(requester)
+
+        if self.active < self.concurrency and not self.waiting:
+            self.active += 1
+            return
+
+        ticket = _Ticket(requester.user_id if requester else None, asyncio.get_running_loop().create_future(), priority)
+        self._enqueue(ticket)
+        try:
+            while not ticket.future.done():
+                if requester is not None and requester.progress is not None:
+                    await self._report(ticket, requester)
+                await asyncio.wait({ticket.future}, timeout=QUEUE_UPDATE_INTERVAL)
+        except asyncio.CancelledError:
+            if ticket.future.done():
+                self._release()  # the slot was already ours; pass it on
+            else:
+                ticket.future.cancel()
+                self._discard(ticket)
+            raise
+
+    @contextlib.asynccontextmanager
+    async def slot(self, requester: Requester | None = None):
+        """Wait for a turn; raises ``AdmissionRejected`` when the request is turned away."""
+
+        await self._admit(requester)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_time += 0.2 * (time.monotonic() - started - self.service_time)
+            self._release()
@@ -0,0 +1,307 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+
+from services.admission import AdmissionController, Requester
+from services.llm import LLMBackend, create_backend, fit_messages
+from services.metrics import Metrics
+from services.resilience import (
+    AI_DEADLINE,
+    AI_HEDGE,
+    AI_RETRIES,
+    BACKOFF_CAP,
+    AIError,
+    CircuitBreaker,
+    CircuitOpen,
+    LatencyWindow,
+    backoff,
+    failure_reason,
+    hedged,
+    retry_after_header,
+    user_message,
+)
+
+log = logging.getLogger(__name__)
+
+# tried once when OPENAI_MODEL keeps failing or its breaker is open; "" = no fallback.
+# Backends with a single model of their own (local, stub) map both to it.
+OPENAI_FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "")
+
+
+class AIScheduler:
+    """The one LLM backend (see ``services.llm``) plus one global concurrency limit for AI calls.
+
+    The limit defaults to what the backend declares (``AI_CONCURRENCY``
+    overrides it), and requests are clamped to the backend's token limits:
+    replies to ``max_output_tokens``, and the oldest chat history is dropped
+    when the prompt would not leave room for the reply in ``context_tokens``.
+
+    Every request runs under the policy in ``services.resilience``: an
+    adaptive per-attempt timeout, jittered retries of transient errors, an
+    optional hedged second request past p95 latency, a circuit breaker per
+    model, and one try on ``fallback_model`` when the requested model fails.
+    Final failures surface as ``AIError`` with a user-facing message.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend | None = None,
+        concurrency: int | None = None,
+        metrics: Metrics | None = None,
+        shared=None,
+        fallback_model: str = OPENAI_FALLBACK_MODEL,
+        retries: int = AI_RETRIES,
+        hedge: bool = AI_HEDGE,
+        deadline: float = AI_DEADLINE,
+    ):
+        self.backend = backend or create_backend()
+        self.concurrency = max(1, concurrency or int(os.getenv("AI_CONCURRENCY", "0")) or self.backend.concurrency)
+        self.backend.concurrency = self.concurrency  # e.g. sizes the HTTP connection pool
+        metrics = metrics or Metrics()
+        self.admission = AdmissionController(self.concurrency, metrics=metrics, shared=shared)
+        self._m_latency = metrics.histogram("ai_request_seconds", "OpenAI request duration", label="purpose")
+        self._m_first_token = metrics.histogram("ai_first_token_seconds", "Time to the first streamed token")
+        self._m_errors = metrics.counter("ai_errors_total", "Failed OpenAI requests", label="purpose")
+        self._m_wait = metrics.histogram("ai_queue_wait_seconds", "Time spent waiting for a concurrency slot")
+        self._m_attempt_failures = metrics.counter(
+            "ai_attempt_failures_total", "Failed OpenAI attempts, before retries", label="reason"
+        )
+        self._m_retries = metrics.counter("ai_retries_total", "OpenAI attempts retried", label="purpose")
+        self._m_hedges = metrics.counter("ai_hedges_total", "Hedged second requests", label="outcome")
+        self._m_fallbacks = metrics.counter("ai_fallbacks_total", "Requests answered by the fallback model", label="purpose")
+        metrics.gauge(
+            "ai_breaker_open",
+            "1 while a model's circuit breaker is open",
+            lambda: {model: int(b.is_open) for model, b in self.breakers.items()},
+            label="model",
+            merge="max",
+        )
+        self.fallback_model = fallback_model
+        self.retries = max(0, retries)
+        self.hedge = hedge
+        self.deadline = deadline
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self._latencies: dict[tuple, LatencyWindow] = {}  # (model, purpose, streaming) -> recent latencies
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend.enabled
+
+    async def warm_up(self, model: str) -> None:
+        """Get the backend ready (SDK imported, connection open) before the first request.
+
+        Failures are logged and otherwise ignored; the first real request
+        then retries the setup.
+        """
+
+        if not self.enabled:
+            return
+        started = time.perf_counter()
+        try:
+            await self.backend.warm_up(self.backend.model(model))
+        except Exception as e:
+            log.warning("AI warm-up failed after %.2fs: %s", time.perf_counter() - started, e)
+            return
+        log.info("AI warm-up done (%s backend) in %.2fs", self.backend.name, time.perf_counter() - started)
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, purpose: str, requester: Requester | None):
+        """Hold a concurrency slot, recording queue wait, duration and failures."""
+
+        queued = time.perf_counter()
+        async with self.admission.slot(requester):
+            started = time.perf_counter()
+            self._m_wait.observe(started - queued)
+            try:
+                yield started
+            except Exception:
+                self._m_errors.labels(purpose).inc()
+                raise
+            finally:
+                self._m_latency.labels(purpose).observe(time.perf_counter() - started)
+
+    def _fit(self, messages: list[dict], max_tokens: int) -> tuple[list[dict], int]:
+        max_tokens = min(max_tokens, self.backend.max_output_tokens)
+        fitted = fit_messages(messages, self.backend.context_tokens, max_tokens)
+        if fitted is None:
+            raise AIError("That's too long for the AI to read; try something shorter.")
+        return fitted, max_tokens
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = self.breakers[model] = CircuitBreaker()
+        return breaker
+
+    def _models(self, model: str) -> list[str]:
+        """Models to try, in order; fails fast when every breaker is open."""
+
+        models = [self.backend.model(model)]
+        if self.fallback_model and self.backend.model(self.fallback_model) not in models:
+            models.append(self.backend.model(self.fallback_model))
+        available = [m for m in models if self._breaker(m).available()]
+        if not available:
+            wait = min(self._breaker(m).retry_after() for m in models)
+            raise CircuitOpen(f"The AI is having an outage; trying again in about {max(1, round(wait))}s.", wait)
+        return available
+
+    async def _call(self, models: list[str], purpose: str, streaming: bool, attempt, discard=None):
+        """Run ``attempt(model, timeout)`` under the retry/hedge/breaker/fallback policy."""
+
+        deadline = time.monotonic() + self.deadline
+        error: BaseException | None = None
+        for model in models:
+            breaker = self._breaker(model)
+            latencies = self._latencies.setdefault((model, purpose, streaming), LatencyWindow())
+            tries = self.retries + 1 if model == models[0] else 1
+            for n in range(tries):
+                timeout = latencies.timeout(deadline - time.monotonic())
+                if timeout <= 0 or not breaker.allow():
+                    break
+                started = time.monotonic()
+
+                async def run_attempt(model=model, timeout=timeout):
+                    return await asyncio.wait_for(attempt(model, timeout), timeout)
+
+                try:
+                    result = await hedged(
+                        run_attempt,
+                        latencies.hedge_after() if self.hedge else None,
+                        discard,
+                        lambda outcome: self._m_hedges.labels(outcome).inc(),
+                    )
+                except Exception as e:
+                    reason = failure_reason(e)
+                    if reason is None:
+                        log.error("OpenAI %s request to %s failed: %r", purpose, model, e)
+                        raise AIError(user_message(e)) from e
+                    error = e
+                    breaker.record_failure()
+                    self._m_attempt_failures.labels(reason).inc()
+                    wait = backoff(n, retry_after_header(e))
+                    if n + 1 == tries or wait > BACKOFF_CAP or time.monotonic() + wait >= deadline:
+                        log.warning("OpenAI %s request to %s failed (%s): %r", purpose, model, reason, e)
+                        break
+                    log.info("OpenAI %s request to %s failed (%s); retry in %.1fs", purpose, model, reason, wait)
+                    self._m_retries.labels(purpose).inc()
+                    await asyncio.sleep(wait)
+                    continue
+                breaker.record_success()
+                latencies.add(time.monotonic() - started)
+                if model != models[0]:
+                    self._m_fallbacks.labels(purpose).inc()
+                return result
+        if error is None:
+            raise CircuitOpen("The AI is having an outage; please try again in a bit.")
+        raise AIError(user_message(error)) from error
+
+    async def complete(
+        self,
+        messages: list[dict],
+        *,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        purpose: str = "chat",
+        requester: Requester | None = None,
+    ) -> str:
+        """Run one chat completion and return the stripped reply text.
+
+        ``purpose`` only labels the metrics (``chat``, ``dadjoke``, …).
+        ``requester`` subjects the call to that user's rate limits and fair
+        share; background work passes nothing. Raises ``AdmissionRejected``
+        when the request is turned away and ``AIError`` when it fails.
+        """
+
+        models = self._models(model)
+        messages, max_tokens = self._fit(messages, max_tokens)
+
+        async def attempt(model: str, timeout: float):
+            return await self.backend.complete(
+                model, messages, temperature=temperature, max_tokens=max_tokens, timeout=timeout
+            )
+
+        async with self._slot(purpose, requester):
+            return await self._call(models, purpose, False, attempt)
+
+    async def stream(
+        self,
+        messages: list[dict],
+        *,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        purpose: str = "chat",
+        requester: Requester | None = None,
+    ):
+        """Yield reply text fragments as the completion streams in.
+
+        The concurrency slot is held until the stream is exhausted or the
+        consumer stops iterating. Timeouts, retries and hedging cover the
+        wait for the first token; once text has been yielded a failure
+        raises ``AIError`` instead of starting over.
+        """
+
+        models = self._models(model)
+        messages, max_tokens = self._fit(messages, max_tokens)
+
+        async def attempt(model: str, timeout: float):
+            fragments = self.backend.stream(
+                model, messages, temperature=temperature, max_tokens=max_tokens, timeout=timeout
+            )
+            try:
+                async for text in fragments:
+                    return fragments, text
+                return fragments, ""
+            except BaseException:
+                await fragments.aclose()
+                raise
+
+        async def discard(opened):
+            await opened[0].aclose()
+
+        async with self._slot(purpose, requester) as started:
+            fragments, first = await self._call(models, purpose, True, attempt, discard)
+            self._m_first_token.observe(time.perf_counter() - started)
+            try:
+                if first:
+                    yield first
+                async for text in fragments:
+                    yield text
+            except Exception as e:
+                if failure_reason(e) is None:
+                    raise
+                log.warning("AI %s stream broke off: %r", purpose, e)
+                raise AIError("The AI stopped responding partway through; please try again.") from e
+            finally:
+                await fragments.aclose()
+
+    async def moderate(self, text: str, *, timeout: float) -> list[str]:
+        """Ask the backend's moderation endpoint about ``text``; see ``services.moderation``.
+
+        Moderation calls are free and quick, so they skip the admission
+        queue, but they get a timeout and a circuit breaker of their own.
+        Raises ``AIError`` when there is no answer.
+        """
+
+        breaker = self._breaker("moderation")
+        if not breaker.allow():
+            raise CircuitOpen("Moderation is unavailable.", breaker.retry_after())
+        started = time.perf_counter()
+        try:
+            flags = await asyncio.wait_for(self.backend.moderate(text, timeout=timeout), timeout)
+        except Exception as e:
+            if isinstance(e, NotImplementedError):
+                raise AIError("This AI backend has no moderation endpoint.") from e
+            breaker.record_failure()
+            self._m_errors.labels("moderation").inc()
+            raise AIError(user_message(e)) from e
+        finally:
+            self._m_latency.labels("moderation").observe(time.perf_counter() - started)
+        breaker.record_success()
+        return flags
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
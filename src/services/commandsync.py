@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import discord
+from discord import app_commands
+
+log = logging.getLogger(__name__)
+
+COMMAND_SYNC_FILE = Path(os.getenv("COMMAND_SYNC_FILE", "~/.discord-bot-pi/command-sync.json")).expanduser()
+
+
+class CommandSync:
+    """Sync the slash-command tree only when its payload actually changed.
+
+    After every successful sync the SHA-256 of the serialized command
+    payloads is stored per application and scope (a guild id or ``global``).
+    On the next start an unchanged fingerprint means Discord already has
+    exactly these commands, so the rate-limited REST call can be skipped.
+    """
+
+    def __init__(self, tree: app_commands.CommandTree, path: Path = COMMAND_SYNC_FILE):
+        self.tree = tree
+        self.path = path
+        self._fingerprints: dict[str, str] | None = None
+
+    def fingerprint(self, guild: discord.abc.Snowflake | None = None) -> str:
+        payloads = [cmd.to_dict(self.tree) for cmd in self.tree.get_commands(guild=guild)]
+        payloads.sort(key=lambda p: (p.get("type", 1), p["name"]))
+        blob = json.dumps(payloads, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _scope(self, guild: discord.abc.Snowflake | None) -> str:
+        application_id = self.tree.client.application_id
+        return f"{application_id}:{guild.id if guild else 'global'}"
+
+    def _load(self) -> dict[str, str]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            log.exception("Could not read command sync state %s", self.path)
+            return {}
+
+    def _save(self, fingerprints: dict[str, str]) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(fingerprints, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            log.exception("Could not save command sync state %s", self.path)
+
+    async def sync(
+        self, guild: discord.abc.Snowflake | None = None, *, force: bool = False
+    ) -> list[app_commands.AppCommand] | None:
+        """Sync ``guild`` (or global commands); returns ``None`` when skipped."""
+
+        if self._fingerprints is None:
+            self._fingerprints = await asyncio.to_thread(self._load)
+
+        scope = self._scope(guild)
+        digest = self.fingerprint(guild)
+        if not force and self._fingerprints.get(scope) == digest:
+            return None
+
+        synced = await self.tree.sync(guild=guild)
+        self._fingerprints[scope] = digest
+        await asyncio.to_thread(self._save, dict(self._fingerprints))
+        return synced
@@ -0,0 +1,592 @@
+"""Dice expression parser and roller used by the Roll cog.
+
+Supported syntax (case-insensitive)::
+
+    4d6kh3+1d8!+2     keep highest 3 of 4d6, exploding d8, flat bonus
+    2d20kl1           keep lowest (also ``dh``/``dl`` to drop, ``k`` = ``kh``)
+    d%                percentile die (same as 1d100)
+    6x 4d6kh3         repeat the whole expression six times
+
+Expressions are compiled once into a small AST and cached by their text.
+"""
+
+import bisect
+import functools
+import random
+import re
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from itertools import accumulate
+from math import comb
+
+try:  # optional: bulk-sample huge pools in one vectorized call
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional on the Pi
+    np = None
+
+MAX_POOL = 100_000  # dice in a single term
+MAX_TOTAL_DICE = 200_000  # dice across the whole expression (before repeats)
+MAX_SIDES = 10_000
+MAX_TERMS = 20
+MAX_REPEAT = 12
+MAX_EXPLOSIONS = 100  # re-rolls per exploding die
+MAX_BONUS = 100_000
+
+SHOW_ROLLS_LIMIT = 20  # list individual dice up to this many per term, summarize above
+_BULK_THRESHOLD = 64  # use numpy from this pool size when it's available
+
+_REPEAT_RE = re.compile(r"\s*(\d{1,3})\s*x\s*")
+_TERM_RE = re.compile(
+    r"\s*(?P<sign>[+-])?\s*(?:"
+    r"(?P<count>\d{0,6})d(?P<sides>\d{1,5}|%)(?P<explode>!)?(?:(?P<keep>kh|kl|dh|dl|k)(?P<keep_n>\d{1,6}))?"
+    r"|(?P<const>\d{1,6})"
+    r")\s*"
+)
+
+
+class DiceError(ValueError):
+    """Raised for malformed or out-of-bounds dice expressions."""
+
+
+@dataclass(frozen=True)
+class Dice:
+    count: int
+    sides: int
+    explode: bool = False
+    keep: int | None = None  # number of dice kept, None = all
+    keep_high: bool = True
+
+    def __str__(self) -> str:
+        text = f"{self.count}d{self.sides}" + ("!" if self.explode else "")
+        if self.keep is not None:
+            text += f"{'kh' if self.keep_high else 'kl'}{self.keep}"
+        return text
+
+
+@dataclass(frozen=True)
+class Const:
+    value: int
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+
+@dataclass(frozen=True)
+class Expression:
+    terms: tuple[tuple[int, Dice | Const], ...]  # (sign, node)
+    repeat: int = 1
+
+    def __str__(self) -> str:
+        text = ""
+        for sign, node in self.terms:
+            if text or sign < 0:
+                text += " - " if sign < 0 else " + "
+            text += str(node)
+        text = text.strip()
+        return f"{self.repeat}x {text}" if self.repeat > 1 else text
+
+    @property
+    def dice_terms(self) -> list[Dice]:
+        return [node for _, node in self.terms if isinstance(node, Dice)]
+
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(text: str) -> Expression:
+    """Parse ``text`` into an :class:`Expression` (cached by expression string)."""
+
+    source = text.strip().lower()
+    if not source:
+        raise DiceError("Empty dice expression.")
+
+    pos = 0
+    repeat = 1
+    m = _REPEAT_RE.match(source)
+    if m:
+        repeat = int(m.group(1))
+        pos = m.end()
+        if not 1 <= repeat <= MAX_REPEAT:
+            raise DiceError(f"Repeat count must be between 1 and {MAX_REPEAT}.")
+
+    terms = []
+    total_dice = 0
+    while pos < len(source):
+        m = _TERM_RE.match(source, pos)
+        if not m or m.end() == pos:
+            raise DiceError(f"Can't read `{source[pos:pos + 10]}` — try something like `4d6kh3+2`.")
+        if terms and not m.group("sign"):
+            raise DiceError("Separate terms with `+` or `-`.")
+        sign = -1 if m.group("sign") == "-" else 1
+
+        if m.group("const") is not None:
+            value = int(m.group("const"))
+            if value > MAX_BONUS:
+                raise DiceError(f"Flat modifiers are limited to {MAX_BONUS}.")
+            node = Const(value)
+        else:
+            count = int(m.group("count") or 1)
+            sides = 100 if m.group("sides") == "%" else int(m.group("sides"))
+            if not 1 <= count <= MAX_POOL:
+                raise DiceError(f"Dice per term must be between 1 and {MAX_POOL}.")
+            if not 2 <= sides <= MAX_SIDES:
+                raise DiceError(f"Dice need between 2 and {MAX_SIDES} sides.")
+
+            keep, keep_high = None, True
+            if m.group("keep"):
+                kind, n = m.group("keep"), int(m.group("keep_n"))
+                if kind in {"kh", "k", "kl"}:
+                    keep, keep_high = n, kind != "kl"
+                else:  # drop N highest/lowest == keep the rest from the other end
+                    keep, keep_high = count - n, kind == "dl"
+                if not 1 <= keep <= count:
+                    raise DiceError(f"Can't keep {keep} of {count} dice.")
+                if keep == count:
+                    keep = None
+            node = Dice(count, sides, bool(m.group("explode")), keep, keep_high)
+            total_dice += count
+        terms.append((sign, node))
+        pos = m.end()
+
+    if len(terms) > MAX_TERMS:
+        raise DiceError(f"At most {MAX_TERMS} terms per expression.")
+    if total_dice > MAX_TOTAL_DICE:
+        raise DiceError(f"At most {MAX_TOTAL_DICE} dice per expression.")
+    return Expression(tuple(terms), repeat)
+
+
+def _sample(count: int, sides: int, rng: random.Random):
+    """Return ``count`` uniform rolls of a ``sides``-sided die (list or ndarray)."""
+
+    if np is not None and count >= _BULK_THRESHOLD:
+        return _np_rng().integers(1, sides + 1, size=count)
+    return [rng.randint(1, sides) for _ in range(count)]
+
+
+@functools.cache
+def _np_rng():
+    return np.random.default_rng()
+
+
+def _explode(rolls, sides: int, rng: random.Random):
+    """Add re-rolls to every die that rolled its maximum, in vectorized waves."""
+
+    if np is not None and not isinstance(rolls, list):
+        totals = rolls.copy()
+        live = rolls == sides
+        for _ in range(MAX_EXPLOSIONS):
+            n = int(live.sum())
+            if not n:
+                break
+            extra = _np_rng().integers(1, sides + 1, size=n)
+            totals[live] += extra
+            live[live] = extra == sides
+        return totals
+
+    totals = list(rolls)
+    for i, roll in enumerate(rolls):
+        last, depth = roll, 0
+        while last == sides and depth < MAX_EXPLOSIONS:
+            last = rng.randint(1, sides)
+            totals[i] += last
+            depth += 1
+    return totals
+
+
+@dataclass
+class TermResult:
+    sign: int
+    node: Dice | Const
+    rolls: list[int]  # per-die results (after explosions), empty for constants
+    kept: list[bool]
+    total: int
+
+
+@dataclass
+class RollResult:
+    expression: Expression
+    terms: list[TermResult]
+    total: int
+
+
+def roll_once(expr: Expression, rng: random.Random | None = None) -> RollResult:
+    """Roll every term of ``expr`` once (ignores ``expr.repeat``)."""
+
+    rng = rng or random
+    results = []
+    grand_total = 0
+    for sign, node in expr.terms:
+        if isinstance(node, Const):
+            results.append(TermResult(sign, node, [], [], node.value))
+            grand_total += sign * node.value
+            continue
+
+        rolls = _sample(node.count, node.sides, rng)
+        if node.explode:
+            rolls = _explode(rolls, node.sides, rng)
+
+        if node.keep is None:
+            total = int(sum(rolls)) if isinstance(rolls, list) else int(rolls.sum())
+            kept = [True] * node.count if node.count <= SHOW_ROLLS_LIMIT else []
+        elif node.count > SHOW_ROLLS_LIMIT:
+            ordered = sorted(rolls) if isinstance(rolls, list) else np.sort(rolls)
+            chosen = ordered[-node.keep:] if node.keep_high else ordered[: node.keep]
+            total = int(sum(chosen)) if isinstance(chosen, list) else int(chosen.sum())
+            kept = []
+        else:
+            order = sorted(range(node.count), key=lambda i: rolls[i], reverse=node.keep_high)
+            keep_idx = set(order[: node.keep])
+            total = int(sum(int(rolls[i]) for i in keep_idx))
+            kept = [i in keep_idx for i in range(node.count)]
+
+        shown = [int(r) for r in rolls] if node.count <= SHOW_ROLLS_LIMIT else rolls
+        results.append(TermResult(sign, node, shown, kept, total))
+        grand_total += sign * total
+    return RollResult(expr, results, grand_total)
+
+
+def roll(expr: Expression, rng: random.Random | None = None) -> list[RollResult]:
+    """Roll ``expr`` ``expr.repeat`` times."""
+
+    return [roll_once(expr, rng) for _ in range(expr.repeat)]
+
+
+def format_detail(result: RollResult) -> str:
+    """Human-readable breakdown; long pools are summarized instead of listed."""
+
+    parts = []
+    for term in result.terms:
+        if isinstance(term.node, Const):
+            text = str(term.node.value)
+        elif term.node.count <= SHOW_ROLLS_LIMIT:
+            dice = ", ".join(str(r) if k else f"~~{r}~~" for r, k in zip(term.rolls, term.kept))
+            text = f"{term.node}: [{dice}]" if len(result.terms) > 1 else f"[{dice}]"
+        else:
+            rolls = term.rolls
+            low, high = int(min(rolls)), int(max(rolls))
+            text = f"{term.node}: Σ{term.total} (min {low}, max {high}, avg {term.total / (term.node.keep or term.node.count):.2f})"
+        if parts:
+            parts.append(f"{'-' if term.sign < 0 else '+'} {text}")
+        else:
+            parts.append(f"-{text}" if term.sign < 0 else text)
+    return " ".join(parts)
+
+
+# ----- exact probability distributions -----
+
+MAX_ODDS_SUPPORT = 1_000_000 if np is not None else 30_000  # distinct totals we'll track
+_KEEP_WORK_LIMIT = 3_000_000
+_EXPLODE_TAIL = 1e-12  # probability mass we're willing to drop from exploding dice
+_FFT_THRESHOLD = 4096  # switch from direct to FFT/big-int convolution above this many products
+_FIXED_BITS = 52  # fixed-point precision for the pure-Python big-int convolution
+_ODDS_CACHE_BYTES = 16 * 1024 * 1024  # per memoized function; bigger results are recomputed
+
+
+@dataclass(frozen=True, eq=False)
+class Distribution:
+    """Exact probability mass function: ``probs[i] == P(total == offset + i)``.
+
+    Probabilities are kept as packed doubles (8 bytes each rather than a
+    float object per total). The summary statistics and the CDF are
+    computed once, when the distribution is built off the event loop, so
+    reading them afterwards costs next to nothing.
+    """
+
+    offset: int
+    probs: array
+    mean: float = field(init=False)
+    stdev: float = field(init=False)
+    low: int = field(init=False)
+    high: int = field(init=False)
+    _cdf: array = field(init=False, repr=False)
+
+    def __post_init__(self):
+        probs = self.probs if isinstance(self.probs, array) else array("d", self.probs)
+        if np is not None and len(probs) >= _BULK_THRESHOLD:
+            p = np.frombuffer(probs, dtype=float)
+            totals = np.arange(self.offset, self.offset + len(p), dtype=float)
+            mean = float(p @ totals)
+            var = float(p @ (totals - mean) ** 2)
+            nonzero = np.flatnonzero(p > 0)
+            low, high = int(nonzero[0]), int(nonzero[-1])
+            cdf = array("d", np.cumsum(p).tobytes())
+        else:
+            mean = sum((self.offset + i) * x for i, x in enumerate(probs))
+            var = sum(((self.offset + i - mean) ** 2) * x for i, x in enumerate(probs))
+            nonzero = [i for i, x in enumerate(probs) if x > 0]
+            low, high = nonzero[0], nonzero[-1]
+            cdf = array("d", accumulate(probs))
+        for name, value in (
+            ("probs", probs),
+            ("mean", mean),
+            ("stdev", max(var, 0.0) ** 0.5),
+            ("low", self.offset + low),
+            ("high", self.offset + high),
+            ("_cdf", cdf),
+        ):
+            object.__setattr__(self, name, value)
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.probs) + len(self._cdf)) * 8
+
+    def at_least(self, target: int) -> float:
+        start = target - self.offset
+        if start <= 0:
+            return 1.0
+        if start >= len(self._cdf):
+            return 0.0
+        return min(1.0, max(0.0, 1.0 - self._cdf[start - 1]))
+
+    def percentile(self, q: float) -> int:
+        i = bisect.bisect_left(self._cdf, q - 1e-12)
+        return self.offset + min(i, len(self._cdf) - 1)
+
+
+def _memoize_by_size(max_bytes: int):
+    """LRU memoization bounded by the total ``nbytes`` of the cached distributions.
+
+    A count-bounded ``lru_cache`` could hold a hundred 100000d10 pools, several
+    GB; here the oldest results go once the budget is spent, and a result
+    bigger than the whole budget is not cached at all. Safe to call from
+    several threads (``/odds`` computes in ``asyncio.to_thread``).
+    """
+
+    def decorator(fn):
+        cache: OrderedDict[tuple, Distribution] = OrderedDict()
+        lock = threading.Lock()
+        used = 0
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            nonlocal used
+            with lock:
+                dist = cache.get(args)
+                if dist is not None:
+                    cache.move_to_end(args)
+                    return dist
+            dist = fn(*args)
+            if dist.nbytes <= max_bytes:
+                with lock:
+                    if args not in cache:
+                        cache[args] = dist
+                        used += dist.nbytes
+                        while used > max_bytes:
+                            _, old = cache.popitem(last=False)
+                            used -= old.nbytes
+            return dist
+
+        def cache_clear() -> None:
+            nonlocal used
+            with lock:
+                cache.clear()
+                used = 0
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+def _convolve(a, b):
+    """Convolve two PMFs (lists or ndarrays)."""
+
+    if np is not None:
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        if len(a) * len(b) <= _FFT_THRESHOLD:
+            return np.convolve(a, b)
+        n = len(a) + len(b) - 1
+        size = 1 << (n - 1).bit_length()
+        out = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)[:n]
+        return np.clip(out, 0.0, None)
+
+    if len(a) * len(b) > _FFT_THRESHOLD:
+        return _kronecker_convolve(a, b)
+
+    out = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                out[i + j] += x * y
+    return out
+
+
+def _kronecker_convolve(a: list[float], b: list[float]) -> list[float]:
+    """Convolution without numpy: pack both PMFs into big integers and multiply.
+
+    Each probability becomes a fixed-point integer in its own bit slot, so a
+    single (Karatsuba) integer multiplication in C yields every coefficient
+    of the product polynomial at once.
+    """
+
+    scale = 1 << _FIXED_BITS
+    slot_bytes = (2 * _FIXED_BITS + min(len(a), len(b)).bit_length() + 8) // 8
+
+    def pack(pmf) -> int:
+        return int.from_bytes(
+            b"".join(round(p * scale).to_bytes(slot_bytes, "little") for p in pmf), "little"
+        )
+
+    n = len(a) + len(b) - 1
+    raw = (pack(a) * pack(b)).to_bytes(n * slot_bytes, "little")
+    unscale = 1.0 / (scale * scale)
+    return [
+        int.from_bytes(raw[i * slot_bytes : (i + 1) * slot_bytes], "little") * unscale
+        for i in range(n)
+    ]
+
+
+def _power(pmf, count: int):
+    """``pmf`` convolved with itself ``count`` times, by repeated squaring."""
+
+    result = None
+    base = pmf
+    while count:
+        if count & 1:
+            result = base if result is None else _convolve(result, base)
+        count >>= 1
+        if count:
+            base = _convolve(base, base)
+    return result
+
+
+def _exploding_die(sides: int) -> list[float]:
+    """PMF of one exploding die (index 0 == total of 1), truncated past ``_EXPLODE_TAIL``."""
+
+    depth = _explode_depth(sides)
+    probs = [0.0] * (depth * sides - 1)
+    weight = 1.0 / sides
+    for level in range(depth):
+        base = level * sides
+        for face in range(1, sides):
+            probs[base + face - 1] = weight
+        weight /= sides
+    return probs
+
+
+def _explode_depth(sides: int) -> int:
+    """Explosions tracked per die before the remaining probability is negligible."""
+
+    weight = 1.0 / sides
+    depth = 0
+    while weight > _EXPLODE_TAIL and depth < MAX_EXPLOSIONS:
+        weight /= sides
+        depth += 1
+    return depth
+
+
+def _keep_pmf(count: int, sides: int, keep: int, keep_high: bool) -> list[float]:
+    """Exact PMF of the kept sum, starting at total 0 (index == kept sum).
+
+    Assigns dice to faces from the kept end inward and counts arrangements
+    with binomial coefficients, so it never enumerates ``sides ** count``
+    outcomes.
+    """
+
+    faces = range(sides, 0, -1) if keep_high else range(1, sides + 1)
+    states = {(0, 0): 1}  # (dice assigned, kept sum) -> number of outcomes
+    for face in faces:
+        nxt = defaultdict(int)
+        for (assigned, kept_sum), ways in states.items():
+            remaining = count - assigned
+            room = keep - min(assigned, keep)
+            for c in range(remaining + 1):
+                nxt[(assigned + c, kept_sum + min(c, room) * face)] += ways * comb(remaining, c)
+        states = nxt
+
+    total = sides ** count
+    probs = [0.0] * (keep * sides + 1)
+    for (assigned, kept_sum), ways in states.items():
+        if assigned == count:
+            probs[kept_sum] = ways / total
+    return probs
+
+
+@_memoize_by_size(_ODDS_CACHE_BYTES)
+def term_distribution(count: int, sides: int, explode: bool = False, keep: int | None = None, keep_high: bool = True) -> Distribution:
+    """Distribution of one dice term, memoized per (count, sides, mode)."""
+
+    _term_support(count, sides, explode, keep)
+    if keep is not None:
+        probs = _keep_pmf(count, sides, keep, keep_high)
+        return Distribution(0, array("d", probs))
+
+    if explode:
+        probs = _power(_exploding_die(sides), count)
+    else:
+        probs = _power([1.0 / sides] * sides, count)
+
+    return Distribution(count, _doubles(probs))
+
+
+def _term_support(count: int, sides: int, explode: bool, keep: int | None) -> int:
+    """Distinct totals of one dice term; ``DiceError`` when they can't be computed exactly."""
+
+    if keep is not None:
+        if explode:
+            raise DiceError("Odds for exploding dice with keep/drop aren't supported.")
+        if sides * count * count * keep * sides > _KEEP_WORK_LIMIT:
+            raise DiceError("That keep/drop pool is too big to compute exactly — try fewer dice.")
+        return keep * sides + 1
+    if explode:
+        die = _explode_depth(sides) * sides - 1
+        if die * count > MAX_ODDS_SUPPORT:
+            raise DiceError("Too many exploding dice to compute exactly.")
+        return count * (die - 1) + 1
+    if count * (sides - 1) + 1 > MAX_ODDS_SUPPORT:
+        raise DiceError("That pool has too many possible totals to compute exactly.")
+    return count * (sides - 1) + 1
+
+
+def check_odds(expr: Expression) -> None:
+    """Raise ``DiceError`` if ``distribution(expr)`` would refuse; only does arithmetic, so it's instant."""
+
+    support = 1
+    for _, node in expr.terms:
+        if isinstance(node, Const):
+            continue
+        term = _term_support(node.count, node.sides, node.explode, node.keep)
+        if support + term > MAX_ODDS_SUPPORT:
+            raise DiceError("That expression has too many possible totals to compute exactly.")
+        support += term - 1
+
+
+def _doubles(probs) -> array:
+    if np is not None and isinstance(probs, np.ndarray):
+        return array("d", probs.astype(float).tobytes())
+    return array("d", probs)
+
+
+@_memoize_by_size(_ODDS_CACHE_BYTES)
+def distribution(expr: Expression, mode: str = "normal") -> Distribution:
+    """Exact distribution of one roll of ``expr`` (repeats ignored).
+
+    ``advantage``/``disadvantage`` model rolling the whole expression twice
+    and keeping the higher/lower total.
+    """
+
+    check_odds(expr)
+    offset, probs = 0, [1.0]
+    for sign, node in expr.terms:
+        if isinstance(node, Const):
+            offset += sign * node.value
+            continue
+        dist = term_distribution(node.count, node.sides, node.explode, node.keep, node.keep_high)
+        term_probs = dist.probs
+        term_offset = dist.offset
+        if sign < 0:
+            term_probs = term_probs[::-1]
+            term_offset = -(dist.offset + len(dist.probs) - 1)
+        offset += term_offset
+        probs = _convolve(probs, term_probs)
+
+    probs = [float(p) for p in probs]
+    if mode in {"advantage", "disadvantage"}:
+        cdf = list(accumulate(probs))
+        if mode == "advantage":  # P(max <= t) = F(t)^2
+            squared = [min(c, 1.0) ** 2 for c in cdf]
+        else:  # P(min <= t) = 1 - (1 - F(t))^2
+            squared = [1.0 - (1.0 - min(c, 1.0)) ** 2 for c in cdf]
+        probs = [squared[0]] + [max(squared[i] - squared[i - 1], 0.0) for i in range(1, len(squared))]
+
+    return Distribution(offset, _doubles(probs))
@@ -0,0 +1,123 @@
+"""Reload changed cogs in place, without restarting the bot or its gateway session.
+
+Only extension modules are reloaded; a change under ``services/`` still
+needs a restart, since cogs hold references into those modules. Cogs that
+keep state in memory can define two optional methods:
+
+``export_state() -> object``
+    Called on the old instance just before it is unloaded.
+``import_state(state) -> None``
+    Called on the new instance before its ``cog_load``.
+
+The state travels through ``bot.handover`` (see ``MyBot.add_cog``). It
+should be plain data: the new module's classes are not the old ones.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from discord.ext import commands
+
+log = logging.getLogger(__name__)
+
+HOT_RELOAD_INTERVAL = float(os.getenv("HOT_RELOAD_INTERVAL", "0"))  # seconds between scans of src/cogs; 0 = off
+COGS_DIR = Path(__file__).resolve().parent.parent / "cogs"
+SETTLE_DELAY = 1.0  # wait for a `git pull` or an editor to finish writing before reloading
+
+
+@dataclass
+class ReloadResult:
+    extension: str
+    ok: bool
+    seconds: float
+    error: str = ""
+
+
+class CogReloader:
+    """Tracks the cog files on disk and reloads the extensions whose file changed.
+
+    A failed reload leaves the previous version loaded: discord.py's
+    ``reload_extension`` restores the old module and runs its ``setup`` again,
+    and the handed-over state goes to that instance instead.
+    """
+
+    def __init__(self, bot: commands.Bot, directory: Path = COGS_DIR, package: str = "cogs"):
+        self.bot = bot
+        self.directory = directory
+        self.package = package
+        self._seen = self._scan()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        seen = {}
+        for path in self.directory.glob("*.py"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            seen[f"{self.package}.{path.stem}"] = (stat.st_mtime_ns, stat.st_size)
+        return seen
+
+    def changed(self) -> list[str]:
+        """Loaded extensions whose file changed since the last scan; the scan is updated."""
+
+        current = self._scan()
+        changed = [name for name, stamp in current.items() if self._seen.get(name) != stamp]
+        self._seen = current
+        return [name for name in changed if name in self.bot.extensions]
+
+    async def reload(self, extensions: list[str]) -> list[ReloadResult]:
+        async with self._lock:
+            results = [await self._reload_one(name) for name in extensions]
+            if any(r.ok for r in results):
+                await self.bot.refresh_commands()
+            return results
+
+    async def _reload_one(self, name: str) -> ReloadResult:
+        started = time.perf_counter()
+        for cog in list(self.bot.cogs.values()):
+            if type(cog).__module__ == name and hasattr(cog, "export_state"):
+                try:
+                    self.bot.handover[cog.qualified_name] = cog.export_state()
+                except Exception:
+                    log.exception("Exporting state of %s failed; it will start empty", cog.qualified_name)
+        try:
+            await self.bot.reload_extension(name)
+        except commands.ExtensionError as e:
+            cause = e.__cause__ or e
+            log.error("Reloading %s failed, kept the previous version", name, exc_info=cause)
+            return ReloadResult(name, False, time.perf_counter() - started, f"{type(cause).__name__}: {cause}")
+        finally:
+            self.bot.handover.clear()
+        elapsed = time.perf_counter() - started
+        log.info("Reloaded %s in %.0f ms", name, elapsed * 1000)
+        return ReloadResult(name, True, elapsed)
+
+    async def reload_changed(self) -> list[ReloadResult]:
+        return await self.reload(self.changed())
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._scan() == self._seen:
+                    continue
+                await asyncio.sleep(SETTLE_DELAY)
+                await self.reload_changed()
+            except Exception:
+                log.exception("Cog watcher pass failed")
+
+    def start(self, interval: float = HOT_RELOAD_INTERVAL) -> None:
+        if self._task is None and interval > 0:
+            log.info("Watching %s for changes every %.1fs", self.directory, interval)
+            self._task = asyncio.create_task(self._watch(interval))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,338 @@
+"""Language model backends behind ``AIScheduler``, picked with ``LLM_BACKEND``.
+
+``openai``
+    The public OpenAI API (``OPENAI_API_KEY``; ``OPENAI_BASE_URL`` is
+    honoured by the SDK as usual).
+``local``
+    Any OpenAI-compatible server at ``LLM_BASE_URL``, e.g. llama.cpp's
+    ``llama-server`` on the Pi or on a machine on the LAN. No key needed.
+``stub``
+    Deterministic answers generated in-process, for tests and benchmarks.
+
+Each backend declares how many requests it can run at once and its token
+limits; ``AIScheduler`` sizes its queue and trims requests to fit.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import re
+import time
+
+log = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://127.0.0.1:8080/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")  # for local servers started with --api-key
+LLM_MODEL = os.getenv("LLM_MODEL", "")  # model name sent to the local server (llama.cpp ignores it)
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "0"))  # 0 = the backend's default
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "0"))  # cap on reply tokens; 0 = the backend's default
+OPENAI_MODERATION_MODEL = os.getenv("OPENAI_MODERATION_MODEL", "omni-moderation-latest")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budgeting; no tokenizer needed.
+
+    English averages about four characters per token, while short words and
+    punctuation push the count up, so take whichever view is larger. Each
+    chat message also carries a few tokens of framing.
+    """
+
+    return max(len(text) // 4, len(text.split()) * 4 // 3) + 4
+
+
+class LLMBackend:
+    """Interface the scheduler calls; subclasses set the limits and the two request methods.
+
+    ``stream`` is an async generator of text fragments: closing it early
+    must release the underlying connection.
+    """
+
+    name = "base"
+    concurrency = 1  # requests the backend serves well at the same time
+    context_tokens = 4096  # prompt + reply
+    max_output_tokens = 1024
+    moderation = False  # whether ``moderate`` is available
+
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    def model(self, requested: str) -> str:
+        """The model name to use for a request that asked for ``requested``."""
+
+        return requested
+
+    async def complete(
+        self, model: str, messages: list[dict], *, temperature: float, max_tokens: int, timeout: float
+    ) -> str:
+        raise NotImplementedError
+
+    async def stream(self, model: str, messages: list[dict], *, temperature: float, max_tokens: int, timeout: float):
+        raise NotImplementedError
+
+    async def moderate(self, text: str, *, timeout: float) -> list[str]:
+        """Categories a moderation model flags ``text`` for; empty when it is fine."""
+
+        raise NotImplementedError
+
+    async def warm_up(self, model: str) -> None:
+        """Make the first real request fast; failures are logged by the caller."""
+
+    async def aclose(self) -> None:
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    """The OpenAI SDK over one pooled ``AsyncOpenAI`` client.
+
+    A single client lives for the lifetime of the bot so the underlying HTTP
+    connections are pooled and kept alive between requests, instead of
+    every command paying for a fresh TLS handshake and a worker thread.
+    """
+
+    name = "openai"
+    concurrency = 2
+    context_tokens = 128_000
+    max_output_tokens = 4096
+    moderation = True
+
+    def __init__(self, api_key: str | None = None, base_url: str | None = None):
+        self.api_key = api_key if api_key is not None else (os.getenv("OPENAI_API_KEY") or "")
+        self.base_url = base_url
+        self._client = None
+        self._client_task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    def _build_client(self):
+        # lazy import to avoid hard dep if disabled
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.concurrency * 2,
+                max_keepalive_connections=self.concurrency,
+                keepalive_expiry=120.0,
+            ),
+        )
+        # retries and timeouts are handled per request by AIScheduler's policy
+        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client, max_retries=0)
+        # resources (and the HTTP transport behind them) are imported on first access
+        client.chat.completions
+        client.models
+        client.moderations
+        return client
+
+    async def _get_client(self):
+        if self._client is None:
+            # importing the SDK takes a while on a Pi; do it off the event loop,
+            # once, no matter how many requests are waiting for it
+            if self._client_task is None:
+                self._client_task = asyncio.create_task(asyncio.to_thread(self._build_client))
+            try:
+                client = await asyncio.shield(self._client_task)
+            except Exception:
+                self._client_task = None
+                raise
+            if self._client is None:
+                self._client = client
+        return self._client
+
+    async def complete(self, model, messages, *, temperature, max_tokens, timeout) -> str:
+        client = await self._get_client()
+        resp = await client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            messages=messages,
+            timeout=timeout,
+        )
+        return (resp.choices[0].message.content or "").strip()
+
+    async def stream(self, model, messages, *, temperature, max_tokens, timeout):
+        client = await self._get_client()
+        stream = await client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            messages=messages,
+            stream=True,
+            timeout=timeout,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def moderate(self, text, *, timeout) -> list[str]:
+        client = await self._get_client()
+        resp = await client.moderations.create(model=OPENAI_MODERATION_MODEL, input=text, timeout=timeout)
+        result = resp.results[0]
+        if not result.flagged:
+            return []
+        return [name for name, hit in result.categories.model_dump(by_alias=True).items() if hit]
+
+    async def warm_up(self, model: str) -> None:
+        # the imports (openai, httpx, pydantic; several hundred modules) run in
+        # a worker thread so the event loop keeps serving commands meanwhile
+        started = time.perf_counter()
+        client = await self._get_client()
+        log.info("OpenAI SDK ready in %.2fs", time.perf_counter() - started)
+        await client.models.retrieve(model, timeout=10.0)
+
+    async def aclose(self) -> None:
+        if self._client_task is not None and not self._client_task.done():
+            self._client_task.cancel()
+        self._client_task = None
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+class LocalBackend(OpenAIBackend):
+    """An OpenAI-compatible server under our control (llama.cpp, Ollama, vLLM, …).
+
+    Defaults suit llama.cpp on a Pi: one request at a time (generation is
+    CPU-bound, parallel requests only slow each other down) and a 4k
+    context. Raise them with ``AI_CONCURRENCY`` and ``LLM_CONTEXT_TOKENS``
+    when the server runs on a bigger machine.
+    """
+
+    name = "local"
+    concurrency = 1
+    context_tokens = 4096
+    max_output_tokens = 512
+    moderation = False  # llama.cpp and friends have no moderation endpoint
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str = LLM_API_KEY, model: str = LLM_MODEL):
+        # the SDK insists on a key; local servers without --api-key ignore it
+        super().__init__(api_key=api_key or "local", base_url=base_url)
+        self.model_name = model
+
+    def model(self, requested: str) -> str:
+        return self.model_name or "local"
+
+    async def warm_up(self, model: str) -> None:
+        # llama.cpp has /v1/models but not /v1/models/{id}
+        client = await self._get_client()
+        await client.models.list(timeout=10.0)
+
+
+_BATCH_RE = re.compile(r"Tell me (\d+) different")
+
+
+class StubBackend(LLMBackend):
+    """Answers derived from the prompt, with no I/O.
+
+    The same prompt always gets the same answer (batched dad joke requests
+    get numbered lines, so they never repeat). ``latency`` and
+    ``token_delay`` simulate a model for benchmarks. Moderation flags
+    prompts containing the word "unsafe".
+    """
+
+    name = "stub"
+    concurrency = 4
+    context_tokens = 8192
+    max_output_tokens = 1024
+    moderation = True
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, reply_words: int = 40):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply_words = reply_words
+        self.requests = 0
+        self._joke_ids = itertools.count(1)
+
+    def model(self, requested: str) -> str:
+        return "stub"
+
+    def _reply(self, messages: list[dict], max_tokens: int) -> str:
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        batch = _BATCH_RE.search(prompt)
+        if batch:
+            return "\n".join(
+                f"Stub joke #{next(self._joke_ids)}: I'd tell you a UDP joke, but you might not get it."
+                for _ in range(int(batch.group(1)))
+            )
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [digest[i % 60 : i % 60 + 4] for i in range(min(self.reply_words, max_tokens))]
+        return f"Stub answer to '{prompt[:40]}': " + " ".join(words)
+
+    async def complete(self, model, messages, *, temperature, max_tokens, timeout) -> str:
+        self.requests += 1
+        reply = self._reply(messages, max_tokens)
+        if self.latency or self.token_delay:
+            await asyncio.sleep(self.latency + self.token_delay * len(reply.split()))
+        return reply
+
+    async def moderate(self, text, *, timeout) -> list[str]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ["stub"] if "unsafe" in text.lower().split() else []
+
+    async def stream(self, model, messages, *, temperature, max_tokens, timeout):
+        self.requests += 1
+        reply = self._reply(messages, max_tokens)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i, word in enumerate(reply.split(" ")):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield ("" if i == 0 else " ") + word
+
+
+def create_backend(kind: str = LLM_BACKEND) -> LLMBackend:
+    if kind == "local":
+        backend = LocalBackend()
+    elif kind == "stub":
+        backend = StubBackend(
+            latency=float(os.getenv("LLM_STUB_LATENCY", "0")),
+            token_delay=float(os.getenv("LLM_STUB_TOKEN_DELAY", "0")),
+        )
+    else:
+        if kind != "openai":
+            log.warning("Unknown LLM_BACKEND %r; using openai", kind)
+        backend = OpenAIBackend()
+    # per-instance overrides of the class defaults
+    if LLM_CONTEXT_TOKENS:
+        backend.context_tokens = LLM_CONTEXT_TOKENS
+    if LLM_MAX_TOKENS:
+        backend.max_output_tokens = LLM_MAX_TOKENS
+    return backend
+
+
+def fit_messages(messages: list[dict], context_tokens: int, max_tokens: int) -> list[dict] | None:
+    """Drop the oldest history until the prompt leaves room for the reply.
+
+    System messages at the start and the final message are always kept;
+    returns ``None`` when even those don't fit.
+    """
+
+    budget = context_tokens - max_tokens
+    sizes = [estimate_tokens(m["content"]) for m in messages]
+    if sum(sizes) <= budget:
+        return messages
+    head = 0
+    while head < len(messages) - 1 and messages[head]["role"] == "system":
+        head += 1
+    keep = list(range(head)) + [len(messages) - 1]
+    total = sum(sizes[i] for i in keep)
+    if total > budget:
+        return None
+    # newest history first, as long as it fits
+    middle = []
+    for i in range(len(messages) - 2, head - 1, -1):
+        if total + sizes[i] > budget:
+            break
+        total += sizes[i]
+        middle.append(i)
+    return [messages[i] for i in sorted(keep + middle)]
@@ -0,0 +1,202 @@
+"""Logging that keeps formatting and I/O off the event loop.
+
+The root logger gets a single ``QueueHandler``: emitting a record on the
+loop costs a filter check and a queue put. A ``QueueListener`` thread
+formats the records and writes them to stderr (journald under systemd) or
+to ``LOG_FILE``, which rotates by size and is written in batches so the SD
+card sees a few large writes instead of one per line.
+
+Records logged while a slash command runs carry the command, user and
+guild (see ``bind_interaction``); ``LOG_FORMAT=json`` writes them out as
+fields along with ``latency_ms`` on command completion lines.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text or json
+LOG_FILE = os.getenv("LOG_FILE", "")  # empty = stderr only
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "5")) * 1024 * 1024)  # rotate at this size
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "3"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "5"))  # seconds a batch may wait before it is written
+LOG_BATCH = int(os.getenv("LOG_BATCH", "200"))  # records per batch; warnings and errors flush at once
+LOG_REPEAT_LIMIT = int(os.getenv("LOG_REPEAT_LIMIT", "5"))  # warnings/errors per call site per window; 0 = no limit
+LOG_REPEAT_WINDOW = float(os.getenv("LOG_REPEAT_WINDOW", "60"))  # seconds
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+CONTEXT_FIELDS = ("command", "user", "guild", "latency_ms")
+
+_context: contextvars.ContextVar[dict | None] = contextvars.ContextVar("log_context", default=None)
+
+
+def bind_interaction(interaction) -> None:
+    """Tag every record logged by the rest of this interaction's task (and tasks it starts)."""
+
+    _context.set(
+        {
+            "command": interaction.command.qualified_name if interaction.command else None,
+            "user": interaction.user.id if interaction.user else None,
+            "guild": interaction.guild_id,
+        }
+    )
+
+
+class RepeatFilter(logging.Filter):
+    """Let through at most ``limit`` warnings/errors per call site per ``window`` seconds.
+
+    Keyed on where the record was logged rather than on its text, since
+    messages usually embed ids or error details. The first record after a
+    quiet spell reports how many were dropped.
+    """
+
+    def __init__(self, limit: int = LOG_REPEAT_LIMIT, window: float = LOG_REPEAT_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._sites: dict[tuple[str, int], list] = {}  # (path, line) -> [window start, passed, dropped]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.limit or record.levelno < logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                dropped = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if len(self._sites) > 1000:
+                    self._sites = {k: v for k, v in self._sites.items() if now - v[0] < self.window}
+                if dropped:
+                    record.msg = f"{record.getMessage()} ({dropped} similar messages suppressed)"
+                    record.args = None
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class _LoopQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records with as little work as possible on the calling thread.
+
+    The stock ``prepare`` formats the whole record, traceback included, on
+    the thread that logged it; here only the message arguments are merged
+    (they may be mutable) and the context fields copied, and the listener
+    thread does the rest.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        context = _context.get()
+        if context:
+            for field, value in context.items():
+                if not hasattr(record, field):
+                    setattr(record, field, value)
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _BatchingListener(logging.handlers.QueueListener):
+    """Flushes the batching handlers when the queue has been quiet for ``LOG_FLUSH_INTERVAL``."""
+
+    def __init__(self, log_queue, *handlers, flush_interval: float = LOG_FLUSH_INTERVAL):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+    def dequeue(self, block: bool):
+        while True:
+            timeout = max(0.0, self._last_flush + self.flush_interval - time.monotonic())
+            try:
+                record = self.queue.get(block, timeout)
+            except queue.Empty:
+                self._flush()
+                continue
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+            return record
+
+    def _flush(self) -> None:
+        for handler in self.handlers:
+            handler.flush()
+        self._last_flush = time.monotonic()
+
+    def stop(self) -> None:
+        super().stop()
+        self._flush()
+
+
+def _log_path(worker_id: int) -> Path:
+    path = Path(LOG_FILE).expanduser()
+    # sharded workers each rotate their own file
+    return path.with_name(f"{path.stem}-{worker_id}{path.suffix}") if worker_id else path
+
+
+def setup_logging(worker_id: int = 0) -> logging.handlers.QueueListener | None:
+    """Route all logging through a queue to a background writer thread.
+
+    Like ``logging.basicConfig`` this does nothing if the root logger
+    already has handlers (e.g. the benchmark configured its own).
+    """
+
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    formatter = JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: list[logging.Handler] = []
+    if LOG_FILE:
+        path = _log_path(worker_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rotating = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+        rotating.setFormatter(formatter)
+        handlers.append(logging.handlers.MemoryHandler(LOG_BATCH, flushLevel=logging.WARNING, target=rotating))
+    if not LOG_FILE or sys.stderr.isatty():
+        console = logging.StreamHandler()
+        console.setFormatter(formatter)
+        handlers.append(console)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _LoopQueueHandler(log_queue)
+    handler.addFilter(RepeatFilter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = _BatchingListener(log_queue, *handlers)
+    listener.start()
+    # registered after logging's own atexit hook, so it runs first and
+    # logging.shutdown() then closes the file handlers
+    atexit.register(listener.stop)
+    return listener
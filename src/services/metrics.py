@@ -0,0 +1,354 @@
+import asyncio
+import bisect
+import logging
+import math
+import os
+import resource
+import time
+
+from discord import app_commands
+
+from services.logsetup import bind_interaction
+
+log = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 disables the HTTP endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+# seconds; roughly x2.5 steps from 1 ms to a minute
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int | float = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket histogram: recording is a bisect plus two additions.
+
+    Memory never grows with the number of observations; quantiles are
+    estimated by interpolating inside the bucket that holds them.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(self.max, low + (high - low) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class Family:
+    """One metric name split by a single label, e.g. latency per command."""
+
+    def __init__(self, factory, label: str):
+        self.label = label
+        self.children: dict[str, Counter | Histogram] = {}
+        self._factory = factory
+
+    def labels(self, value: str):
+        child = self.children.get(value)
+        if child is None:
+            child = self.children[value] = self._factory()
+        return child
+
+
+class Metrics:
+    """Registry of counters, histograms and gauges for the whole bot.
+
+    Cogs register their metrics once (registration is idempotent, so a cog
+    reload gets the same objects back) and keep a reference to bump on the
+    hot path. Gauges are callables evaluated only when someone looks.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._metrics: dict[str, tuple[str, str, object]] = {}  # name -> (kind, help, metric)
+
+    def _register(self, name: str, kind: str, help_text: str, factory, label: str | None):
+        existing = self._metrics.get(name)
+        if existing is not None:
+            return existing[2]
+        metric = Family(factory, label) if label else factory()
+        self._metrics[name] = (kind, help_text, metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, label: str | None = None):
+        return self._register(name, "counter", help_text, Counter, label)
+
+    def histogram(self, name: str, help_text: str, label: str | None = None, buckets=DEFAULT_BUCKETS):
+        return self._register(name, "histogram", help_text, lambda: Histogram(buckets), label)
+
+    def gauge(self, name: str, help_text: str, read, label: str | None = None, merge: str = "sum") -> None:
+        """``read()`` returns a number, or a ``{value: number}`` dict when ``label`` is given.
+
+        ``merge`` (``sum`` or ``max``) says how values from several worker
+        processes combine in ``Metrics.merged``.
+        """
+
+        self._metrics[name] = ("gauge", help_text, (read, label, merge))
+
+    def get(self, name: str):
+        entry = self._metrics.get(name)
+        return entry[2] if entry else None
+
+    def read_gauge(self, name: str):
+        entry = self.get(name)
+        try:
+            return entry[0]() if entry else None
+        except Exception:
+            log.exception("Reading gauge %s failed", name)
+            return None
+
+    def snapshot(self) -> dict:
+        """JSON-friendly copy of every metric, with gauges read now."""
+
+        metrics = {}
+        for name, (kind, help_text, metric) in self._metrics.items():
+            entry = {"kind": kind, "help": help_text}
+            if kind == "gauge":
+                entry.update(value=self.read_gauge(name), label=metric[1], merge=metric[2])
+            elif isinstance(metric, Family):
+                entry.update(label=metric.label, children={k: _dump(c) for k, c in metric.children.items()})
+            else:
+                entry.update(value=_dump(metric))
+            metrics[name] = entry
+        return {"started": self.started, "metrics": metrics}
+
+    @classmethod
+    def merged(cls, snapshots: list[dict]) -> "Metrics":
+        """Registry combining the snapshots of several worker processes.
+
+        Counters and histograms add up; gauges sum or take the maximum as
+        registered. The result is for reading only.
+        """
+
+        registry = cls()
+        registry.started = min((snap["started"] for snap in snapshots), default=registry.started)
+        gauges: dict[str, list] = {}
+        for snap in snapshots:
+            for name, entry in snap["metrics"].items():
+                kind = entry["kind"]
+                if kind == "gauge":
+                    gauge = gauges.setdefault(name, [entry["help"], entry["label"], entry["merge"], []])
+                    gauge[3].append(entry["value"])
+                    continue
+                factory = Counter if kind == "counter" else (lambda e=entry: _load_histogram(e))
+                metric = registry._register(name, kind, entry["help"], factory, entry.get("label"))
+                if isinstance(metric, Family):
+                    for value, child in entry["children"].items():
+                        _add(metric.labels(value), child)
+                else:
+                    _add(metric, entry["value"])
+        for name, (help_text, label, merge, values) in gauges.items():
+            combined = _combine([v for v in values if v is not None], merge)
+            registry.gauge(name, help_text, lambda v=combined: v, label=label, merge=merge)
+        return registry
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, (kind, help_text, metric) in self._metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "gauge":
+                value = self.read_gauge(name)
+                if isinstance(value, dict):
+                    label = metric[1]
+                    lines.extend(f'{name}{{{label}="{_escape(k)}"}} {_number(v)}' for k, v in value.items())
+                elif value is not None:
+                    lines.append(f"{name} {_number(value)}")
+                continue
+            if isinstance(metric, Family):
+                children = [(f'{metric.label}="{_escape(k)}"', child) for k, child in metric.children.items()]
+            else:
+                children = [("", metric)]
+            for labels, child in children:
+                if kind == "counter":
+                    suffix = f"{{{labels}}}" if labels else ""
+                    lines.append(f"{name}{suffix} {_number(child.value)}")
+                    continue
+                cumulative = 0
+                prefix = f"{labels}," if labels else ""
+                for bound, n in zip((*child.bounds, math.inf), child.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {child.sum!r}")
+                lines.append(f"{name}_count{suffix} {child.count}")
+        return "\n".join(lines) + "\n"
+
+
+def rss_bytes() -> int:
+    """Resident memory of this process right now (Linux); peak resident memory elsewhere."""
+
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in KB on Linux and sampled by the kernel, so it can trail statm slightly
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, rss_bytes())
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def _dump(metric: Counter | Histogram):
+    if isinstance(metric, Counter):
+        return metric.value
+    return {"bounds": metric.bounds, "counts": metric.counts, "sum": metric.sum, "count": metric.count, "max": metric.max}
+
+
+def _load_histogram(entry: dict) -> Histogram:
+    data = entry.get("value") or next(iter(entry["children"].values()), {"bounds": DEFAULT_BUCKETS})
+    return Histogram(tuple(data["bounds"]))
+
+
+def _add(metric: Counter | Histogram, data) -> None:
+    if isinstance(metric, Counter):
+        metric.value += data
+        return
+    if list(metric.bounds) != list(data["bounds"]):
+        return  # a worker running different code; don't mix incompatible buckets
+    for i, n in enumerate(data["counts"]):
+        metric.counts[i] += n
+    metric.count += data["count"]
+    metric.sum += data["sum"]
+    metric.max = max(metric.max, data["max"])
+
+
+def _combine(values: list, merge: str):
+    pick = max if merge == "max" else sum
+    if values and isinstance(values[0], dict):
+        keys = {k for v in values for k in v}
+        return {k: pick(v.get(k, 0) for v in values) for k in keys}
+    return pick(values) if values else None
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Command tree that stamps each interaction before its command runs.
+
+    The bot's completion event and error handler read the stamp back to
+    record per-command latency, so no command needs its own timing code.
+    Log records from the rest of the command carry its name, user and guild.
+    """
+
+    async def interaction_check(self, interaction) -> bool:
+        interaction.extras["started"] = time.perf_counter()
+        bind_interaction(interaction)
+        return True
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up: a direct proxy for event-loop stalls."""
+
+    def __init__(self, metrics: Metrics, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = metrics.histogram("event_loop_lag_seconds", "How late the event loop ran a timer")
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag.observe(max(0.0, loop.time() - start - self.interval))
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class MetricsServer:
+    """Plain-text Prometheus endpoint at ``http://METRICS_HOST:METRICS_PORT/metrics``."""
+
+    def __init__(self, metrics: Metrics, host: str = METRICS_HOST, port: int = METRICS_PORT, collect=None):
+        self.metrics = metrics
+        self.collect = collect  # optional coroutine returning the registry to render (e.g. merged across workers)
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> None:
+        if not self.port or self._runner is not None:
+            return
+        from aiohttp import web
+
+        async def handle(request):
+            registry = await self.collect() if self.collect else self.metrics
+            return web.Response(text=registry.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError:
+            log.exception("Metrics endpoint could not listen on %s:%d", self.host, self.port)
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        log.info("Metrics endpoint on http://%s:%d/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
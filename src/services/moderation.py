@@ -0,0 +1,409 @@
+"""Local moderation in front of the AI: turn prompts away before they cost a request.
+
+``Moderator.screen`` decides most prompts on the spot, in microseconds:
+
+* a blocklist (``MODERATION_BLOCKLIST``, one term per line) compiled into an
+  Aho-Corasick automaton, so the cost is one pass over the prompt however
+  many terms there are;
+* per-user repeat and flood limits.
+
+Prompts the list marks for review (``?term`` lines), or every remaining
+prompt with ``MODERATION_API=all``, are undecided; ``Moderator.review``
+asks the backend's moderation endpoint about them and caches the verdict.
+
+Blocklist format::
+
+    # comment
+    badword      blocks the word (case, accents and 1337 spelling ignored)
+    bad phrase   blocks the phrase
+    slur*        blocks words starting with "slur"
+    ?kill        asks the moderation endpoint about prompts containing it
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+
+from services.metrics import Metrics
+from services.resilience import AIError
+
+log = logging.getLogger(__name__)
+
+MODERATION_BLOCKLIST = os.getenv("MODERATION_BLOCKLIST", "~/.discord-bot-pi/blocklist.txt")
+MODERATION_API = os.getenv("MODERATION_API", "review").lower()  # off, review (?terms only) or all
+MODERATION_CACHE_TTL = float(os.getenv("MODERATION_CACHE_TTL", "86400"))  # seconds to reuse an endpoint verdict
+MODERATION_CACHE_SIZE = int(os.getenv("MODERATION_CACHE_SIZE", "2048"))
+MODERATION_TIMEOUT = float(os.getenv("MODERATION_TIMEOUT", "5"))  # seconds; on timeout the prompt is let through
+MODERATION_REPEAT_LIMIT = int(os.getenv("MODERATION_REPEAT_LIMIT", "3"))  # same prompt per user per window; 0 = off
+MODERATION_REPEAT_WINDOW = float(os.getenv("MODERATION_REPEAT_WINDOW", "300"))
+MODERATION_FLOOD_LIMIT = int(os.getenv("MODERATION_FLOOD_LIMIT", "8"))  # prompts per user per window; 0 = off
+MODERATION_FLOOD_WINDOW = float(os.getenv("MODERATION_FLOOD_WINDOW", "60"))
+
+BLOCKLIST_CHECK_INTERVAL = 30.0  # seconds between checks for an edited blocklist
+MAX_USERS = 5000  # users with recent prompts; idle ones are pruned past this
+# the local checks run in microseconds; the endpoint in the default buckets' range
+PREFILTER_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 0.001, 0.0025, 0.005, 0.01)
+
+BLOCK = "block"
+REVIEW = "review"
+
+# digits and symbols commonly standing in for letters
+_LEET = str.maketrans("013457@$", "oieastas")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Lower-case words separated by single spaces, padded with a space at each end.
+
+    Accents are stripped and look-alike digits read as letters, so
+    ``Ünsäfe`` and ``uns4f3`` normalize the same as ``unsafe``.
+    """
+
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    text = text.casefold().translate(_LEET)
+    return f" {_SEPARATORS.sub(' ', text).strip()} "
+
+
+class Matcher:
+    """Aho-Corasick automaton over a fixed set of terms.
+
+    Terms and text go through ``normalize``, and terms are stored with the
+    padding spaces, so they only match whole words; a trailing ``*`` drops
+    the closing space to match word prefixes instead.
+    """
+
+    def __init__(self, terms: dict[str, str]):
+        self.terms: list[tuple[str, str]] = []  # (term as written, action)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        for term, action in terms.items():
+            pattern = normalize(term.rstrip("*"))
+            if not pattern.strip():
+                continue
+            if term.endswith("*"):
+                pattern = pattern.rstrip()
+            self._insert(pattern, len(self.terms))
+            self.terms.append((term, action))
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _insert(self, pattern: str, index: int) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = self._goto[state][ch] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (index,)
+
+    def _link(self) -> None:
+        # breadth first, so a state's fail target is finished before the state itself
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+                queue.append(nxt)
+
+    def find(self, normalized: str) -> list[tuple[str, str]]:
+        """The ``(term, action)`` pairs found in already-normalized text, in order of appearance."""
+
+        goto, fail, out = self._goto, self._fail, self._out
+        found: list[int] = []
+        state = 0
+        i, end = 0, len(normalized)
+        while i < end:
+            if not state:
+                # every pattern starts at a word boundary: skip to the next one in C
+                i = normalized.find(" ", i)
+                if i < 0:
+                    break
+            ch = normalized[i]
+            i += 1
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.extend(out[state])
+        return [self.terms[i] for i in dict.fromkeys(found)]
+
+
+def load_blocklist(path: str) -> dict[str, str]:
+    """``{term: action}`` from a blocklist file; empty when there is none."""
+
+    terms = {}
+    try:
+        with open(os.path.expanduser(path), encoding="utf-8") as fh:
+            for line in fh:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                if line.startswith("?"):
+                    terms.setdefault(line[1:].strip(), REVIEW)
+                else:
+                    terms[line] = BLOCK  # a plain entry beats a ?entry for the same term
+    except FileNotFoundError:
+        pass
+    return terms
+
+
+class FloodGuard:
+    """Recent prompts per user, for the repeat and flood limits.
+
+    Every attempt counts, turned-away ones included, so someone who keeps
+    hammering stays limited until they pause for a window.
+    """
+
+    def __init__(
+        self,
+        repeat_limit: int = MODERATION_REPEAT_LIMIT,
+        repeat_window: float = MODERATION_REPEAT_WINDOW,
+        flood_limit: int = MODERATION_FLOOD_LIMIT,
+        flood_window: float = MODERATION_FLOOD_WINDOW,
+    ):
+        self.repeat_limit = repeat_limit
+        self.repeat_window = repeat_window
+        self.flood_limit = flood_limit
+        self.flood_window = flood_window
+        self.window = max(repeat_window if repeat_limit else 0, flood_window if flood_limit else 0)
+        self._recent: dict[int, deque[tuple[float, str]]] = {}  # user -> (time, prompt digest)
+
+    def check(self, user_id: int, digest: str, now: float) -> tuple[str, float] | None:
+        """Record an attempt; ``(reason, retry_after)`` when it breaks a limit."""
+
+        if not self.window:
+            return None
+        recent = self._recent.get(user_id)
+        if recent is None:
+            if len(self._recent) >= MAX_USERS:
+                self._prune(now)
+            recent = self._recent[user_id] = deque()
+        while recent and now - recent[0][0] >= self.window:
+            recent.popleft()
+        recent.append((now, digest))
+
+        verdict = None
+        if self.flood_limit:
+            in_window = [t for t, _ in recent if now - t < self.flood_window]
+            if len(in_window) > self.flood_limit:
+                verdict = ("flood", in_window[-self.flood_limit - 1] + self.flood_window - now)
+        if verdict is None and self.repeat_limit:
+            same = [t for t, d in recent if d == digest and now - t < self.repeat_window]
+            if len(same) > self.repeat_limit:
+                verdict = ("repeat", same[-self.repeat_limit - 1] + self.repeat_window - now)
+        # a flood can't grow the deque without bound either
+        while len(recent) > max(self.flood_limit, self.repeat_limit) * 2 + 1:
+            recent.popleft()
+        return verdict
+
+    def _prune(self, now: float) -> None:
+        self._recent = {u: r for u, r in self._recent.items() if r and now - r[-1][0] < self.window}
+
+    def export_state(self) -> dict:
+        return {user: list(recent) for user, recent in self._recent.items()}
+
+    def import_state(self, state: dict) -> None:
+        self._recent.update((user, deque(tuple(entry) for entry in recent)) for user, recent in state.items())
+
+
+@dataclass
+class Verdict:
+    """What to do with a prompt. ``outcome`` labels the statistics."""
+
+    action: str  # "allow", "block" or "review"
+    outcome: str
+    message: str = ""  # fit to show the user when blocked
+    retry_after: float = 0.0
+
+    @property
+    def blocked(self) -> bool:
+        return self.action == BLOCK
+
+
+ALLOW = Verdict("allow", "allowed")
+
+
+class Moderator:
+    """The blocklist, the flood guard and a cache of moderation endpoint verdicts.
+
+    ``screen`` is synchronous and never leaves the process; ``review``
+    settles what it returned as ``review`` with the endpoint, letting the
+    prompt through when the endpoint is off or unavailable.
+    """
+
+    def __init__(
+        self,
+        ai,
+        metrics: Metrics | None = None,
+        blocklist: str = MODERATION_BLOCKLIST,
+        api: str = MODERATION_API,
+        cache_ttl: float = MODERATION_CACHE_TTL,
+        cache_size: int = MODERATION_CACHE_SIZE,
+    ):
+        self.ai = ai
+        self.blocklist = blocklist
+        self.api = api if api in {"off", "review", "all"} else "review"
+        self.cache_ttl = cache_ttl
+        self.cache_size = max(1, cache_size)
+        self.matcher = Matcher({})
+        self.guard = FloodGuard()
+        self.counts: Counter[str] = Counter()  # outcome -> prompts
+        self.terms_hit: Counter[str] = Counter()  # blocklist term -> prompts it blocked
+        self.cache_hits = 0  # endpoint verdicts reused
+        self._verdicts: OrderedDict[str, tuple[float, tuple[str, ...]]] = OrderedDict()  # digest -> (expires, flags)
+        self._blocklist_mtime: float | None = None
+        self._blocklist_checked = 0.0
+        self._refresh_task: asyncio.Task | None = None
+        metrics = metrics or Metrics()
+        self._m_decisions = metrics.counter("moderation_decisions_total", "Prompts by moderation outcome", label="outcome")
+        self._m_prefilter = metrics.histogram(
+            "moderation_prefilter_seconds", "Time to screen a prompt locally", buckets=PREFILTER_BUCKETS
+        )
+
+    @property
+    def endpoint(self) -> bool:
+        return self.api != "off" and self.ai.backend.moderation and self.ai.enabled
+
+    def load(self) -> bool:
+        """(Re)compile the blocklist if the file changed; blocking, see ``refresh``."""
+
+        path = os.path.expanduser(self.blocklist)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._blocklist_mtime:
+            return False
+        started = time.perf_counter()
+        matcher = Matcher(load_blocklist(path)) if mtime is not None else Matcher({})
+        self.matcher, self._blocklist_mtime = matcher, mtime
+        log.info("Moderation blocklist: %d terms compiled in %.1f ms", len(matcher), (time.perf_counter() - started) * 1000)
+        return True
+
+    async def refresh(self) -> None:
+        if await asyncio.to_thread(self.load):
+            self._verdicts.clear()  # ?terms may have become blocks
+
+    def _maybe_refresh(self, now: float) -> None:
+        if now - self._blocklist_checked < BLOCKLIST_CHECK_INTERVAL:
+            return
+        self._blocklist_checked = now
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    def _decide(self, verdict: Verdict) -> Verdict:
+        self.counts[verdict.outcome] += 1
+        self._m_decisions.labels(verdict.outcome).inc()
+        return verdict
+
+    def screen(self, prompt: str, user_id: int, exempt: bool = False) -> Verdict:
+        """Decide locally: ``allow``, ``block``, or ``review`` when only the endpoint can tell.
+
+        ``exempt`` skips the repeat and flood limits (the owner).
+        """
+
+        started = time.perf_counter()
+        now = time.monotonic()
+        self._maybe_refresh(now)
+        normalized = normalize(prompt)
+        try:
+            if not exempt:
+                digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+                limited = self.guard.check(user_id, digest, now)
+                if limited is not None:
+                    reason, retry_after = limited
+                    message = (
+                        "You've asked that a few times already; scroll up for the answer."
+                        if reason == "repeat"
+                        else f"Slow down a little; try again in {max(1, round(retry_after))}s."
+                    )
+                    return self._decide(Verdict(BLOCK, reason, message, retry_after))
+
+            found = self.matcher.find(normalized) if self.matcher.terms else []
+            for term, action in found:
+                if action == BLOCK:
+                    self.terms_hit[term] += 1
+                    return self._decide(Verdict(BLOCK, "blocklist", "I can't help with that."))
+            if self.endpoint and (found or self.api == "all"):
+                return Verdict(REVIEW, "review")
+            return self._decide(ALLOW if not found else Verdict("allow", "unchecked"))
+        finally:
+            self._m_prefilter.observe(time.perf_counter() - started)
+
+    async def review(self, prompt: str) -> Verdict:
+        """Ask the moderation endpoint, or the verdict cache, about a prompt ``screen`` couldn't decide."""
+
+        digest = hashlib.blake2b(normalize(prompt).encode("utf-8"), digest_size=16).hexdigest()
+        entry = self._verdicts.get(digest)
+        if entry is not None and entry[0] > time.time():
+            self._verdicts.move_to_end(digest)
+            self.cache_hits += 1
+            flags = entry[1]
+        else:
+            try:
+                flags = tuple(await self.ai.moderate(prompt, timeout=MODERATION_TIMEOUT))
+            except AIError as e:
+                log.warning("Moderation endpoint unavailable, letting the prompt through: %s", e)
+                return self._decide(Verdict("allow", "unchecked"))
+            self._verdicts[digest] = (time.time() + self.cache_ttl, flags)
+            self._verdicts.move_to_end(digest)
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+        if flags:
+            return self._decide(
+                Verdict(BLOCK, "flagged", f"That prompt was flagged by moderation ({', '.join(flags)}).")
+            )
+        return self._decide(Verdict("allow", "cleared"))
+
+    async def check(self, prompt: str, user_id: int, exempt: bool = False) -> Verdict:
+        verdict = self.screen(prompt, user_id, exempt)
+        if verdict.action == REVIEW:
+            verdict = await self.review(prompt)
+        return verdict
+
+    def stats(self) -> dict:
+        return {
+            "terms": len(self.matcher),
+            "endpoint": self.api if self.endpoint else "off",
+            "cached": len(self._verdicts),
+            "cache_hits": self.cache_hits,
+            "counts": dict(self.counts),
+            "top_terms": self.terms_hit.most_common(3),
+        }
+
+    def export_state(self) -> dict:
+        return {
+            "counts": dict(self.counts),
+            "terms_hit": dict(self.terms_hit),
+            "cache_hits": self.cache_hits,
+            "verdicts": list(self._verdicts.items()),
+            "recent": self.guard.export_state(),
+        }
+
+    def import_state(self, state: dict) -> None:
+        self.counts.update(state["counts"])
+        self.terms_hit.update(state["terms_hit"])
+        self.cache_hits = state["cache_hits"]
+        self._verdicts.update((digest, (expires, tuple(flags))) for digest, (expires, flags) in state["verdicts"])
+        self.guard.import_state(state["recent"])
+
+    def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
@@ -0,0 +1,112 @@
+"""Startup profiling for ``python -m src.bot --profile-startup``.
+
+Only imported in profile mode, before discord.py and the cogs, so that the
+import timer sees every module the bot pulls in.
+"""
+
+import contextlib
+import sys
+import threading
+import time
+
+
+class _TimedFinder:
+    """Meta-path finder that times ``exec_module`` of every module it sees.
+
+    It never loads anything itself: it asks the real finders for the spec
+    and wraps that module's loader. Nested imports are tracked per thread so
+    both cumulative and self time are known, and time is also credited to
+    the outermost import of each top-level package.
+    """
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self.profiler = profiler
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            loader = spec.loader
+            # builtin/frozen importers are classes shared by many modules
+            if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+                loader.exec_module = self._wrap(name, loader.exec_module)
+            return spec
+        return None
+
+    def _wrap(self, name: str, exec_module):
+        def timed_exec_module(module):
+            stack = self._local.__dict__.setdefault("stack", [])
+            parent = stack[-1] if stack else None
+            frame = [name, 0.0]  # [module name, time spent in child imports]
+            stack.append(frame)
+            started = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - started
+                stack.pop()
+                if parent is not None:
+                    parent[1] += elapsed
+                top = name.partition(".")[0]
+                if parent is None or parent[0].partition(".")[0] != top:
+                    self.profiler.packages[top] = self.profiler.packages.get(top, 0.0) + elapsed
+                self.profiler.imports[name] = (elapsed - frame[1], elapsed)
+
+        return timed_exec_module
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports: dict[str, tuple[float, float]] = {}  # module -> (self, cumulative) seconds
+        self.packages: dict[str, float] = {}
+        self.extensions: dict[str, float] = {}
+        self.marks: dict[str, float] = {}
+        self._finder: _TimedFinder | None = None
+
+    def install(self) -> None:
+        if self._finder is None:
+            self._finder = _TimedFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self) -> None:
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def mark(self, name: str) -> float:
+        """Record ``name`` as happening now; returns seconds since start."""
+
+        elapsed = time.perf_counter() - self.started
+        self.marks.setdefault(name, elapsed)
+        return elapsed
+
+    @contextlib.contextmanager
+    def extension(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.extensions[name] = time.perf_counter() - started
+
+    def report(self, top: int = 15) -> str:
+        lines = ["Startup profile", "", "Milestones (since interpreter reached bot.py):"]
+        for name, at in sorted(self.marks.items(), key=lambda item: item[1]):
+            lines.append(f"  {at * 1000:9.1f} ms  {name}")
+
+        lines += ["", f"Imports by top-level package (top {top}, cumulative):"]
+        for name, secs in sorted(self.packages.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {secs * 1000:9.1f} ms  {name}")
+
+        lines += ["", f"Slowest modules (top {top}, self / cumulative):"]
+        for name, (own, total) in sorted(self.imports.items(), key=lambda item: -item[1][0])[:top]:
+            lines.append(f"  {own * 1000:9.1f} / {total * 1000:9.1f} ms  {name}")
+
+        lines += ["", "Extensions:"]
+        for name, secs in self.extensions.items():
+            lines.append(f"  {secs * 1000:9.1f} ms  {name}")
+        return "\n".join(lines)
@@ -0,0 +1,223 @@
+"""Failure handling for AI backend calls: timeouts, retries, hedging, circuit breaking.
+
+``AIScheduler`` applies these around every request; nothing here talks to
+the API itself, so the policy can be exercised against the fake server in
+``bench/`` (``--ai-error-rate``, ``--ai-slow-rate``, ``--ai-down-model``).
+"""
+
+import asyncio
+import bisect
+import os
+import random
+import time
+from collections import deque
+
+try:  # the openai client's transport; its errors surface raw when a stream breaks off
+    import httpx
+except ImportError:
+    httpx = None
+
+AI_TIMEOUT_MIN = float(os.getenv("AI_TIMEOUT_MIN", "5"))  # seconds; floor of the adaptive per-attempt timeout
+AI_TIMEOUT_MAX = float(os.getenv("AI_TIMEOUT_MAX", "45"))  # used until enough latencies have been seen
+AI_DEADLINE = float(os.getenv("AI_DEADLINE", "90"))  # total seconds per request, retries included
+AI_RETRIES = int(os.getenv("AI_RETRIES", "2"))
+AI_HEDGE = os.getenv("AI_HEDGE", "0").lower() not in {"0", "false", "no", "off"}
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))  # consecutive failures that open the breaker
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))  # seconds before a probe request
+
+TIMEOUT_FACTOR = 4.0  # per-attempt timeout = p95 latency x this, within the bounds above
+MIN_SAMPLES = 20  # latencies needed before timeouts adapt and hedging starts
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0  # seconds; a longer Retry-After skips straight to the fallback model
+BREAKER_COOLDOWN_MAX = 300.0
+
+
+class AIError(Exception):
+    """An AI request failed for good; ``str(e)`` is fit to show to the user."""
+
+
+class CircuitOpen(AIError):
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LatencyWindow:
+    """The last ``size`` latencies of one kind of request, kept sorted for quantiles."""
+
+    def __init__(self, size: int = 200):
+        self._order: deque[float] = deque(maxlen=size)
+        self._sorted: list[float] = []
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def add(self, seconds: float) -> None:
+        if len(self._order) == self._order.maxlen:
+            self._sorted.pop(bisect.bisect_left(self._sorted, self._order[0]))
+        self._order.append(seconds)
+        bisect.insort(self._sorted, seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self._sorted:
+            return 0.0
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+    def timeout(self, remaining: float) -> float:
+        """Per-attempt timeout: generous until there is data, then a multiple of p95."""
+
+        if len(self) < MIN_SAMPLES:
+            adaptive = AI_TIMEOUT_MAX
+        else:
+            adaptive = min(AI_TIMEOUT_MAX, max(AI_TIMEOUT_MIN, TIMEOUT_FACTOR * self.quantile(0.95)))
+        return max(0.0, min(adaptive, remaining))
+
+    def hedge_after(self) -> float | None:
+        return self.quantile(0.95) if len(self) >= MIN_SAMPLES else None
+
+
+class CircuitBreaker:
+    """Stops sending requests to a model after repeated failures.
+
+    Once ``failures`` calls in a row have failed, the breaker opens and
+    ``allow()`` refuses for ``cooldown`` seconds. After that it lets one
+    probe through (re-arming the timer so the others keep failing fast); a
+    successful probe closes it, a failed one doubles the cooldown.
+    """
+
+    def __init__(self, failures: int = AI_BREAKER_FAILURES, cooldown: float = AI_BREAKER_COOLDOWN):
+        self.threshold = max(1, failures)
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0  # 0 while closed
+        self.opened = 0  # times the breaker has opened
+
+    @property
+    def is_open(self) -> bool:
+        return self.open_until > 0
+
+    def retry_after(self, now: float | None = None) -> float:
+        return max(0.0, self.open_until - (now or time.monotonic())) if self.is_open else 0.0
+
+    def available(self) -> bool:
+        """Whether ``allow()`` would let a request through now (without taking the probe)."""
+
+        return not self.retry_after()
+
+    def allow(self) -> bool:
+        if not self.is_open:
+            return True
+        now = time.monotonic()
+        if now < self.open_until:
+            return False
+        self.open_until = now + self.cooldown  # this caller is the probe
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        now = time.monotonic()
+        if self.is_open:
+            self.cooldown = min(BREAKER_COOLDOWN_MAX, self.cooldown * 2)
+            self.open_until = now + self.cooldown
+        elif self.failures >= self.threshold:
+            self.open_until = now + self.cooldown
+            self.opened += 1
+
+
+def failure_reason(error: BaseException) -> str | None:
+    """Short label for a retryable failure, or ``None`` when retrying can't help."""
+
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        # ReadTimeout, ReadError, RemoteProtocolError... raised mid-stream
+        return "timeout" if isinstance(error, httpx.TimeoutException) else "connection"
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # openai.APIConnectionError / APITimeoutError (no HTTP response at all)
+        name = type(error).__name__
+        if name == "APITimeoutError":
+            return "timeout"
+        if name == "APIConnectionError" or isinstance(error, (ConnectionError, OSError)):
+            return "connection"
+        return None
+    if status == 429:
+        return "rate_limited"
+    if status in (408, 409) or status >= 500:
+        return "server"
+    return None
+
+
+def retry_after_header(error: BaseException) -> float | None:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, or the server's ``Retry-After`` when it sent one."""
+
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def user_message(error: BaseException) -> str:
+    status = getattr(error, "status_code", None)
+    if status in (401, 403):
+        return "The AI isn't set up correctly right now; the owner has been told via the logs."
+    if status in (400, 413, 422):
+        return "The AI couldn't handle that request; try rephrasing or shortening it."
+    if status == 404:
+        return "The configured AI model isn't available."
+    return "The AI isn't responding right now; please try again in a bit."
+
+
+async def hedged(attempt, hedge_after: float | None, discard=None, on_hedge=None):
+    """Await ``attempt()``; if it is still running after ``hedge_after`` seconds, race a second one.
+
+    The first to succeed wins and the other is cancelled. ``discard(result)``
+    releases a result that lost the race after completing (e.g. closes a
+    stream). ``on_hedge(outcome)`` is told ``hedge_won``, ``first_won`` or
+    ``failed``. If both fail, the last error is raised.
+    """
+
+    first = asyncio.ensure_future(attempt())
+    pending = {first}
+    try:
+        if hedge_after is None:
+            return await first
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+        second = asyncio.ensure_future(attempt())
+        pending.add(second)
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if on_hedge:
+                    on_hedge("hedge_won" if task is second else "first_won")
+                for other in done - {task}:
+                    if discard and other.exception() is None:
+                        await discard(other.result())
+                return task.result()
+        if on_hedge:
+            on_hedge("failed")
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,173 @@
+import asyncio
+import enum
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+import discord
+
+log = logging.getLogger(__name__)
+
+MEDIA_CONTENT_TYPES = ("image/", "video/")
+# Fall back to basic extension check when Discord doesn't populate
+# ``content_type`` (for example when uploaded from some mobile apps).
+MEDIA_EXTENSION_RE = re.compile(r"\.(?:png|jpe?g|gif|webp|bmp|mp4|mov|mkv|avi|webm)$", re.IGNORECASE)
+
+
+def is_media_attachment(attachment: discord.Attachment) -> bool:
+    content_type = (attachment.content_type or "").lower()
+    return content_type.startswith(MEDIA_CONTENT_TYPES) or bool(MEDIA_EXTENSION_RE.search(attachment.filename))
+
+
+class MessageClass(enum.IntFlag):
+    NONE = 0
+    MENTION = enum.auto()  # mentions the bot (not via @everyone)
+    MEDIA = enum.auto()  # carries at least one image/video attachment
+    ALLOWED = enum.auto()  # channel passes ALLOWED_CHANNEL_IDS
+
+
+@dataclass
+class Route:
+    name: str
+    handler: object  # async callable taking the message
+    requires: MessageClass
+    matched: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+
+class MessageRouter:
+    """Classify each gateway message once and forward it to interested cogs.
+
+    Cogs register a route with the message classes they need; a message is
+    only handed to routes whose required classes are all present. Messages
+    from bots, or that no route wants, are dropped after classification
+    without waking any cog.
+    """
+
+    def __init__(self, bot: discord.Client, allowed_channels: set[int] | frozenset[int] = frozenset()):
+        self.bot = bot
+        self.allowed_channels = frozenset(allowed_channels)
+        self.routes: dict[str, Route] = {}
+        self._interest = MessageClass.NONE
+        self._mention_re: re.Pattern | None = None
+        self._mention_user_id: int | None = None
+        self.received = 0
+        self.dropped_bot = 0
+        self.dropped_unrouted = 0
+        self.classify_time = 0.0
+        self._tasks: set[asyncio.Task] = set()
+
+    def add_route(self, name: str, handler, requires: MessageClass) -> None:
+        self.routes[name] = Route(name, handler, requires)
+        self._refresh_interest()
+
+    def remove_route(self, name: str) -> None:
+        self.routes.pop(name, None)
+        self._refresh_interest()
+
+    def _refresh_interest(self) -> None:
+        interest = MessageClass.NONE
+        for route in self.routes.values():
+            interest |= route.requires
+        self._interest = interest
+
+    @property
+    def mention_re(self) -> re.Pattern | None:
+        """Precompiled ``<@id>``/``<@!id>`` matcher for the logged-in user."""
+
+        user = self.bot.user
+        if user is None:
+            return None
+        if self._mention_user_id != user.id:
+            self._mention_re = re.compile(rf"<@!?{user.id}>")
+            self._mention_user_id = user.id
+        return self._mention_re
+
+    def strip_mention(self, content: str) -> str:
+        pattern = self.mention_re
+        return pattern.sub("", content).strip() if pattern else content.strip()
+
+    def classify(self, message: discord.Message) -> MessageClass:
+        classes = MessageClass.NONE
+        interest = self._interest
+
+        if interest & MessageClass.MENTION and not message.mention_everyone:
+            pattern = self.mention_re
+            if pattern is not None and (
+                pattern.search(message.content)
+                # a reply with the ping toggle on mentions us without any <@id> in the text
+                or any(u.id == self._mention_user_id for u in message.mentions)
+            ):
+                classes |= MessageClass.MENTION
+
+        if interest & MessageClass.MEDIA and message.attachments:
+            if any(is_media_attachment(a) for a in message.attachments):
+                classes |= MessageClass.MEDIA
+
+        if not self.allowed_channels or message.channel.id in self.allowed_channels:
+            classes |= MessageClass.ALLOWED
+        return classes
+
+    async def dispatch(self, message: discord.Message, *, wait: bool = False) -> MessageClass:
+        """Route ``message``; handlers run as separate tasks unless ``wait`` is set."""
+
+        self.received += 1
+        if message.author.bot:
+            self.dropped_bot += 1
+            return MessageClass.NONE
+
+        started = time.perf_counter()
+        classes = self.classify(message)
+        self.classify_time += time.perf_counter() - started
+
+        targets = [
+            route
+            for route in self.routes.values()
+            if route.requires and route.requires & classes == route.requires
+        ]
+        if not targets:
+            self.dropped_unrouted += 1
+            return classes
+
+        runs = [self._run(route, message) for route in targets]
+        if wait:
+            await asyncio.gather(*runs)
+        else:
+            for run in runs:
+                task = asyncio.create_task(run)
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return classes
+
+    async def _run(self, route: Route, message: discord.Message) -> None:
+        route.matched += 1
+        started = time.perf_counter()
+        try:
+            await route.handler(message)
+        except Exception:
+            route.errors += 1
+            log.exception("Message route %s failed", route.name)
+        finally:
+            elapsed = time.perf_counter() - started
+            route.total_time += elapsed
+            route.max_time = max(route.max_time, elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "dropped_bot": self.dropped_bot,
+            "dropped_unrouted": self.dropped_unrouted,
+            "classify_avg_us": self.classify_time / max(1, self.received - self.dropped_bot) * 1e6,
+            "routes": {
+                route.name: {
+                    "matched": route.matched,
+                    "errors": route.errors,
+                    "avg_ms": route.total_time / route.matched * 1000 if route.matched else 0.0,
+                    "max_ms": route.max_time * 1000,
+                }
+                for route in self.routes.values()
+            },
+        }
@@ -0,0 +1,149 @@
+"""State shared by the worker processes of a sharded bot.
+
+In the default single-process mode nothing here touches the disk: cooldowns
+live in memory exactly as before. When the supervisor runs several workers,
+each one opens the same SQLite file (WAL mode, so readers never block the
+writer) and cooldowns, rate limits and metric snapshots go through it, so a
+command behaves the same whichever process happens to serve it.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from discord import app_commands
+
+from services.admission import MAX_BUCKETS, TokenBucket
+
+log = logging.getLogger(__name__)
+
+SHARED_STATE_DB = Path(os.getenv("SHARED_STATE_DB", "~/.discord-bot-pi/shared.sqlite3")).expanduser()
+
+# single-process cooldowns: command name -> user id -> bucket. Kept here rather
+# than in the decorator so they survive a hot reload of the cog.
+_local_cooldowns: dict[str, dict[int, TokenBucket]] = {}
+
+
+class SharedState:
+    """Cross-process token buckets and a small TTL key/value store.
+
+    Methods are async and run their SQLite work in a thread; every bucket
+    update is one ``BEGIN IMMEDIATE`` transaction, so two processes taking
+    from the same bucket can't both get the last token.
+    """
+
+    def __init__(self, path: Path = SHARED_STATE_DB):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL);
+            """
+        )
+
+    def _take_token(self, key: str, per_minute: float, burst: int) -> float:
+        rate = per_minute / 60.0
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = float(burst) if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                retry_after = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if not retry_after:
+                    tokens -= 1
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now)
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return retry_after
+
+    async def take_token(self, key: str, per_minute: float, burst: int) -> float:
+        """Take one token from bucket ``key``; returns 0, or the seconds to wait when it is empty."""
+
+        return await asyncio.to_thread(self._take_token, key, per_minute, burst)
+
+    def _put(self, key: str, value, ttl: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+
+    async def put(self, key: str, value, ttl: float) -> None:
+        await asyncio.to_thread(self._put, key, value, ttl)
+
+    def _items(self, prefix: str) -> dict:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND expires_at > ?",
+                (prefix, prefix + "￿", time.time()),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    async def items(self, prefix: str) -> dict:
+        """Unexpired values whose key starts with ``prefix``."""
+
+        return await asyncio.to_thread(self._items, prefix)
+
+    def _vacuum(self) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+            # a bucket untouched for a day has long since refilled
+            self._db.execute("DELETE FROM buckets WHERE updated < ?", (now - 86400,))
+
+    async def vacuum(self) -> None:
+        await asyncio.to_thread(self._vacuum)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def cooldown(rate: int, per: float):
+    """Per-user ``rate`` uses per ``per`` seconds, shared across worker processes.
+
+    A drop-in for ``app_commands.checks.cooldown``: it raises the same
+    ``CommandOnCooldown`` the global error handler already answers. Without
+    ``bot.shared`` (single-process mode) the buckets stay in this process.
+    """
+
+    per_minute = rate * 60.0 / per
+
+    async def predicate(interaction) -> bool:
+        shared = getattr(interaction.client, "shared", None)
+        user_id = interaction.user.id
+        name = interaction.command.qualified_name if interaction.command else "?"
+        if shared is not None:
+            retry_after = await shared.take_token(f"cooldown:{name}:{user_id}", per_minute, rate)
+        else:
+            now = time.monotonic()
+            local = _local_cooldowns.setdefault(name, {})
+            bucket = local.get(user_id)
+            if bucket is None:
+                if len(local) >= MAX_BUCKETS:
+                    for stale in [k for k, b in local.items() if b.full(now)]:
+                        del local[stale]
+                bucket = local[user_id] = TokenBucket(per_minute, rate)
+            retry_after = bucket.retry_after(now)
+            if not retry_after:
+                bucket.take()
+        if retry_after:
+            raise app_commands.CommandOnCooldown(app_commands.Cooldown(rate, per), retry_after)
+        return True
+
+    return app_commands.check(predicate)
@@ -0,0 +1,129 @@
+"""Run the bot as several worker processes, each owning a subset of the shards.
+
+    python -m src.supervisor --workers 4            # 4 shards, one per worker
+    python -m src.supervisor --workers 2 --shards 4
+
+Discord splits a bot's gateway traffic by guild: ``(guild_id >> 22) % shards``.
+Extra processes therefore only help a bot that is in many guilds; a bot in a
+single guild puts every event on the same shard whatever the count. Workers
+share cooldowns, AI rate limits and metrics through ``SHARED_STATE_DB``;
+worker 0 syncs slash commands, enforces photo retention and serves
+``METRICS_PORT``.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import sys
+import time
+
+log = logging.getLogger("supervisor")
+
+IDENTIFY_INTERVAL = 5.5  # Discord allows one IDENTIFY per 5 s per bot (max_concurrency 1)
+RESTART_BACKOFF_MAX = 300.0  # seconds
+STABLE_AFTER = 600.0  # a worker up this long resets its backoff
+STOP_TIMEOUT = 20.0  # seconds between SIGTERM and SIGKILL on shutdown
+
+
+def split_shards(shard_count: int, workers: int) -> list[list[int]]:
+    """Round-robin ``range(shard_count)`` over ``workers`` lists."""
+
+    return [list(range(shard_count))[i::workers] for i in range(workers)]
+
+
+class Worker:
+    def __init__(self, worker_id: int, shard_ids: list[int], shard_count: int, worker_count: int):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.env = {
+            **os.environ,
+            "SHARD_COUNT": str(shard_count),
+            "SHARD_IDS": ",".join(map(str, shard_ids)),
+            "WORKER_ID": str(worker_id),
+            "WORKER_COUNT": str(worker_count),
+        }
+        self.proc: asyncio.subprocess.Process | None = None
+        self.failures = 0
+
+    async def start(self) -> None:
+        self.proc = await asyncio.create_subprocess_exec(sys.executable, "-m", "src.bot", env=self.env)
+        log.info("Worker %d started (pid %d, shards %s)", self.worker_id, self.proc.pid, self.shard_ids)
+
+    def signal(self, sig: int) -> None:
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.send_signal(sig)
+
+
+class Supervisor:
+    def __init__(self, workers: int, shards: int):
+        self.workers = [Worker(i, ids, shards, workers) for i, ids in enumerate(split_shards(shards, workers))]
+        self.stopping = asyncio.Event()
+
+    async def _run_worker(self, worker: Worker, delay: float) -> None:
+        # stagger the first start so the workers' IDENTIFYs don't collide
+        if delay:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+        while not self.stopping.is_set():
+            await worker.start()
+            started = time.monotonic()
+            code = await worker.proc.wait()
+            if self.stopping.is_set():
+                return
+            if time.monotonic() - started >= STABLE_AFTER:
+                worker.failures = 0
+            worker.failures += 1
+            backoff = IDENTIFY_INTERVAL * len(worker.shard_ids) * 2 ** (worker.failures - 1)
+            backoff = min(RESTART_BACKOFF_MAX, backoff)
+            log.warning("Worker %d exited with %s; restarting in %.0fs", worker.worker_id, code, backoff)
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.stopping.wait(), timeout=backoff)
+
+    def stop(self, sig: int = signal.SIGTERM) -> None:
+        if self.stopping.is_set():
+            return
+        log.info("Stopping %d workers", len(self.workers))
+        self.stopping.set()
+        for worker in self.workers:
+            worker.signal(sig)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop, signal.SIGTERM)
+
+        delay = 0.0
+        tasks = []
+        for worker in self.workers:
+            tasks.append(asyncio.create_task(self._run_worker(worker, delay)))
+            delay += IDENTIFY_INTERVAL * len(worker.shard_ids)
+        await self.stopping.wait()
+
+        running = [w.proc.wait() for w in self.workers if w.proc is not None and w.proc.returncode is None]
+        if running:
+            _, pending = await asyncio.wait([asyncio.ensure_future(p) for p in running], timeout=STOP_TIMEOUT)
+            if pending:
+                log.warning("%d workers did not exit in %.0fs; killing them", len(pending), STOP_TIMEOUT)
+                for worker in self.workers:
+                    worker.signal(signal.SIGKILL)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the bot as several sharded worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument("--shards", type=int, default=0, help="total shards (default: one per worker)")
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    shards = max(args.shards or workers, workers)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    log.info("Starting %d workers for %d shards", workers, shards)
+    asyncio.run(Supervisor(workers, shards).run())
+
+
+if __name__ == "__main__":
+    main()
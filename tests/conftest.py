@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the bot runs with src/ on the path (services.*, cogs.*); so do the tests
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionController, QueueFull, Requester
+
+NO_LIMIT = (0, 1)
+
+
+def _controller(**kwargs) -> AdmissionController:
+    return AdmissionController(1, max_queue=20, user_rate=NO_LIMIT, guild_rate=NO_LIMIT, **kwargs)
+
+
+async def _serve(controller: AdmissionController, user_ids: list[int]) -> tuple[list[str], list[int]]:
+    """Queue a request per entry behind a held slot; return the run order and queue positions."""
+
+    order = []
+    gate = asyncio.Event()
+    seen = {}
+
+    async def request(user_id: int, n: int) -> None:
+        async with controller.slot(Requester(user_id)):
+            order.append(f"{user_id}.{n}")
+
+    async def hold() -> None:
+        async with controller.slot():
+            await gate.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = []
+    for user_id in user_ids:
+        seen[user_id] = seen.get(user_id, 0) + 1
+        tasks.append(asyncio.create_task(request(user_id, seen[user_id])))
+        await asyncio.sleep(0)
+    positions = [controller._position(t) for t in _tickets(controller)]
+    gate.set()
+    await asyncio.gather(holder, *tasks)
+    return order, positions
+
+
+def _tickets(controller: AdmissionController):
+    yield from controller._priority
+    for queue in controller._queues.values():
+        yield from queue
+
+
+def test_busy_user_cannot_starve_others():
+    order, _ = asyncio.run(_serve(_controller(), [1, 1, 1, 2, 2, 3]))
+    assert order == ["1.1", "2.1", "3.1", "1.2", "2.2", "1.3"]
+
+
+def test_positions_follow_the_round_robin():
+    order, positions = asyncio.run(_serve(_controller(), [1, 1, 1, 2, 2, 3]))
+    # tickets listed per user: 1.1 1.2 1.3 2.1 2.2 3.1
+    served_at = {name: i + 1 for i, name in enumerate(order)}
+    assert positions == [served_at[n] for n in ["1.1", "1.2", "1.3", "2.1", "2.2", "3.1"]]
+
+
+def test_priority_users_go_first():
+    order, _ = asyncio.run(_serve(_controller(priority_users=frozenset({9})), [1, 2, 9, 1]))
+    assert order == ["9.1", "1.1", "2.1", "1.2"]
+
+
+def test_full_queue_turns_requests_away():
+    async def scenario():
+        controller = AdmissionController(1, max_queue=1, user_rate=NO_LIMIT, guild_rate=NO_LIMIT)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with controller.slot():
+                await gate.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            async with controller.slot(Requester(1)):
+                pass
+        gate.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
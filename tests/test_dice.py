@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from services.dice import Const, DiceError, Dice, compile_expression, distribution, roll
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "   ", "abc", "d1", "0d6", "4d6kh5", "4d6 2", "13x d6", "1d6 + 200000", "1d100001"],
+)
+def test_malformed_expressions_are_rejected(text):
+    with pytest.raises(DiceError):
+        compile_expression(text)
+
+
+def test_plain_terms_and_modifiers():
+    expr = compile_expression("2d8 - 1d4 + 3")
+    assert expr.terms == ((1, Dice(2, 8)), (-1, Dice(1, 4)), (1, Const(3)))
+    assert expr.repeat == 1
+    assert str(expr) == "2d8 - 1d4 + 3"
+
+
+def test_d_percent_and_implicit_count():
+    assert compile_expression("d%").terms == ((1, Dice(1, 100)),)
+
+
+@pytest.mark.parametrize(
+    "text, dice",
+    [
+        ("4d6kh3", Dice(4, 6, keep=3, keep_high=True)),
+        ("4d6k3", Dice(4, 6, keep=3, keep_high=True)),
+        ("2d20kl1", Dice(2, 20, keep=1, keep_high=False)),
+        ("4d6dl1", Dice(4, 6, keep=3, keep_high=True)),
+        ("4d6dh1", Dice(4, 6, keep=3, keep_high=False)),
+        ("4d6kh4", Dice(4, 6)),  # keeping every die is no keep at all
+    ],
+)
+def test_keep_and_drop(text, dice):
+    assert compile_expression(text).dice_terms == [dice]
+
+
+def test_exploding_dice():
+    assert compile_expression("3d6!").dice_terms == [Dice(3, 6, explode=True)]
+    assert compile_expression("4d6!kh3").dice_terms == [Dice(4, 6, explode=True, keep=3)]
+
+
+def test_repeat_prefix():
+    expr = compile_expression("6x 4d6kh3")
+    assert expr.repeat == 6
+    assert str(expr) == "6x 4d6kh3"
+    results = roll(expr, random.Random(1))
+    assert len(results) == 6
+    assert all(3 <= r.total <= 18 for r in results)
+
+
+def test_rolls_stay_in_range():
+    rng = random.Random(7)
+    expr = compile_expression("4d6kh3 + 2")
+    for _ in range(200):
+        (result,) = roll(expr, rng)
+        assert 5 <= result.total <= 20
+
+
+@pytest.mark.parametrize(
+    "text, mode, mean",
+    [
+        ("1d20+5", "advantage", 18.825),
+        ("1d20+5", "normal", 15.5),
+        ("4d6kh3", "normal", 12.2446),
+        ("1d6!", "normal", 4.2),
+    ],
+)
+def test_known_distribution_means(text, mode, mean):
+    dist = distribution(compile_expression(text), mode)
+    assert sum(dist.probs) == pytest.approx(1.0)
+    assert dist.mean == pytest.approx(mean, abs=1e-4)
+
+
+def test_distribution_bounds_and_odds():
+    dist = distribution(compile_expression("2d6"))
+    assert (dist.low, dist.high) == (2, 12)
+    assert dist.at_least(7) == pytest.approx(21 / 36)
+    assert dist.at_least(2) == pytest.approx(1.0)
+    assert dist.at_least(13) == 0
+    assert dist.percentile(0.5) == 7
@@ -0,0 +1,46 @@
+from services.llm import estimate_tokens, fit_messages
+
+
+def _msg(role: str, content: str) -> dict:
+    return {"role": role, "content": content}
+
+
+def _cost(messages: list[dict]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+SYSTEM = _msg("system", "You are a helpful bot. " * 5)
+HISTORY = [_msg("user" if i % 2 else "assistant", f"message number {i} " * 10) for i in range(10)]
+LAST = _msg("user", "and what about now?")
+
+
+def test_fitting_prompt_is_returned_unchanged():
+    messages = [SYSTEM, *HISTORY, LAST]
+    assert fit_messages(messages, _cost(messages) + 100, 100) is messages
+
+
+def test_drops_oldest_history_first():
+    messages = [SYSTEM, *HISTORY, LAST]
+    budget = _cost([SYSTEM, *HISTORY[-3:], LAST])
+    fitted = fit_messages(messages, budget + 50, 50)
+    assert fitted == [SYSTEM, *HISTORY[-3:], LAST]
+
+
+def test_keeps_leading_system_messages_and_last_message():
+    rules = _msg("system", "Be brief.")
+    messages = [SYSTEM, rules, *HISTORY, LAST]
+    fitted = fit_messages(messages, _cost([SYSTEM, rules, LAST]) + 10, 10)
+    assert fitted == [SYSTEM, rules, LAST]
+
+
+def test_history_stays_contiguous():
+    # a small old message must not be kept once a newer one has been dropped
+    messages = [SYSTEM, _msg("user", "hi"), _msg("assistant", "long " * 200), *HISTORY[-2:], LAST]
+    budget = _cost([SYSTEM, *HISTORY[-2:], LAST]) + estimate_tokens("hi")
+    fitted = fit_messages(messages, budget + 10, 10)
+    assert fitted == [SYSTEM, *HISTORY[-2:], LAST]
+
+
+def test_returns_none_when_even_the_essentials_do_not_fit():
+    messages = [SYSTEM, *HISTORY, LAST]
+    assert fit_messages(messages, _cost([SYSTEM, LAST]) + 9, 10) is None
@@ -0,0 +1,42 @@
+from services.moderation import Matcher, normalize
+
+
+def test_normalize_folds_case_accents_and_leet():
+    assert normalize("Ünsäfe!!") == " unsafe "
+    assert normalize("uns4f3") == " unsafe "
+    assert normalize("  b@d_w0rd...here ") == " bad word here "
+
+
+def test_matches_whole_words_only():
+    matcher = Matcher({"ass": "delete"})
+    assert matcher.find(normalize("what an ass")) == [("ass", "delete")]
+    assert matcher.find(normalize("ASS!")) == [("ass", "delete")]
+    assert matcher.find(normalize("a classic assessment")) == []
+
+
+def test_leet_spelling_still_matches():
+    matcher = Matcher({"spam": "warn"})
+    assert matcher.find(normalize("buy $p4m now")) == [("spam", "warn")]
+
+
+def test_trailing_star_matches_prefixes():
+    matcher = Matcher({"scam*": "delete"})
+    assert matcher.find(normalize("total scammers")) == [("scam*", "delete")]
+    assert matcher.find(normalize("no escamotage")) == []
+
+
+def test_phrases_and_overlapping_terms():
+    matcher = Matcher({"free nitro": "delete", "nitro": "warn", "free": "warn"})
+    found = matcher.find(normalize("Get FREE   n1tr0 here"))
+    assert sorted(found) == [("free", "warn"), ("free nitro", "delete"), ("nitro", "warn")]
+    assert matcher.find(normalize("freenitro")) == []
+
+
+def test_each_term_reported_once_in_order():
+    matcher = Matcher({"foo": "warn", "bar": "warn"})
+    assert matcher.find(normalize("bar foo bar foo")) == [("bar", "warn"), ("foo", "warn")]
+
+
+def test_blank_terms_are_ignored():
+    matcher = Matcher({"": "warn", "!!!": "warn", "ok": "warn"})
+    assert len(matcher) == 1